@@ -0,0 +1,99 @@
+"""
+Micro-benchmark da camada de serialização (utils/codec.py)
+
+Monta os payloads de um ciclo de 100 pacientes (mesmo formato gravado por
+data_init.generate_patient_data, com Decimal/date nas linhas de paciente) e mede
+MB/s de encode e decode para cada backend disponível (json, orjson, msgspec).
+
+Uso:
+    python src/benchmark_codec.py --patients 100 --repeat 20
+"""
+import json
+import time
+import argparse
+from decimal import Decimal
+from datetime import date, datetime
+
+from utils import codec
+from utils.rng import patient_seed, sensor_rng
+from data_init import SENSOR_CLASS_MAP, import_sensor_class
+
+
+def build_cycle(n_patients=100, batch_seconds=10, seed=42):
+    payloads = []
+    for pid in range(1, n_patients + 1):
+        paciente = {
+            'id': pid,
+            'nome': f'Paciente {pid}',
+            'altura': Decimal('1.72'),
+            'peso': Decimal('70.50'),
+            'dt_nasc': date(1980, 1, 1 + pid % 28),
+            'sexo': 'F' if pid % 2 else 'M',
+            'idade': 45
+        }
+        seed_seq = patient_seed(seed, pid)
+        records = []
+        for key in SENSOR_CLASS_MAP:
+            sensor = import_sensor_class(key)
+            rng = sensor_rng(seed_seq, {'nome': key})
+            records.extend(sensor.start(paciente, duration_minutes=batch_seconds / 60.0, interval_seconds=1, rng=rng))
+        payloads.append({
+            'paciente': paciente,
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'records': records
+        })
+    return payloads
+
+
+def bench(c, payloads, repeat):
+    encoded = [c.dumps(p) for p in payloads]
+    total_mb = sum(len(e) for e in encoded) / (1024 * 1024)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for p in payloads:
+            c.dumps(p)
+    encode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for e in encoded:
+            c.loads(e)
+    decode_s = time.perf_counter() - start
+
+    result = {
+        'codec': c.name,
+        'cycle_mb': round(total_mb, 4),
+        'encode_mb_s': round(total_mb * repeat / encode_s, 2),
+        'decode_mb_s': round(total_mb * repeat / decode_s, 2)
+    }
+
+    if c.name == 'msgspec' and codec.TYPED_DECODE:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for e in encoded:
+                codec.decode_payload(e)
+        result['typed_decode_mb_s'] = round(total_mb * repeat / (time.perf_counter() - start), 2)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de encode/decode JSON')
+    parser.add_argument('--patients', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = build_cycle(args.patients)
+    names = ['json']
+    if codec.ORJSON_AVAILABLE:
+        names.append('orjson')
+    if codec.MSGSPEC_AVAILABLE:
+        names.append('msgspec')
+
+    results = [bench(codec.get_codec(n), payloads, args.repeat) for n in names]
+    print(json.dumps({'patients': args.patients, 'repeat': args.repeat, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
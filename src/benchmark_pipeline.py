@@ -0,0 +1,308 @@
+"""
+Benchmark ponta a ponta do pipeline producer -> consumer com carga sintética reprodutível
+
+Funcionamento:
+- Gera N pacientes falsos com S sensores cada, amostrados a H Hz.
+- Estágio "generate": chama data_init.generate_patient_data por paciente.
+- Estágio "ingest": chama process_and_save.process_file por arquivo, usando um
+  banco em memória (sem MySQL) que imita as consultas do consumidor.
+- Cada estágio roda em um processo separado para medir o pico de RSS isoladamente.
+- Saída em JSON: registros/s, latência p50/p99 por lote e pico de RSS por estágio.
+
+Uso:
+    python src/benchmark_pipeline.py --patients 100 --sensors 7 --hz 1 --seed 42 --output bench.json
+    python src/benchmark_pipeline.py --ppg-hz 100   # oxímetro em modo forma de onda (carga alta)
+    python src/benchmark_pipeline.py --imu-hz 100   # IMU a 100 Hz reduzido a features por segundo
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from multiprocessing import Process, Queue
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SENSOR_NAMES = [
+    'frequencia_cardiaca',
+    'glicose',
+    'temperatura_corporal',
+    'pressao_arterial',
+    'nivel_oxigenacao',
+    'umidade_pele',
+    'movimentacao'
+]
+
+
+class InMemoryCursor:
+    """
+    Cursor mínimo que responde às consultas feitas por process_file.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._result = []
+
+    def execute(self, query, params=None):
+        q = ' '.join(query.split()).upper()
+        if q.startswith('SELECT ID, NOME FROM SENSOR WHERE NOME LIKE'):
+            termo = params[0].strip('%')
+            self._result = [r for r in self.db.sensores if termo in r['nome']][:1]
+        elif q.startswith('SELECT ID, NOME FROM SENSOR'):
+            self._result = list(self.db.sensores)
+        elif q.startswith('SELECT ID, SENSOR_ID FROM PACIENTE_SENSOR'):
+            self._result = self.db.paciente_sensor.get(params[0], [])
+        elif q.startswith('INSERT INTO REGISTRO'):
+            self.db.inseridos += 1
+            self._result = []
+        else:
+            self._result = []
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def close(self):
+        pass
+
+
+class InMemoryConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return InMemoryCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class InMemoryDatabase:
+    """
+    Substituto de DatabaseConnection com os mapeamentos sensor/paciente_sensor em memória.
+    """
+
+    def __init__(self, patient_ids, sensor_names):
+        self.sensores = [{'id': i + 1, 'nome': nome} for i, nome in enumerate(sensor_names)]
+        self.paciente_sensor = {}
+        ps_id = 1
+        for pid in patient_ids:
+            rows = []
+            for s in self.sensores:
+                rows.append({'id': ps_id, 'sensor_id': s['id']})
+                ps_id += 1
+            self.paciente_sensor[pid] = rows
+        self.inseridos = 0
+        self.connection = InMemoryConnection(self)
+
+    def close_connection(self):
+        pass
+
+
+def default_output_root():
+    # tmpfs quando disponível, para medir CPU e não o disco
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def build_workload(n_patients, n_sensors):
+    sensor_names = SENSOR_NAMES[:n_sensors]
+    patients = [{'id': i, 'nome': f'Paciente {i}', 'idade': 20 + (i % 60), 'altura': 1.7, 'peso': 70}
+                for i in range(1, n_patients + 1)]
+    sensors = [{'sensor_id': i + 1, 'nome': nome} for i, nome in enumerate(sensor_names)]
+    return patients, sensors, sensor_names
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def peak_rss_kb():
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss // 1024 if sys.platform == 'darwin' else rss
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset // 1024
+    except Exception:
+        return None
+
+
+def summarize(name, latencies, records, elapsed):
+    return {
+        'stage': name,
+        'batches': len(latencies),
+        'records': records,
+        'elapsed_s': round(elapsed, 4),
+        'records_per_s': round(records / elapsed, 2) if elapsed > 0 else None,
+        'batch_latency_p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'batch_latency_p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'peak_rss_kb': peak_rss_kb()
+    }
+
+
+def stage_generate(cfg, raw_dir):
+    if cfg.get('ppg_hz'):
+        os.environ['PPG_WAVEFORM_HZ'] = str(cfg['ppg_hz'])
+    if cfg.get('imu_hz'):
+        os.environ['IMU_HZ'] = str(cfg['imu_hz'])
+    from data_init import generate_patient_data
+    from utils.rng import patient_seed
+
+    patients, sensors, _ = build_workload(cfg['patients'], cfg['sensors'])
+    duration_minutes = cfg['batch_seconds'] / 60.0
+    interval_seconds = 1.0 / cfg['hz']
+
+    latencies = []
+    files = []
+    start = time.perf_counter()
+    for p in patients:
+        seed_seq = patient_seed(cfg['seed'], p['id'])
+        t0 = time.perf_counter()
+        path = generate_patient_data((p, sensors, duration_minutes, interval_seconds, raw_dir, seed_seq))
+        latencies.append(time.perf_counter() - t0)
+        if path:
+            files.append(path)
+    elapsed = time.perf_counter() - start
+
+    # contagem fora da região medida
+    records = 0
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            records += len(json.load(f).get('records', []))
+    return summarize('generate', latencies, records, elapsed)
+
+
+def stage_ingest(cfg, raw_dir, trusted_dir):
+    from process_and_save import process_file
+
+    patients, _, sensor_names = build_workload(cfg['patients'], cfg['sensors'])
+    db = InMemoryDatabase([p['id'] for p in patients], sensor_names)
+
+    # process_file ignora arquivos recentes apenas em list_raw_files; aqui chamamos direto
+    files = sorted(os.path.join(raw_dir, f) for f in os.listdir(raw_dir) if f.endswith('.json'))
+    records = 0
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            records += len(json.load(f).get('records', []))
+
+    latencies = []
+    start = time.perf_counter()
+    for path in files:
+        t0 = time.perf_counter()
+        process_file(path, db, trusted_dir)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    result = summarize('ingest', latencies, records, elapsed)
+    result['rows_inserted'] = db.inseridos
+    return result
+
+
+def _run_stage(queue, fn, args):
+    logging.disable(logging.INFO)
+    try:
+        queue.put(fn(*args))
+    except Exception as e:
+        queue.put({'stage': fn.__name__, 'error': repr(e)})
+
+
+def run_isolated(fn, *args):
+    queue = Queue()
+    proc = Process(target=_run_stage, args=(queue, fn, args))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(patients=100, sensors=7, hz=1.0, batch_seconds=10, seed=42, output_root=None, keep=False, ppg_hz=0, imu_hz=0):
+    cfg = {
+        'patients': patients,
+        'sensors': max(1, min(sensors, len(SENSOR_NAMES))),
+        'hz': hz,
+        'batch_seconds': batch_seconds,
+        'seed': seed,
+        'ppg_hz': ppg_hz,
+        'imu_hz': imu_hz
+    }
+    work_dir = tempfile.mkdtemp(prefix='bench_pipeline_', dir=output_root or default_output_root())
+    raw_dir = os.path.join(work_dir, 'raw')
+    trusted_dir = os.path.join(work_dir, 'trusted')
+
+    try:
+        stages = [
+            run_isolated(stage_generate, cfg, raw_dir),
+            run_isolated(stage_ingest, cfg, raw_dir, trusted_dir)
+        ]
+    finally:
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'commit': git_commit(),
+        'config': cfg,
+        'work_dir': work_dir,
+        'stages': stages
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline producer/consumer')
+    parser.add_argument('--patients', type=int, default=100)
+    parser.add_argument('--sensors', type=int, default=len(SENSOR_NAMES), help='sensores por paciente')
+    parser.add_argument('--hz', type=float, default=1.0, help='taxa de amostragem por sensor')
+    parser.add_argument('--batch-seconds', type=int, default=10, help='duração coberta por lote')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--ppg-hz', type=float, default=0, help='taxa da forma de onda PPG do oxímetro (0 = desligado)')
+    parser.add_argument('--imu-hz', type=float, default=0, help='taxa do IMU de movimentação (0 = modo simples)')
+    parser.add_argument('--output-root', default=None, help='diretório base (padrão: /dev/shm)')
+    parser.add_argument('--output', default=None, help='arquivo JSON de saída (padrão: stdout)')
+    parser.add_argument('--keep', action='store_true', help='não apagar os arquivos gerados')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.patients, args.sensors, args.hz, args.batch_seconds,
+                           args.seed, args.output_root, args.keep, args.ppg_hz, args.imu_hz)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
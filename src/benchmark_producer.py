@@ -0,0 +1,129 @@
+"""
+Benchmark de um ciclo do produtor: modo Pool (multiprocessing) x modo asyncio
+
+Monta as tarefas de um ciclo com data_init.build_due_tasks (sensores padrão do
+dry-run: frequência 1 s, glicose 300 s, temperatura 60 s) e mede o tempo de parede de
+cada modo gerando e gravando um arquivo por paciente. O Pool é criado uma vez (como
+em data_init.main) e o tempo de criação sai separado; cada modo usa agendador e
+diretório próprios, e o primeiro ciclo é descartado como aquecimento.
+
+Uso:
+    python src/benchmark_producer.py --sizes 100,1000,10000 --cycles 3 --output bench_producer.json
+"""
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+from multiprocessing import Pool, cpu_count
+
+import data_init
+from producer_async import AsyncProducer, estimate_records
+from utils.rng import patient_seed
+from utils.sampling_scheduler import SamplingScheduler
+from benchmark_pipeline import default_output_root, percentile, git_commit
+
+
+def build_patients(n):
+    return [{'id': i, 'nome': f'Paciente {i}', 'idade': 20 + (i % 60), 'altura': 1.7, 'peso': 70}
+            for i in range(1, n + 1)]
+
+
+def cycle_tasks(scheduler, patients, out_dir, seed, cycle, now):
+    # scheduler.due() usa o relógio; cada ciclo simula a janela seguinte
+    for p in patients:
+        scheduler.sync(p, data_init.fetch_sensors_for_patient(None, p['id']), now)
+    due = scheduler.due(now, 10)
+    return [(p, sensors, 10 / 60.0, 1, out_dir, patient_seed(seed, p['id'], cycle))
+            for p, sensors in due.values()]
+
+
+def run_mode(mode, patients, work_dir, cycles, seed, processes, producer=None):
+    scheduler = SamplingScheduler(default_interval_seconds=1)
+    timings = []
+    files = 0
+    records = 0
+    pool = None
+    pool_start_s = None
+    if mode == 'pool':
+        t0 = time.perf_counter()
+        pool = Pool(processes=processes)
+        pool_start_s = time.perf_counter() - t0
+    try:
+        for cycle in range(cycles + 1):
+            out_dir = os.path.join(work_dir, mode, f'ciclo_{cycle}')
+            tasks = cycle_tasks(scheduler, patients, out_dir, seed, cycle, now=cycle * 10.0)
+            n_records = estimate_records(tasks)
+            t0 = time.perf_counter()
+            if mode == 'pool':
+                results = pool.map(data_init.generate_patient_window, tasks)
+            else:
+                results = asyncio.run(producer.run_cycle(tasks))
+            paths = data_init.store_window_states(scheduler, tasks, results)
+            elapsed = time.perf_counter() - t0
+            if cycle == 0:
+                continue
+            timings.append(elapsed)
+            files += sum(1 for p in paths if p)
+            records += n_records
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    total = sum(timings)
+    return {
+        'mode': mode,
+        'cycles': len(timings),
+        'files': files,
+        'records': records,
+        'cycle_p50_s': round(percentile(timings, 50), 4),
+        'cycle_max_s': round(max(timings), 4) if timings else 0.0,
+        'files_per_s': round(files / total, 1) if total > 0 else None,
+        'pool_start_s': round(pool_start_s, 4) if pool_start_s is not None else None,
+        'uses_processes': producer.uses_processes(tasks) if producer is not None else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do produtor: Pool x asyncio')
+    parser.add_argument('--sizes', default='100,1000,10000', help='quantidades de pacientes, separadas por vírgula')
+    parser.add_argument('--cycles', type=int, default=3, help='ciclos medidos por modo (além do aquecimento)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--processes', type=int, default=min(8, max(1, cpu_count())))
+    parser.add_argument('--output-root', default=None, help='diretório base (padrão: /dev/shm)')
+    parser.add_argument('--output', default=None, help='arquivo JSON de saída (padrão: stdout)')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    producer = AsyncProducer(data_init.generate_patient_window, data_init.encode_patient_payload, data_init.write_payload)
+    results = []
+    try:
+        for n in sizes:
+            patients = build_patients(n)
+            work_dir = tempfile.mkdtemp(prefix='bench_producer_', dir=args.output_root or default_output_root())
+            try:
+                for mode in ('pool', 'async'):
+                    r = run_mode(mode, patients, work_dir, args.cycles, args.seed, args.processes,
+                                 producer if mode == 'async' else None)
+                    r['patients'] = n
+                    results.append(r)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        producer.close()
+
+    text = json.dumps({'commit': git_commit(), 'processes': args.processes,
+                       'writer_threads': producer.writer_threads, 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
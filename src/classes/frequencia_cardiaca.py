@@ -1,44 +1,70 @@
-from datetime import datetime, timedelta
-import math
-import random
+from datetime import datetime
+import numpy as np
+from utils.rng import ensure_rng
+from utils.random_walk import ar1_coef, ar1_walk
+from utils.timestamps import format_batch
 
 
 class FreqCardiaca:
     """
     Simula frequência cardíaca.
 
-    start(infos_medica, duration_minutes=30, interval_seconds=60) -> list[dict]
+    start(infos_medica, duration_minutes=30, interval_seconds=60, rng=None, state=None, start_time=None) -> list[dict]
+
+    Com `state` (dict, vazio na primeira chamada) o fluxo mantém bpm_base, a fase da
+    oscilação e a deriva lenta entre lotes; sem ele cada chamada é um início a frio.
+    `start_time` é o instante da primeira amostra (o agendado pelo SamplingScheduler);
+    sem ele, datetime.now(). O mesmo vale para os demais sensores.
     """
 
     def __init__(self):
         self.variacao_max = 5
+        self.deriva_sd = 2.0
+        self.deriva_tau = 120.0
 
-    def gerar_valor(self, bpm_base, t):
-        oscilacao = self.variacao_max * math.sin(2 * math.pi * t / 60)
-        ruido = random.uniform(-1.5, 1.5)
-        return round(bpm_base + oscilacao + ruido, 2)
-
-    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=60):
+    def estado_inicial(self, infos_medica: dict, rng) -> dict:
         idade = infos_medica.get('idade', 45)
         if idade > 65:
-            bpm_base = random.randint(50, 60)
+            bpm_base = rng.integers(50, 61)
         elif 18 <= idade <= 65:
-            bpm_base = random.randint(70, 78)
+            bpm_base = rng.integers(70, 79)
         elif 2 < idade < 18:
-            bpm_base = random.randint(80, 100)
+            bpm_base = rng.integers(80, 101)
         else:
-            bpm_base = random.randint(120, 140)
+            bpm_base = rng.integers(120, 141)
+        return {'bpm_base': int(bpm_base), 't': 0.0, 'deriva': 0.0}
+
+    def gerar_valor(self, bpm_base, t, rng=None):
+        # t em segundos desde o início do fluxo; pode ser um array (lote inteiro de uma vez)
+        rng = ensure_rng(rng)
+        t = np.asarray(t)
+        oscilacao = self.variacao_max * np.sin(2 * np.pi * t / 60)
+        ruido = rng.uniform(-1.5, 1.5, t.shape)
+        return np.round(bpm_base + oscilacao + ruido, 2)
+
+    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=60, rng=None, state=None, start_time=None):
+        rng = ensure_rng(rng)
+        state = state if state is not None else {}
+        if 'bpm_base' not in state:
+            state.update(self.estado_inicial(infos_medica, rng))
 
         records = []
-        now = datetime.now()
+        now = start_time or datetime.now()
         steps = int((duration_minutes * 60) / interval_seconds)
+        timestamps = format_batch(now, steps, interval_seconds)
+        t = state['t'] + np.arange(steps) * interval_seconds
+        phi, sigma = ar1_coef(interval_seconds, self.deriva_tau, self.deriva_sd)
+        deriva = ar1_walk(rng, state['deriva'], phi, sigma, steps)
+        valores = self.gerar_valor(state['bpm_base'] + deriva, t, rng).tolist()
+        if steps:
+            state['t'] = float(t[-1] + interval_seconds)
+            state['deriva'] = float(deriva[-1])
         for i in range(steps):
-            ts = (now + timedelta(seconds=i * interval_seconds)).strftime('%Y-%m-%d %H:%M:%S')
             records.append({
                 'sensor': 'frequencia_cardiaca',
-                'valor': self.gerar_valor(bpm_base, i),
+                'valor': valores[i],
                 'unidade': 'bpm',
-                'timestamp': ts
+                'timestamp': timestamps[i]
             })
 
         return records
@@ -1,28 +1,43 @@
-from datetime import datetime, timedelta
-import random
-import math
+from datetime import datetime
+import numpy as np
+from utils.rng import ensure_rng
+from utils.random_walk import ar1_coef, ar1_walk
+from utils.timestamps import format_batch
 
 
 class Glicose:
     """
-    Simula série temporal de glicose. start(infos_medica, duration_minutes, interval_seconds)
+    Simula série temporal de glicose. start(infos_medica, duration_minutes, interval_seconds, rng=None, state=None, start_time=None)
     retorna lista de dicts com 'glicose' e 'timestamp'.
+
+    A fase circadiana segue o relógio (minutos desde a meia-noite) e, com `state`,
+    a deriva lenta continua do ponto em que o lote anterior parou.
     """
 
     def __init__(self):
-        pass
+        self.deriva_sd = 4.0
+        self.deriva_tau = 1800.0
 
-    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=300):
+    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=300, rng=None, state=None, start_time=None):
         # intervalo default 5 minutos (300s)
-        now = datetime.now()
+        rng = ensure_rng(rng)
+        state = state if state is not None else {}
+        if 'base' not in state:
+            state.update({'base': infos_medica.get('glicose_base', 100), 'deriva': 0.0})
+
+        now = start_time or datetime.now()
         steps = int((duration_minutes * 60) / interval_seconds)
-        base = infos_medica.get('glicose_base', 100)
+        timestamps = format_batch(now, steps, interval_seconds)
+        inicio = now.hour * 60 + now.minute + now.second / 60.0
+        minutos = inicio + np.arange(steps) * interval_seconds / 60.0
+        circ = 8 * np.sin(2 * np.pi * minutos / 1440.0)
+        phi, sigma = ar1_coef(interval_seconds, self.deriva_tau, self.deriva_sd)
+        deriva = ar1_walk(rng, state['deriva'], phi, sigma, steps)
+        ruido = rng.normal(0, 1.5, steps)
+        valores = np.round(np.clip(state['base'] + circ + deriva + ruido, 40.0, 400.0), 1).tolist()
+        if steps:
+            state['deriva'] = float(deriva[-1])
         records = []
         for i in range(steps):
-            minutos = (i * interval_seconds) / 60.0
-            circ = 8 * math.sin(2 * math.pi * minutos / 1440.0)
-            ruido = random.gauss(0, 3)
-            valor = max(40.0, min(400.0, base + circ + ruido))
-            ts = (now + timedelta(seconds=i * interval_seconds)).strftime('%Y-%m-%d %H:%M:%S')
-            records.append({'sensor': 'glicose', 'valor': round(valor,1), 'unidade':'mg/dL', 'timestamp': ts})
+            records.append({'sensor': 'glicose', 'valor': valores[i], 'unidade':'mg/dL', 'timestamp': timestamps[i]})
         return records
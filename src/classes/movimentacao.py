@@ -1,29 +1,177 @@
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+import os
+import numpy as np
+from utils.rng import ensure_rng
+from utils.timestamps import format_batch
+
+# Parâmetros de marcha por cenário: frequência do passo (Hz), amplitude vertical (g),
+# ruído do acelerômetro (g) e desvio do giroscópio (°/s)
+CENARIOS_IMU = {
+    'caminhada': {'passo_hz': 1.8, 'amplitude': 0.35, 'ruido': 0.05, 'giro': 30.0},
+    'sedentario': {'passo_hz': 0.0, 'amplitude': 0.0, 'ruido': 0.01, 'giro': 2.0},
+    'padrao': {'passo_hz': 1.0, 'amplitude': 0.15, 'ruido': 0.03, 'giro': 15.0}
+}
+
+LIMIAR_QUEDA_G = 2.5
+LIMIAR_JERK_G_S = 20.0
+DURACAO_IMPACTO_S = 0.1
+TEMPO_CAIDO_S = 120.0
+# ruído do acelerômetro (g) com o paciente deitado e imóvel, em qualquer cenário: o
+# ruído de marcha do cenário deixaria magnitude_var acima do limiar de 'parado'
+RUIDO_CAIDO_G = CENARIOS_IMU['sedentario']['ruido']
+LIMIAR_PARADO_VAR = 0.002
+LIMIAR_PARADO_GIRO = 10.0
+
+
+def simular_imu(rng, segundos, hz, cenario='padrao', state=None, quedas_por_hora=0.0):
+    """
+    Gera um lote de acelerômetro/giroscópio (MPU6050) em `hz` amostras por segundo.
+
+    Gravidade em z, oscilação de marcha na frequência do passo e ruído; quedas são
+    um impacto de ~3,5 g seguido de um período deitado (gravidade em x, sem marcha e
+    com o ruído de repouso RUIDO_CAIDO_G).
+
+    Args:
+        rng (np.random.Generator): Gerador do fluxo.
+        segundos (float): Duração do lote.
+        hz (float): Taxa de amostragem (50–200 Hz em sensores reais).
+        cenario (str, optional): Chave de CENARIOS_IMU. Defaults to 'padrao'.
+        state (dict, optional): Estado do fluxo ('fase', 'caido_s'), atualizado no lugar.
+        quedas_por_hora (float, optional): Taxa de quedas simuladas. Defaults to 0.0.
+
+    Returns:
+        tuple: (aceleracao, giroscopio), arrays (amostras, 3) em g e °/s.
+    """
+    state = state if state is not None else {}
+    p = CENARIOS_IMU.get(cenario, CENARIOS_IMU['padrao'])
+    n = int(round(segundos * hz))
+    t = np.arange(n) / hz
+
+    caido = t < state.get('caido_s', 0.0)
+    n_quedas = rng.poisson(quedas_por_hora * segundos / 3600.0) if quedas_por_hora > 0 else 0
+    impactos = np.sort(rng.integers(0, n, n_quedas)) if n_quedas and n else np.empty(0, dtype=int)
+    largura = max(1, int(DURACAO_IMPACTO_S * hz))
+    for k in impactos:
+        caido[k + largura:k + largura + int(TEMPO_CAIDO_S * hz)] = True
+    if impactos.size:
+        state['caido_s'] = max(0.0, float((impactos[-1] + largura) / hz + TEMPO_CAIDO_S - segundos))
+    else:
+        state['caido_s'] = max(0.0, state.get('caido_s', 0.0) - segundos)
+
+    ciclos = state.get('fase', 0.0) + p['passo_hz'] * t
+    marcha = np.where(caido, 0.0, p['amplitude'])
+    aceleracao = rng.standard_normal((n, 3)) * np.where(caido, RUIDO_CAIDO_G, p['ruido'])[:, None]
+    aceleracao[:, 0] += np.where(caido, 1.0, 0.5 * marcha * np.sin(np.pi * ciclos))
+    aceleracao[:, 2] += np.where(caido, 0.0, 1.0 + marcha * np.sin(2 * np.pi * ciclos))
+    giroscopio = rng.normal(0, p['giro'], (n, 3)) * np.where(caido, 0.1, 1.0)[:, None]
+
+    # impacto: pico de ~3,5 g com duração DURACAO_IMPACTO_S, antes do período deitado
+    pulso = 2.5 * np.sin(np.pi * (np.arange(largura) + 0.5) / largura)
+    for k in impactos:
+        fim = min(n, k + largura)
+        aceleracao[k:fim, 2] += pulso[:fim - k]
+        giroscopio[k:fim] += rng.normal(0, 200.0, (fim - k, 3))
+
+    state['fase'] = float((state.get('fase', 0.0) + p['passo_hz'] * segundos) % 2.0)
+    return aceleracao, giroscopio
+
+
+def extrair_features(aceleracao, giroscopio, hz, janela_segundos=1.0):
+    """
+    Reduz o IMU bruto a features por janela, vetorizado (reshape por janela).
+
+    Args:
+        aceleracao (np.ndarray): (amostras, 3) em g.
+        giroscopio (np.ndarray): (amostras, 3) em °/s.
+        hz (float): Taxa de amostragem.
+        janela_segundos (float, optional): Tamanho da janela. Defaults to 1.0.
+
+    Returns:
+        dict: Arrays com uma posição por janela — aceleracao_media (janelas, 3),
+        magnitude_media/max/var, jerk_max (g/s), giro_media, queda (bool) e estado
+        ('queda', 'parado' ou 'movimento').
+    """
+    m = max(1, int(round(hz * janela_segundos)))
+    w = aceleracao.shape[0] // m
+    magnitude = np.linalg.norm(aceleracao[:w * m], axis=1)
+    jerk = np.abs(np.diff(magnitude, prepend=magnitude[:1])) * hz
+    giro = np.linalg.norm(giroscopio[:w * m], axis=1)
+
+    magnitude = magnitude.reshape(w, m)
+    magnitude_max = magnitude.max(axis=1)
+    magnitude_var = magnitude.var(axis=1)
+    jerk_max = jerk.reshape(w, m).max(axis=1)
+    giro_media = giro.reshape(w, m).mean(axis=1)
+
+    queda = (magnitude_max > LIMIAR_QUEDA_G) & (jerk_max > LIMIAR_JERK_G_S)
+    parado = (magnitude_var < LIMIAR_PARADO_VAR) & (giro_media < LIMIAR_PARADO_GIRO)
+    return {
+        'aceleracao_media': aceleracao[:w * m].reshape(w, m, 3).mean(axis=1),
+        'magnitude_media': magnitude.mean(axis=1),
+        'magnitude_max': magnitude_max,
+        'magnitude_var': magnitude_var,
+        'jerk_max': jerk_max,
+        'giro_media': giro_media,
+        'queda': queda,
+        'estado': np.where(queda, 'queda', np.where(parado, 'parado', 'movimento'))
+    }
 
 
 class Movimentacao:
     """
     Simula aceleração/giroscópio simples.
-    start(infos_medica, duration_minutes, interval_seconds)
+    start(infos_medica, duration_minutes, interval_seconds, rng=None, state=None, start_time=None)
+
+    Com IMU_HZ > 0 (ou imu_hz) entra no modo IMU: gera o sinal nessa taxa e grava só as
+    features de cada intervalo (estado em 'valor', métricas em 'features'), sem as amostras
+    brutas. Quedas simuladas por IMU_FALLS_PER_HOUR.
+    No modo simples as amostras são independentes e `state` é ignorado.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, imu_hz=None, quedas_por_hora=None):
+        if imu_hz is None:
+            imu_hz = float(os.getenv('IMU_HZ', '0') or 0)
+        if quedas_por_hora is None:
+            quedas_por_hora = float(os.getenv('IMU_FALLS_PER_HOUR', '0.1') or 0)
+        self.imu_hz = imu_hz
+        self.quedas_por_hora = quedas_por_hora
 
-    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=1):
-        now = datetime.now()
+    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=1, rng=None, state=None, start_time=None):
+        rng = ensure_rng(rng)
+        now = start_time or datetime.now()
         steps = int((duration_minutes * 60) / interval_seconds)
+        timestamps = format_batch(now, steps, interval_seconds)
         cen = infos_medica.get('cenario', 'padrao')
+        if self.imu_hz > 0 and steps:
+            return self._start_imu(cen, steps, timestamps, interval_seconds, rng, state)
+
+        if cen == 'caminhada':
+            amplitude = 1
+        elif cen == 'sedentario':
+            amplitude = 0.1
+        else:
+            amplitude = 2
+        accel = np.round(rng.uniform(-amplitude, amplitude, (steps, 3)), 2).tolist()
         records = []
         for i in range(steps):
-            if cen == 'caminhada':
-                accel = [round(random.uniform(-1,1),2) for _ in range(3)]
-            elif cen == 'sedentario':
-                accel = [round(random.uniform(-0.1,0.1),2) for _ in range(3)]
-            else:
-                accel = [round(random.uniform(-2,2),2) for _ in range(3)]
-
-            ts = (now + timedelta(seconds=i * interval_seconds)).strftime('%Y-%m-%d %H:%M:%S')
-            records.append({'sensor':'movimentacao','aceleracao':{'x':accel[0],'y':accel[1],'z':accel[2]},'timestamp':ts})
+            x, y, z = accel[i]
+            records.append({'sensor':'movimentacao','aceleracao':{'x':x,'y':y,'z':z},'timestamp':timestamps[i]})
+        return records
+
+    def _start_imu(self, cen, steps, timestamps, interval_seconds, rng, state):
+        aceleracao, giroscopio = simular_imu(rng, steps * interval_seconds, self.imu_hz, cen, state,
+                                             self.quedas_por_hora)
+        f = extrair_features(aceleracao, giroscopio, self.imu_hz, interval_seconds)
+        media = np.round(f['aceleracao_media'], 3).tolist()
+        cols = {k: np.round(f[k], 4).tolist() for k in ('magnitude_media', 'magnitude_max', 'magnitude_var', 'jerk_max', 'giro_media')}
+        estado = f['estado'].tolist()
+        queda = f['queda'].tolist()
+
+        records = []
+        for i in range(min(steps, len(estado))):
+            x, y, z = media[i]
+            features = {k: v[i] for k, v in cols.items()}
+            features.update(hz=self.imu_hz, queda=queda[i])
+            records.append({'sensor':'movimentacao','valor':estado[i],'aceleracao':{'x':x,'y':y,'z':z},
+                            'features':features,'timestamp':timestamps[i]})
         return records
@@ -1,20 +1,135 @@
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+import os
+import numpy as np
+from utils.rng import ensure_rng
+from utils.random_walk import ar1_coef, ar1_walk
+from utils.timestamps import format_batch
+
+
+def simular_ppg(rng, segundos, hz, spo2, bpm, fase=0.0, t0=0.0, perfusao=0.02, ruido=0.0005):
+    """
+    Sintetiza os canais red/IR de um oxímetro (modelo do MAX30102 em tests/spark:
+    DC + componente pulsátil AC) para n pacientes de uma vez.
+
+    A razão das razões R = (AC_red/DC_red) / (AC_ir/DC_ir) é escolhida a partir do SpO2
+    alvo pela mesma calibração de calcula_oxigenacao (SpO2 = 104 - 17 R).
+
+    Args:
+        rng (np.random.Generator): Gerador para o ruído.
+        segundos (float): Duração a sintetizar.
+        hz (float): Taxa de amostragem (ex.: 100).
+        spo2: SpO2 alvo, shape (n,) ou (n, amostras).
+        bpm: Frequência cardíaca por paciente, shape (n,).
+        fase: Fase cardíaca inicial (em ciclos) por paciente. Defaults to 0.0.
+        t0 (float, optional): Instante inicial (s), para a onda respiratória. Defaults to 0.0.
+        perfusao (float, optional): Índice de perfusão AC/DC do IR. Defaults to 0.02.
+        ruido (float, optional): Desvio do ruído relativo ao DC. Defaults to 0.0005.
+
+    Returns:
+        tuple: (red, ir, proxima_fase) — arrays (n, amostras) e fase (n,) para o próximo lote.
+    """
+    n_amostras = int(round(segundos * hz))
+    spo2 = np.asarray(spo2, dtype=float)
+    if spo2.ndim < 2:
+        spo2 = np.atleast_1d(spo2)[:, None]
+    bpm = np.atleast_1d(np.asarray(bpm, dtype=float))[:, None]
+    fase = np.atleast_1d(np.asarray(fase, dtype=float))[:, None]
+    n = max(spo2.shape[0], bpm.shape[0], fase.shape[0])
+
+    t = np.arange(n_amostras) / hz
+    ciclos = fase + bpm / 60.0 * t
+    pulso = np.sin(2 * np.pi * ciclos) + 0.3 * np.sin(4 * np.pi * ciclos - np.pi / 2)
+    respiracao = 0.002 * np.sin(2 * np.pi * 0.25 * (t0 + t))
+    razao = (104 - spo2) / 17.0
+
+    ir = 1.20 * (1 + respiracao + perfusao * pulso + rng.normal(0, ruido, (n, n_amostras)))
+    red = 1.00 * (1 + respiracao + perfusao * razao * pulso + rng.normal(0, ruido, (n, n_amostras)))
+    proxima_fase = (fase[:, 0] + bpm[:, 0] / 60.0 * n_amostras / hz) % 1.0
+    return red, ir, proxima_fase
+
+
+def spo2_janelas(red, ir, hz, janela_segundos=1.0):
+    """
+    SpO2 por janela: AC = pico a pico e DC = média de cada canal na janela.
+
+    Args:
+        red (np.ndarray): Canal vermelho, shape (..., amostras).
+        ir (np.ndarray): Canal infravermelho, mesmo shape.
+        hz (float): Taxa de amostragem.
+        janela_segundos (float, optional): Tamanho da janela. Defaults to 1.0.
+
+    Returns:
+        np.ndarray: SpO2 (%) com shape (..., janelas); amostras que sobram no fim são descartadas.
+    """
+    m = max(1, int(round(hz * janela_segundos)))
+    w = red.shape[-1] // m
+    r = red[..., :w * m].reshape(red.shape[:-1] + (w, m))
+    i = ir[..., :w * m].reshape(ir.shape[:-1] + (w, m))
+    razao = (np.ptp(r, axis=-1) / r.mean(axis=-1)) / (np.ptp(i, axis=-1) / i.mean(axis=-1))
+    return np.clip(104 - 17 * razao, 0, 100)
 
 
 class NivelOxigenacao:
-    def __init__(self):
-        pass
+    """
+    Simula SpO2. start(infos_medica, duration_minutes, interval_seconds, rng=None, state=None, start_time=None)
 
-    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=60):
-        now = datetime.now()
+    Com PPG_WAVEFORM_HZ > 0 (ou waveform_hz) entra no modo forma de onda: sintetiza os
+    canais red/IR nessa taxa, calcula o SpO2 de cada intervalo a partir deles e anexa
+    as amostras ao registro em 'ppg' ({'hz', 'red', 'ir'}) — volume realista para teste de carga.
+    """
+
+    def __init__(self, waveform_hz=None):
+        self.deriva_sd = 1.0
+        self.deriva_tau = 120.0
+        if waveform_hz is None:
+            waveform_hz = float(os.getenv('PPG_WAVEFORM_HZ', '0') or 0)
+        self.waveform_hz = waveform_hz
+
+    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=60, rng=None, state=None, start_time=None):
+        rng = ensure_rng(rng)
+        state = state if state is not None else {}
+        state.setdefault('deriva', 0.0)
+        now = start_time or datetime.now()
         steps = int((duration_minutes * 60) / interval_seconds)
+        timestamps = format_batch(now, steps, interval_seconds)
+        base = 97
+        if infos_medica.get('condicao_clinica') == 'respiratorio':
+            base = 92
+        phi, sigma = ar1_coef(interval_seconds, self.deriva_tau, self.deriva_sd)
+        deriva = ar1_walk(rng, state['deriva'], phi, sigma, steps)
+        if steps:
+            state['deriva'] = float(deriva[-1])
+
+        if self.waveform_hz > 0 and steps:
+            return self._start_forma_de_onda(base + deriva, timestamps, interval_seconds, rng, state)
+
+        valores = np.clip(np.round(base + deriva + rng.normal(0, 0.5, steps), 1), 80, 100).tolist()
+        records = []
+        for i in range(steps):
+            records.append({'sensor':'nivel_oxigenacao','valor':valores[i],'unidade':'%','timestamp':timestamps[i]})
+        return records
+
+    def _start_forma_de_onda(self, alvo, timestamps, interval_seconds, rng, state):
+        hz = self.waveform_hz
+        if 'bpm' not in state:
+            state.update({'bpm': float(rng.uniform(60, 90)), 'fase': 0.0, 't': 0.0})
+        steps = len(alvo)
+        por_intervalo = int(round(interval_seconds * hz))
+        red, ir, state['fase'] = simular_ppg(rng, steps * interval_seconds, hz,
+                                             np.repeat(alvo, por_intervalo)[None, :], state['bpm'],
+                                             fase=state['fase'], t0=state['t'])
+        state['fase'] = float(state['fase'][0])
+        state['t'] += steps * interval_seconds
+
+        # SpO2 em janelas de ~1 s, média por intervalo
+        sub = max(1, int(round(interval_seconds)))
+        spo = spo2_janelas(red[0], ir[0], hz, interval_seconds / sub)[:steps * sub]
+        valores = np.clip(np.round(spo.reshape(steps, sub).mean(axis=1), 1), 80, 100).tolist()
+        red = np.round(red[0], 5).reshape(steps, por_intervalo).tolist()
+        ir = np.round(ir[0], 5).reshape(steps, por_intervalo).tolist()
+
         records = []
         for i in range(steps):
-            base = 97
-            if infos_medica.get('condicao_clinica') == 'respiratorio':
-                base = 92
-            valor = max(80, min(100, round(random.gauss(base, 1.5),1)))
-            ts = (now + timedelta(seconds=i * interval_seconds)).strftime('%Y-%m-%d %H:%M:%S')
-            records.append({'sensor':'nivel_oxigenacao','valor':valor,'unidade':'%','timestamp':ts})
+            records.append({'sensor':'nivel_oxigenacao','valor':valores[i],'unidade':'%','timestamp':timestamps[i],
+                            'ppg':{'hz':hz,'red':red[i],'ir':ir[i]}})
         return records
@@ -1,18 +1,37 @@
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+import numpy as np
+from utils.rng import ensure_rng
+from utils.random_walk import ar1_coef, ar1_walk
+from utils.timestamps import format_batch
 
 
 class PressaoArterial:
     def __init__(self):
-        pass
+        self.deriva_tau = 600.0
 
-    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=60):
-        now = datetime.now()
+    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=60, rng=None, state=None, start_time=None):
+        rng = ensure_rng(rng)
+        state = state if state is not None else {}
+        if 'syst_base' not in state:
+            state.update({
+                'syst_base': int(rng.integers(110, 131)),
+                'dias_base': int(rng.integers(70, 81)),
+                'deriva_syst': 0.0,
+                'deriva_dias': 0.0
+            })
+        now = start_time or datetime.now()
         steps = int((duration_minutes * 60) / interval_seconds)
+        timestamps = format_batch(now, steps, interval_seconds)
+        phi, sigma = ar1_coef(interval_seconds, self.deriva_tau, 5.0)
+        deriva_syst = ar1_walk(rng, state['deriva_syst'], phi, sigma, steps)
+        phi, sigma = ar1_coef(interval_seconds, self.deriva_tau, 3.0)
+        deriva_dias = ar1_walk(rng, state['deriva_dias'], phi, sigma, steps)
+        syst = np.clip(np.rint(state['syst_base'] + deriva_syst + rng.normal(0, 2, steps)), 90, 180).astype(int).tolist()
+        dias = np.clip(np.rint(state['dias_base'] + deriva_dias + rng.normal(0, 1.5, steps)), 50, 110).astype(int).tolist()
+        if steps:
+            state['deriva_syst'] = float(deriva_syst[-1])
+            state['deriva_dias'] = float(deriva_dias[-1])
         records = []
         for i in range(steps):
-            syst = random.randint(100, 140)
-            dias = random.randint(60, 90)
-            ts = (now + timedelta(seconds=i * interval_seconds)).strftime('%Y-%m-%d %H:%M:%S')
-            records.append({'sensor':'pressao_arterial','valor':f"{syst}/{dias}",'unidade':'mmHg','timestamp':ts})
+            records.append({'sensor':'pressao_arterial','valor':f"{syst[i]}/{dias[i]}",'unidade':'mmHg','timestamp':timestamps[i]})
         return records
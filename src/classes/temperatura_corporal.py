@@ -1,20 +1,51 @@
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+import math
+import numpy as np
+from utils.rng import ensure_rng
+from utils.timestamps import format_batch
 
 
 class TemperaturaCorporal:
+    """
+    Temperatura com episódios de febre: uma cadeia de dois estados (normal/febre,
+    ~10% do tempo em febre, episódios de ~30 min) e aproximação exponencial do alvo.
+    Com `state` o episódio em curso e a última temperatura continuam no próximo lote.
+    """
+
     def __init__(self):
-        pass
+        self.duracao_febre = 30 * 60.0
+        self.duracao_normal = 270 * 60.0
+        self.tau = 300.0
 
-    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=60):
-        now = datetime.now()
+    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=60, rng=None, state=None, start_time=None):
+        rng = ensure_rng(rng)
+        state = state if state is not None else {}
+        if 'base' not in state:
+            base = float(rng.uniform(36.3, 37.1))
+            state.update({'base': base, 'alvo_febre': float(rng.uniform(38.2, 39.5)), 'febre': False, 'valor': base})
+        now = start_time or datetime.now()
         steps = int((duration_minutes * 60) / interval_seconds)
+        timestamps = format_batch(now, steps, interval_seconds)
+
+        p_inicio = 1 - math.exp(-interval_seconds / self.duracao_normal)
+        p_fim = 1 - math.exp(-interval_seconds / self.duracao_febre)
+        alpha = 1 - math.exp(-interval_seconds / self.tau)
+        sorteios = rng.random(steps)
+        ruido = rng.normal(0, 0.05, steps)
+        febre, valor = state['febre'], state['valor']
+        valores = []
+        for i in range(steps):
+            if febre:
+                febre = sorteios[i] >= p_fim
+            elif sorteios[i] < p_inicio:
+                febre = True
+                state['alvo_febre'] = float(rng.uniform(38.2, 39.5))
+            alvo = state['alvo_febre'] if febre else state['base']
+            valor += (alvo - valor) * alpha + ruido[i]
+            valores.append(round(valor, 1))
+        state['febre'], state['valor'] = bool(febre), float(valor)
+
         records = []
         for i in range(steps):
-            if random.random() < 0.9:
-                valor = round(random.uniform(36.0, 37.5),1)
-            else:
-                valor = round(random.uniform(38.0, 40.0),1)
-            ts = (now + timedelta(seconds=i * interval_seconds)).strftime('%Y-%m-%d %H:%M:%S')
-            records.append({'sensor':'temperatura_corporal','valor':valor,'unidade':'C','timestamp':ts})
+            records.append({'sensor':'temperatura_corporal','valor':valores[i],'unidade':'C','timestamp':timestamps[i]})
         return records
@@ -1,20 +1,29 @@
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+import numpy as np
+from utils.rng import ensure_rng
+from utils.random_walk import ar1_coef, ar1_walk
+from utils.timestamps import format_batch
 
 
 class UmidadePele:
     def __init__(self):
-        pass
+        self.deriva_sd = 6.0
+        self.deriva_tau = 600.0
 
-    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=60):
-        now = datetime.now()
+    def start(self, infos_medica: dict, duration_minutes=30, interval_seconds=60, rng=None, state=None, start_time=None):
+        rng = ensure_rng(rng)
+        state = state if state is not None else {}
+        if 'base' not in state:
+            state.update({'base': float(rng.uniform(35.0, 55.0)), 'deriva': 0.0})
+        now = start_time or datetime.now()
         steps = int((duration_minutes * 60) / interval_seconds)
+        timestamps = format_batch(now, steps, interval_seconds)
+        phi, sigma = ar1_coef(interval_seconds, self.deriva_tau, self.deriva_sd)
+        deriva = ar1_walk(rng, state['deriva'], phi, sigma, steps)
+        valores = np.round(np.clip(state['base'] + deriva + rng.normal(0, 1.0, steps), 10.0, 90.0), 1).tolist()
+        if steps:
+            state['deriva'] = float(deriva[-1])
         records = []
         for i in range(steps):
-            if random.random() < 0.9:
-                valor = round(random.uniform(30.0, 60.0),1)
-            else:
-                valor = round(random.uniform(10.0,90.0),1)
-            ts = (now + timedelta(seconds=i * interval_seconds)).strftime('%Y-%m-%d %H:%M:%S')
-            records.append({'sensor':'umidade_pele','valor':valor,'unidade':'%','timestamp':ts})
+            records.append({'sensor':'umidade_pele','valor':valores[i],'unidade':'%','timestamp':timestamps[i]})
         return records
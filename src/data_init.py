@@ -9,19 +9,34 @@ Funcionamento:
 - Usa multiprocessing.Pool para gerar dados em paralelo por paciente.
 - Salva arquivos JSON por paciente em raw/paciente_{id}_{start}.json.
 
-Config via env vars: DB_USER, DB_PASSWORD, DB_HOST (opcional)
+Config via env vars: DB_USER, DB_PASSWORD, DB_HOST (opcional),
+SIM_SEED (semente da execução; repete exatamente os mesmos dados),
+PRODUCER_MODE=pool|async (padrão pool; async usa producer_async.AsyncProducer),
+PRODUCER_SINK=files|shm (shm: workers escrevem em utils.shm_ring e um processo consumidor insere no banco;
+SHM_SLOTS e SHM_SLOT_ROWS dimensionam o anel; SHM_PUT_TIMEOUT é a espera máxima por slot livre),
+BACKPRESSURE_* (marcas d'água do backlog; ver utils.backpressure)
 """
 import os
-import json
+import queue
+import asyncio
 import logging
-from time import sleep
+from time import sleep, time
 from typing import List
 from datetime import date
-from decimal import Decimal
 from datetime import datetime
 from dotenv import load_dotenv
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Pool, Process, cpu_count
 from services.connection_database import DatabaseConnection
+from utils import codec
+from utils.metrics import METRICS
+from utils.custom_logger import setup_queue_logging, worker_logging_init, stop_queue_logging
+from utils.backlog import raw_backlog
+from utils.backpressure import Backpressure
+from utils.sampling_scheduler import SamplingScheduler, stream_id
+from utils.rng import run_seed, patient_seed, sensor_rng, ensure_rng
+from utils.metrics_server import start_metrics_server, metrics_port
+from producer_async import AsyncProducer
+from utils.shm_ring import SharedBatchRing, records_to_columns
 
 LOGGER = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] > %(name)s: %(message)s')
@@ -36,20 +51,6 @@ SENSOR_CLASS_MAP = {
 	'umidade': ('classes.umidade_pele', 'UmidadePele')
 }
 
-# Correção para serializar Decimals e datetimes em JSON (IA)
-class DecimalEncoder(json.JSONEncoder):
-	def default(self, obj):
-		if isinstance(obj, Decimal):
-			return float(obj)
-		try:
-			from datetime import datetime, date, time
-			if isinstance(obj, (datetime, date, time)):
-				return obj.isoformat()
-			
-		except Exception:
-			pass
-		return super(DecimalEncoder, self).default(obj)
-
 def import_sensor_class(sensor_name: str):
 	key = sensor_name.lower()
 	for k, (mod, cls) in SENSOR_CLASS_MAP.items():
@@ -68,15 +69,50 @@ def import_sensor_class(sensor_name: str):
 	return None
 
 
+# Instâncias por processo: os simuladores não guardam estado próprio (ele vem em `state`)
+_SENSOR_INSTANCES = {}
+
+def sensor_instance(sensor_name: str):
+	key = sensor_name.lower()
+	if key not in _SENSOR_INSTANCES:
+		_SENSOR_INSTANCES[key] = import_sensor_class(sensor_name)
+	return _SENSOR_INSTANCES[key]
+
+
 def generate_patient_data(args):
-	paciente, sensors_info, duration_minutes, interval_seconds, output_dir = args
+	return generate_patient_window(args)[0]
+
+
+def generate_patient_window(args):
+	"""
+	Gera a janela de um paciente e devolve (caminho_do_arquivo, estados).
+
+	Cada sensor em sensors_info pode trazer 'state' (do SamplingScheduler): o dict é
+	passado ao start() do simulador, que o atualiza (fase, deriva, rng...), e volta
+	em `estados` (stream_id -> state) para o próximo ciclo continuar dali.
+	"""
+	payload, states, out_path = build_patient_payload(args)
+	return write_payload(payload, out_path), states
+
+
+def build_patient_payload(args):
+	"""
+	Parte de CPU de generate_patient_window: roda os simuladores e monta o payload.
+
+	Returns:
+		tuple: (payload, estados, caminho_de_destino) — nada é gravado em disco.
+	"""
+	paciente, sensors_info, duration_minutes, interval_seconds, output_dir = args[:5]
+	# semente do paciente (utils.rng.patient_seed); sem ela cada sensor usa um rng não semeado
+	seed_seq = args[5] if len(args) > 5 else None
 	pid = paciente.get('id')
 	LOGGER.info("Gerando dados para paciente %s", pid)
 
 	all_records = []
+	states = {}
 	for s in sensors_info:
 		sensor_name = s.get('nome') or s.get('sensor_nome', '')
-		sensor_inst = import_sensor_class(sensor_name)
+		sensor_inst = sensor_instance(sensor_name)
 		infos_medica = {
 			'idade': paciente.get('idade') if 'idade' in paciente else 45,
 			'peso': paciente.get('peso'),
@@ -85,8 +121,22 @@ def generate_patient_data(args):
 		if sensor_inst is None:
 			LOGGER.debug("Nenhuma classe para sensor %s - pulando", sensor_name)
 			continue
+		sensor_interval = s.get('interval_seconds', interval_seconds)
+		sensor_duration = duration_minutes
+		if s.get('steps'):
+			# meio intervalo de folga para o int() do start() não perder a última amostra
+			sensor_duration = (s['steps'] * sensor_interval + sensor_interval / 2) / 60.0
+		state = s.get('state')
+		state = state if state is not None else {}
+		if 'rng' not in state:
+			state['rng'] = sensor_rng(seed_seq, s) if seed_seq is not None else ensure_rng()
+		states[stream_id(s)] = state
+		# timestamps a partir do instante agendado do fluxo (não do relógio na geração):
+		# lotes consecutivos de um fluxo ficam contíguos mesmo com o produtor atrasado
+		start_time = datetime.fromtimestamp(s['start_ts']) if s.get('start_ts') is not None else None
 		try:
-			recs = sensor_inst.start(infos_medica, duration_minutes=duration_minutes, interval_seconds=interval_seconds)
+			recs = sensor_inst.start(infos_medica, duration_minutes=sensor_duration, interval_seconds=sensor_interval,
+									 rng=state['rng'], state=state, start_time=start_time)
 			if isinstance(recs, list):
 				all_records.extend(recs)
 				
@@ -95,7 +145,6 @@ def generate_patient_data(args):
 
 	start_ts = datetime.now().strftime('%Y%m%d_%H%M%S')
 	filename = f"paciente_{pid}_{start_ts}.json"
-	os.makedirs(output_dir, exist_ok=True)
 	out_path = os.path.join(output_dir, filename)
 
 	payload = {
@@ -103,10 +152,69 @@ def generate_patient_data(args):
 		'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
 		'records': all_records
 	}
+	return payload, states, out_path
+
+
+def encode_patient_payload(args):
+	# build + serialização em um só passo: devolve bytes, que custam pouco para voltar de outro processo
+	payload, states, out_path = build_patient_payload(args)
+	return codec.dumps(payload), states, out_path
+
+
+# Anel de memória compartilhada do worker (PRODUCER_SINK=shm), definido em worker_ring_init
+_RING = None
+SHM_PUT_TIMEOUT = float(os.getenv('SHM_PUT_TIMEOUT', '60'))
+
+def worker_ring_init(log_queue, level, ring):
+	global _RING
+	worker_logging_init(log_queue, level)
+	_RING = ring
+
 
+def generate_patient_shm(args):
+	"""
+	Variante de generate_patient_window para PRODUCER_SINK=shm: as colunas vão direto
+	para slots do anel e só os índices passam pela fila (nada de arquivo nem pickle dos registros).
+	"""
+	payload, states, _ = build_patient_payload(args)
+	pid = payload['paciente'].get('id')
+	try:
+		slots = _RING.put(pid, records_to_columns(payload['records']), timeout=SHM_PUT_TIMEOUT)
+	except queue.Empty:
+		raise RuntimeError(f'Nenhum slot livre no anel em {SHM_PUT_TIMEOUT:g}s (consumidor parado?)') from None
+	LOGGER.info('Paciente %s publicado nos slots %s (registros: %d)', pid, slots, len(payload['records']))
+	return 'shm:' + ','.join(str(s) for s in slots), states
+
+
+def ring_consumer_main(ring, log_queue):
+	# alvo do processo consumidor do anel; importa o consumidor só aqui (pandas)
+	worker_logging_init(log_queue, logging.INFO)
+	from process_and_save import consume_ring
+	consume_ring(ring)
+
+
+def check_ring_consumer(consumer):
+	# sem consumidor ninguém libera slots: o ciclo seguinte travaria esperando o anel
+	if consumer is not None and not consumer.is_alive():
+		raise RuntimeError(f'Consumidor do anel encerrado (exitcode={consumer.exitcode}); parando o produtor')
+
+
+def write_payload(payload, out_path):
+	"""
+	Parte de I/O: serializa e grava o payload de forma atômica (tmp + fsync + os.replace com retry).
+
+	Args:
+		payload (dict | bytes): Payload, ou o payload já serializado (encode_patient_payload).
+		out_path (str): Caminho final do arquivo.
+
+	Returns:
+		str | None: Caminho gravado, o `.failed` deixado para inspeção, ou None.
+	"""
+	data = payload if isinstance(payload, bytes) else codec.dumps(payload)
+	os.makedirs(os.path.dirname(out_path), exist_ok=True)
 	tmp_path = out_path + '.tmp'
-	with open(tmp_path, 'w', encoding='utf-8') as tf:
-		json.dump(payload, tf, ensure_ascii=False, indent=2, cls=DecimalEncoder)
+	with open(tmp_path, 'wb') as tf:
+		tf.write(data)
 		tf.flush()
 		try:
 			os.fsync(tf.fileno())
@@ -140,7 +248,7 @@ def generate_patient_data(args):
 				return None
 
 	if moved:
-		LOGGER.info('Arquivo salvo: %s (registros: %d)', out_path, len(all_records))
+		LOGGER.info('Arquivo salvo: %s (%d bytes)', out_path, len(data))
 		return out_path
 	else:
 		return None
@@ -172,13 +280,13 @@ def fetch_sensors_for_patient(db: DatabaseConnection, paciente_id: int):
 	if not db or not getattr(db, 'connection', None):
 		# default set
 		return [
-			{'sensor_id': 1, 'nome': 'frequencia_cardiaca'},
-			{'sensor_id': 2, 'nome': 'glicose'},
-			{'sensor_id': 3, 'nome': 'temperatura_corporal'}
+			{'sensor_id': 1, 'nome': 'frequencia_cardiaca', 'intervalo_captura': 1},
+			{'sensor_id': 2, 'nome': 'glicose', 'intervalo_captura': 300},
+			{'sensor_id': 3, 'nome': 'temperatura_corporal', 'intervalo_captura': 60}
 		]
 
 	cursor = db.connection.cursor(dictionary=True)
-	query = ("SELECT ps.id as paciente_sensor_id, s.id as sensor_id, s.nome, s.tipo_registro, s.unidade_medida "
+	query = ("SELECT ps.id as paciente_sensor_id, ps.intervalo_captura, s.id as sensor_id, s.nome, s.tipo_registro, s.unidade_medida "
 			 "FROM paciente_sensor ps JOIN sensor s ON ps.sensor_id = s.id WHERE ps.paciente_id = %s")
 	cursor.execute(query, (paciente_id,))
 	rows = cursor.fetchall()
@@ -186,12 +294,138 @@ def fetch_sensors_for_patient(db: DatabaseConnection, paciente_id: int):
 	return rows
 
 
+def fetch_sensors_for_patients(db: DatabaseConnection, paciente_ids) -> dict:
+	# Uma consulta para todos os pacientes do ciclo (em vez de uma ida ao banco por paciente)
+	if not db or not getattr(db, 'connection', None):
+		return {pid: fetch_sensors_for_patient(db, pid) for pid in paciente_ids}
+
+	by_patient = {pid: [] for pid in paciente_ids}
+	if not by_patient:
+		return by_patient
+	cursor = db.connection.cursor(dictionary=True)
+	placeholders = ', '.join(['%s'] * len(by_patient))
+	query = ("SELECT ps.paciente_id, ps.id as paciente_sensor_id, ps.intervalo_captura, s.id as sensor_id, s.nome, s.tipo_registro, s.unidade_medida "
+			 f"FROM paciente_sensor ps JOIN sensor s ON ps.sensor_id = s.id WHERE ps.paciente_id IN ({placeholders})")
+	cursor.execute(query, tuple(by_patient))
+	for row in cursor.fetchall():
+		by_patient.setdefault(row.pop('paciente_id'), []).append(row)
+	cursor.close()
+	return by_patient
+
+
+def build_due_tasks(db, scheduler: SamplingScheduler, patients, window_seconds, interval_seconds, output_dir, seed=None, cycle=0):
+	# Só pacientes com algum fluxo devido nesta janela viram tarefa;
+	# cada uma leva a semente (seed, cycle, paciente) para o worker
+	now = time()
+	sensors = fetch_sensors_for_patients(db, [p.get('id') for p in patients])
+	for p in patients:
+		scheduler.sync(p, sensors.get(p.get('id'), []), now)
+	due = scheduler.due(now, window_seconds)
+	duration_minutes = window_seconds / 60.0
+	return [(p, sensors, duration_minutes, interval_seconds, output_dir,
+			 patient_seed(seed, p.get('id'), cycle) if seed is not None else None)
+			for p, sensors in due.values()]
+
+
+def store_window_states(scheduler: SamplingScheduler, tasks, results):
+	# devolve ao agendador o estado de cada fluxo e retorna só os caminhos gerados
+	paths = []
+	for task, (path, states) in zip(tasks, results):
+		scheduler.store_states(task[0].get('id'), states)
+		paths.append(path)
+	return paths
+
+
+def _update_backlog_metrics(raw_dir, ring=None):
+	# backlog visto pelo produtor: slots pendentes do anel (PRODUCER_SINK=shm) ou arquivos/bytes em raw
+	if ring is not None:
+		pending = max(0, ring.pending())
+		METRICS.gauge('shm_ring_pending').set(pending)
+		return pending, pending * ring.slot_bytes
+	files, size = raw_backlog(raw_dir)
+	METRICS.gauge('raw_backlog_files').set(files)
+	METRICS.gauge('raw_backlog_bytes').set(size)
+	return files, size
+
+
+def new_backpressure(ring=None):
+	# no modo shm a marca é em slots (1/4 do anel); o anel cheio já bloqueia os workers
+	bp = Backpressure(high_files=max(1, ring.slots // 4), high_bytes=0) if ring is not None else Backpressure()
+	METRICS.gauge('backpressure_high_files').set(bp.high_files)
+	METRICS.gauge('backpressure_high_bytes').set(bp.high_bytes)
+	LOGGER.info('Backpressure: marcas %d arquivos / %d bytes; descarte de %s', bp.high_files, bp.high_bytes,
+				sorted(bp.shed_sensors))
+	return bp
+
+
+def backpressure_paused(bp: Backpressure, backlog) -> bool:
+	"""
+	Atualiza o nível de `bp` com o backlog (arquivos, bytes) e publica as métricas.
+
+	Returns:
+		bool: True se o ciclo deve ser pulado (nível pausa).
+	"""
+	anterior = bp.state
+	bp.update(*backlog)
+	METRICS.gauge('backpressure_level').set(bp.level)
+	METRICS.gauge('backpressure_ratio').set(round(bp.ratio, 3))
+	if bp.state != anterior:
+		LOGGER.warning('Backpressure %s -> %s (backlog: %d arquivos, %d bytes)', anterior, bp.state, *backlog)
+	if bp.paused():
+		METRICS.counter('producer_cycles_paused_total').inc()
+		return True
+	return False
+
+
+def shed_tasks(bp: Backpressure, tasks):
+	tasks, dropped = bp.shed(tasks)
+	if dropped:
+		METRICS.counter('producer_streams_shed_total').inc(dropped)
+		LOGGER.info('Backpressure: %d fluxos de baixa prioridade descartados neste ciclo', dropped)
+	return tasks
+
+
+async def run_async_producer(db, scheduler, output_dir, seed, log_queue, generation_interval_seconds,
+							 batch_duration_seconds, interval_seconds, n_patients=100):
+	producer = AsyncProducer(generate_patient_window, encode_patient_payload, write_payload,
+							 process_initializer=worker_logging_init, process_initargs=(log_queue, logging.INFO))
+	LOGGER.info('Modo asyncio: %d threads de escrita, até %d processos para ciclos com >= %d registros',
+				producer.writer_threads, producer.cpu_workers, producer.process_min_records)
+	bp = new_backpressure()
+	cycle = 0
+	try:
+		while True:
+			if backpressure_paused(bp, _update_backlog_metrics(output_dir)):
+				await asyncio.sleep(generation_interval_seconds)
+				continue
+			patients = await producer.metadata(fetch_first_n_patients, db, n_patients)
+			LOGGER.info('Pacientes a processar neste ciclo: %d', len(patients))
+			tasks = shed_tasks(bp, await producer.metadata(build_due_tasks, db, scheduler, patients, batch_duration_seconds,
+														   interval_seconds, output_dir, seed, cycle))
+			cycle += 1
+
+			METRICS.gauge('producer_queue_depth').set(len(tasks))
+			with METRICS.timed('producer_cycle_seconds'):
+				results = store_window_states(scheduler, tasks, await producer.run_cycle(tasks))
+			METRICS.gauge('producer_queue_depth').set(0)
+			METRICS.counter('producer_files_total').inc(sum(1 for r in results if r))
+			_update_backlog_metrics(output_dir)
+			LOGGER.info('Ciclo concluído. Arquivos gerados: %d', len(results))
+			await asyncio.sleep(bp.sleep_seconds(generation_interval_seconds))
+	finally:
+		producer.close()
+
+
 def main():
+	log_queue = setup_queue_logging(logging.INFO)
 	load_dotenv()
 	user = os.getenv('DB_USER')
 	pwd = os.getenv('DB_PASSWORD')
 	host = os.getenv('DB_HOST', 'localhost')
 	output_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'output', 'raw'))
+	metrics_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'reports', 'metrics_producer.jsonl'))
+	METRICS.start_flusher(metrics_path)
+	start_metrics_server(metrics_port('PRODUCER_METRICS_PORT', 9101))
 
 	db = DatabaseConnection(user=user or '', password=pwd or '', host=host, database='health_data')
 	db.open_connection()
@@ -200,51 +434,95 @@ def main():
 	sensor_interval_seconds = 1
 	batch_duration_seconds = 10
 
-	duration_minutes = batch_duration_seconds / 60.0
 	interval_seconds = sensor_interval_seconds
 
 	continuous = bool(getattr(db, 'connection', None))
-
+	scheduler = SamplingScheduler(default_interval_seconds=sensor_interval_seconds)
+
+	seed = run_seed()
+	cycle = 0
+
+	producer_mode = os.getenv('PRODUCER_MODE', 'pool').lower()
+	sink = os.getenv('PRODUCER_SINK', 'files').lower()
+	if sink == 'shm' and producer_mode == 'async':
+		LOGGER.warning('PRODUCER_SINK=shm requer PRODUCER_MODE=pool; gravando arquivos')
+		sink = 'files'
+
+	ring = consumer = None
+	worker_fn = generate_patient_window
+	pool_init, pool_args = worker_logging_init, (log_queue, logging.INFO)
+	if sink == 'shm':
+		ring = SharedBatchRing(int(os.getenv('SHM_SLOTS', '64')), int(os.getenv('SHM_SLOT_ROWS', '4096')))
+		consumer = Process(target=ring_consumer_main, args=(ring, log_queue), name='ring-consumer', daemon=True)
+		consumer.start()
+		worker_fn = generate_patient_shm
+		pool_init, pool_args = worker_ring_init, (log_queue, logging.INFO, ring)
+		LOGGER.info('Anel em memória compartilhada %s: %d slots x %d linhas', ring.name, ring.slots, ring.rows)
 	processes = min(8, max(1, cpu_count()))
-	LOGGER.info('Usando %d processos; modo contínuo=%s', processes, continuous)
+	bp = new_backpressure(ring) if producer_mode != 'async' else None
+	LOGGER.info('Modo %s; %d processos; modo contínuo=%s; SIM_SEED=%d', producer_mode, processes, continuous, seed)
 
 	try:
-		if continuous:
+		if producer_mode == 'async':
+			asyncio.run(run_async_producer(db, scheduler, output_dir, seed, log_queue, generation_interval_seconds,
+										   batch_duration_seconds, interval_seconds))
+		elif continuous:
 			# Pool contínuo 
-			with Pool(processes=processes) as pool:
+			with Pool(processes=processes, initializer=pool_init, initargs=pool_args) as pool:
 				LOGGER.info('Iniciando loop contínuo de geração (pressione Ctrl+C para parar)')
 				while True:
+					check_ring_consumer(consumer)
+					if backpressure_paused(bp, _update_backlog_metrics(output_dir, ring)):
+						sleep(generation_interval_seconds)
+						continue
 					patients = fetch_first_n_patients(db, n=100)
 					LOGGER.info('Pacientes a processar neste ciclo: %d', len(patients))
-					tasks = []
-					for p in patients:
-						sensors = fetch_sensors_for_patient(db, p.get('id'))
-						tasks.append((p, sensors, duration_minutes, interval_seconds, output_dir))
-
-					results = pool.map(generate_patient_data, tasks)
+					tasks = shed_tasks(bp, build_due_tasks(db, scheduler, patients, batch_duration_seconds, interval_seconds,
+														   output_dir, seed, cycle))
+					cycle += 1
+
+					METRICS.gauge('producer_queue_depth').set(len(tasks))
+					with METRICS.timed('producer_cycle_seconds'):
+						results = store_window_states(scheduler, tasks, pool.map(worker_fn, tasks))
+					METRICS.gauge('producer_queue_depth').set(0)
+					METRICS.counter('producer_files_total').inc(sum(1 for r in results if r))
+					_update_backlog_metrics(output_dir, ring)
 					LOGGER.info('Ciclo concluído. Arquivos gerados: %d', len(results))
-					sleep(generation_interval_seconds)
+					sleep(bp.sleep_seconds(generation_interval_seconds))
 		else:
 			# modo dry-run 
 			LOGGER.info('Entrando em loop dry-run (gerando lotes a cada %ds)', generation_interval_seconds)
-			with Pool(processes=processes) as pool:
+			with Pool(processes=processes, initializer=pool_init, initargs=pool_args) as pool:
 				while True:
+					check_ring_consumer(consumer)
+					if backpressure_paused(bp, _update_backlog_metrics(output_dir, ring)):
+						sleep(generation_interval_seconds)
+						continue
 					patients = fetch_first_n_patients(db, n=100)
 					LOGGER.info('Pacientes a processar: %d', len(patients))
-					tasks = []
-					for p in patients:
-						sensors = fetch_sensors_for_patient(db, p.get('id'))
-						tasks.append((p, sensors, duration_minutes, interval_seconds, output_dir))
+					tasks = shed_tasks(bp, build_due_tasks(db, scheduler, patients, batch_duration_seconds, interval_seconds,
+														   output_dir, seed, cycle))
+					cycle += 1
 
 					LOGGER.info('Iniciando pool com %d processos', processes)
-					results = pool.map(generate_patient_data, tasks)
+					METRICS.gauge('producer_queue_depth').set(len(tasks))
+					with METRICS.timed('producer_cycle_seconds'):
+						results = store_window_states(scheduler, tasks, pool.map(worker_fn, tasks))
+					METRICS.gauge('producer_queue_depth').set(0)
+					METRICS.counter('producer_files_total').inc(sum(1 for r in results if r))
+					_update_backlog_metrics(output_dir, ring)
 					LOGGER.info('Geração do lote concluída. Arquivos: %s', results)
-					sleep(generation_interval_seconds)
+					sleep(bp.sleep_seconds(generation_interval_seconds))
 	except KeyboardInterrupt:
 		LOGGER.info('Execução interrompida pelo usuário')
 	finally:
+		if ring is not None:
+			ring.stop()
+			consumer.join(timeout=30)
+			ring.close()
 		if getattr(db, 'connection', None):
 			db.close_connection()
+		stop_queue_logging()
 
 
 if __name__ == '__main__':
@@ -3,14 +3,30 @@ Consumidor simples para processar os arquivos gerados
 
 Le arquivos JSON, faz a limpeza mínima com "Spark", salva em trusted e
 insere no banco de dados (tabela registro) quando houver mapeamento paciente_sensor.
+Linhas rejeitadas vão para o dead-letter (utils.dead_letter) e podem ser
+reprocessadas com src/replay_dead_letter.py.
 """
 import os
-import json
 import time
 import logging
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from services.connection_database import DatabaseConnection
+from utils import codec
+from utils.metrics import METRICS
+from utils.custom_logger import setup_queue_logging, stop_queue_logging
+from utils.backlog import raw_backlog
+from utils.metrics_server import start_metrics_server, metrics_port
+from utils.shm_ring import SENSORES, STOP, format_valores
+from utils.dead_letter import DeadLetterStore, REPLAY_REASONS, rejected_row
+
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except Exception:
+    ijson = None
+    IJSON_AVAILABLE = False
 
 LOGGER = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] > %(name)s: %(message)s')
@@ -23,7 +39,7 @@ def list_raw_files(raw_dir):
     files = []
     now = time.time()
     for f in os.listdir(raw_dir):
-        if not f.endswith('.json'):
+        if not f.endswith(('.json', '.jsonl')):
             continue
         p = os.path.join(raw_dir, f)
         try:
@@ -42,6 +58,243 @@ def list_raw_files(raw_dir):
     return sorted(files)
 
 
+INSERT_Q = 'INSERT INTO registro (valor, created_at, paciente_sensor_id) VALUES (%s, %s, %s)'
+STREAMING_CHUNK_SIZE = int(os.getenv('CONSUMER_CHUNK_SIZE', '5000'))
+STREAMING_THRESHOLD_BYTES = int(float(os.getenv('CONSUMER_STREAMING_THRESHOLD_MB', '16')) * 1024 * 1024)
+
+
+def canon(s):
+    return ''.join(ch for ch in str(s or '').lower() if ch.isalnum())
+
+
+_DEAD_LETTERS = {}
+
+def dead_letter_store(raw_dir) -> DeadLetterStore:
+    # um store por diretório raw (dead_letter/ fica ao lado de broken/)
+    if raw_dir not in _DEAD_LETTERS:
+        _DEAD_LETTERS[raw_dir] = DeadLetterStore(os.path.join(raw_dir, 'dead_letter'))
+    return _DEAD_LETTERS[raw_dir]
+
+
+def _dead_letter(raw_dir, rejected, source):
+    if not rejected:
+        return
+    try:
+        dead_letter_store(raw_dir).append(rejected, source=source)
+    except Exception:
+        LOGGER.exception('Falha ao gravar %d linhas rejeitadas de %s no dead-letter', len(rejected), source)
+        return
+    counts = {}
+    for r in rejected:
+        counts[r['reason']] = counts.get(r['reason'], 0) + 1
+    for reason, n in counts.items():
+        METRICS.counter('consumer_dead_letter_rows_total', reason=reason).inc(n)
+    rejected.clear()
+
+
+# Registros de um arquivo já inseridos (e gravados em trusted) antes de uma falha no meio
+# dele: '<arquivo>.committed' acompanha o arquivo em raw/ e em raw/broken/, e o
+# reprocessamento pula esses registros em vez de inseri-los de novo.
+COMMITTED_SUFFIX = '.committed'
+
+
+def read_committed(path) -> int:
+    try:
+        with open(path + COMMITTED_SUFFIX, 'r', encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _clear_committed(path):
+    try:
+        os.remove(path + COMMITTED_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def _trusted_path(trusted_dir, path, skip=0):
+    # um arquivo retomado grava só o restante, sem sobrescrever o trusted da primeira parte
+    base = os.path.basename(path)
+    if base.endswith('.jsonl'):
+        base = base[:-1]
+    if skip:
+        stem, ext = os.path.splitext(base)
+        base = f'{stem}_a_partir_de_{skip}{ext}'
+    return os.path.join(trusted_dir, base)
+
+
+def _move_to_broken(path, err, committed=0):
+    # Pasta 'broken' para investigação
+    bad_dir = os.path.join(os.path.dirname(path), 'broken')
+    os.makedirs(bad_dir, exist_ok=True)
+    bad_path = os.path.join(bad_dir, os.path.basename(path) + '.bad')
+    try:
+        os.replace(path, bad_path)
+    except Exception:
+        LOGGER.exception('Falha ao mover arquivo corrompido %s', path)
+    _clear_committed(path)
+    if committed:
+        with open(bad_path + COMMITTED_SUFFIX, 'w', encoding='utf-8') as f:
+            f.write(str(committed))
+        LOGGER.error('Arquivo inválido movido para %s após %d registros já inseridos (serão pulados ao reprocessar): %s',
+                     bad_path, committed, err)
+    else:
+        LOGGER.error('Arquivo JSON inválido movido para %s: %s', bad_path, err)
+    try:
+        dead_letter_store(os.path.dirname(path)).quarantine(bad_path, err, source=path, committed=committed)
+    except Exception:
+        LOGGER.exception('Falha ao registrar %s na quarentena', bad_path)
+    METRICS.counter('consumer_files_total', result='broken').inc()
+
+
+def _normalize(records):
+    df = pd.json_normalize(records)
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+        df = df.dropna(subset=['timestamp'])
+    return df
+
+
+def _trusted_json(df) -> bytes:
+    # array JSON dos registros normalizados direto do pandas (sem voltar a objetos Python)
+    return df.to_json(orient='records', date_format='iso', force_ascii=False).encode('utf-8')
+
+
+def _load_mappings(cursor, paciente_id):
+    try:
+        cursor.execute('SELECT id, nome FROM sensor')
+        sensor_rows = cursor.fetchall() or []
+
+    except Exception:
+        sensor_rows = []
+
+    sensors_map = {canon(r.get('nome')): r.get('id') for r in sensor_rows}
+
+    try:
+        cursor.execute('SELECT id, sensor_id FROM paciente_sensor WHERE paciente_id=%s', (paciente_id,))
+        ps_rows = cursor.fetchall() or []
+    except Exception:
+        ps_rows = []
+    paciente_sensor_map = {r.get('sensor_id'): r.get('id') for r in ps_rows}
+    return sensors_map, paciente_sensor_map
+
+
+def _new_insert_stats():
+    return {
+        'total_rows': 0,
+        'inserted': 0,
+        'no_sensor': 0,
+        'no_paciente_sensor': 0,
+        'invalid_value': 0,
+        'altered_id_autoinc': False
+    }
+
+
+def _insert_rows(df, db, cursor, paciente, sensors_map, paciente_sensor_map, stats, rejected=None, raise_errors=False):
+    # rejected (list, opcional) recebe as linhas puladas (rejected_row) para o dead-letter;
+    # raise_errors propaga o erro de INSERT em vez de desfazer e seguir (lote tudo-ou-nada do replay)
+    def reject(reason, sensor, valor, ts):
+        stats[reason] += 1
+        if rejected is not None:
+            rejected.append(rejected_row(reason, paciente.get('id'), sensor, valor, ts))
+
+    db_insert_latency = METRICS.timed('consumer_db_latency_seconds', op='insert')
+
+    for _, row in df.iterrows():
+        stats['total_rows'] += 1
+        sensor = row.get('sensor') or row.get('sensor_name') or row.get('nome')
+        valor = row.get('valor') if 'valor' in row.index else None
+        ts = row.get('timestamp')
+
+        if pd.isna(sensor):
+            LOGGER.debug('Linha sem sensor definido — pulando')
+            reject('no_sensor', None, valor, ts)
+            continue
+
+        key = canon(sensor)
+        sensor_id = sensors_map.get(key)
+
+        # fallback
+        if sensor_id is None:
+            try:
+                cursor.execute('SELECT id, nome FROM sensor WHERE nome LIKE %s LIMIT 1', (f'%{sensor}%',))
+                res = cursor.fetchone()
+                if res:
+                    sensor_id = res.get('id')
+                    sensors_map[canon(res.get('nome'))] = sensor_id
+            except Exception:
+                LOGGER.exception('Erro consultando sensor %s', sensor)
+
+        if sensor_id is None:
+            reject('no_sensor', sensor, valor, ts)
+            LOGGER.debug('Sensor não encontrado para %s', sensor)
+            continue
+
+        paciente_sensor_id = paciente_sensor_map.get(sensor_id)
+        if paciente_sensor_id is None:
+            reject('no_paciente_sensor', sensor, valor, ts)
+            LOGGER.debug('Nenhum mapeamento paciente_sensor para paciente=%s sensor_id=%s', paciente.get('id'), sensor_id)
+            continue
+
+        if valor is None or pd.isna(valor):
+            reject('invalid_value', sensor, None, ts)
+            LOGGER.debug('Valor inválido para sensor %s: %s', sensor, valor)
+            continue
+
+        # Format timestamp
+        if hasattr(ts, 'strftime'):
+            ts_str = ts.strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            ts_str = str(ts)
+
+        try:
+            with db_insert_latency:
+                cursor.execute(INSERT_Q, (str(valor), ts_str, paciente_sensor_id))
+            stats['inserted'] += 1
+        except Exception as e:
+            # Correção de IA
+            # Detectar erro típico quando a coluna id não tem AUTO_INCREMENT no schema
+            msg = str(e)
+            if ("doesn't have a default value" in msg or '1364' in msg) and not stats['altered_id_autoinc']:
+                LOGGER.warning('Erro de schema detectado ao inserir: %s. Tentando adicionar AUTO_INCREMENT em registro.id', msg)
+                try:
+                    cursor.execute('ALTER TABLE registro MODIFY COLUMN id INT NOT NULL AUTO_INCREMENT')
+                    db.connection.commit()
+                    stats['altered_id_autoinc'] = True
+                    cursor.execute(INSERT_Q, (str(valor), ts_str, paciente_sensor_id))
+                    stats['inserted'] += 1
+                    continue
+                except Exception:
+                    LOGGER.exception('Falha ao aplicar ALTER TABLE para registro.id')
+                    db.connection.rollback()
+            if raise_errors:
+                raise
+            LOGGER.exception('Erro ao inserir registro: sensor=%s paciente_sensor_id=%s (%s)', sensor, paciente_sensor_id, msg)
+            db.connection.rollback()
+
+
+def _commit(db) -> bool:
+    try:
+        with METRICS.timed('consumer_db_latency_seconds', op='commit'):
+            db.connection.commit()
+        return True
+    except Exception:
+        LOGGER.exception('Erro no commit final')
+        return False
+
+
+def _report_insert_stats(stats):
+    LOGGER.info('Linhas no arquivo: %d; Inseridos %d registros no banco (skipped: no_sensor=%d, no_paciente_sensor=%d, invalid_value=%d)',
+                stats['total_rows'], stats['inserted'], stats['no_sensor'], stats['no_paciente_sensor'], stats['invalid_value'])
+
+    METRICS.counter('consumer_rows_inserted_total').inc(stats['inserted'])
+    METRICS.counter('consumer_rows_skipped_total', reason='no_sensor').inc(stats['no_sensor'])
+    METRICS.counter('consumer_rows_skipped_total', reason='no_paciente_sensor').inc(stats['no_paciente_sensor'])
+    METRICS.counter('consumer_rows_skipped_total', reason='invalid_value').inc(stats['invalid_value'])
+
+
+@METRICS.timed('consumer_process_file_seconds')
 def process_file(path, db: DatabaseConnection, trusted_dir):
     LOGGER.info('Iniciando processamento de arquivo: %s', path)
     try:
@@ -54,10 +307,10 @@ def process_file(path, db: DatabaseConnection, trusted_dir):
     last_err = None
     for attempt in range(3):
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                payload = json.load(f)
+            with open(path, 'rb') as f:
+                payload = codec.decode_payload(f.read())
             break
-        except json.JSONDecodeError as e:
+        except codec.DecodeError as e:
             last_err = e
             LOGGER.warning('JSONDecodeError ao ler %s (attempt %d): %s', path, attempt + 1, e)
             time.sleep(0.5 * (attempt + 1))
@@ -68,163 +321,402 @@ def process_file(path, db: DatabaseConnection, trusted_dir):
             break
 
     if payload is None:
-        # Pasta 'broken' para investigação
-        bad_dir = os.path.join(os.path.dirname(path), 'broken')
-        os.makedirs(bad_dir, exist_ok=True)
-        bad_path = os.path.join(bad_dir, os.path.basename(path) + '.bad')
-        try:
-            os.replace(path, bad_path)
-        except Exception:
-            LOGGER.exception('Falha ao mover arquivo corrompido %s', path)
-        LOGGER.error('Arquivo JSON inválido movido para %s: %s', bad_path, last_err)
+        _move_to_broken(path, last_err)
         return
 
     try:
-        paciente = payload.get('paciente', {})
-        records = payload.get('records', [])
+        paciente, records = codec.payload_parts(payload)
     except Exception as e:
         LOGGER.exception('Payload inesperado no arquivo %s: %s', path, e)
         return
 
+    skip = read_committed(path)
+    if skip:
+        LOGGER.info('Arquivo %s retomado: pulando %d registros já inseridos', path, skip)
+        records = records[skip:]
+
     LOGGER.info('Arquivo %s: paciente_id=%s nome=%s registros=%d', path, paciente.get('id'), paciente.get('nome'), len(records))
 
     if not records:
         LOGGER.info('Arquivo %s sem registros — removendo', path)
         os.remove(path)
+        _clear_committed(path)
+        METRICS.counter('consumer_files_total', result='empty').inc()
         return
 
-    df = pd.json_normalize(records)
-    if 'timestamp' in df.columns:
-        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-        df = df.dropna(subset=['timestamp'])
-    
-    records_proc = json.loads(df.to_json(orient='records', date_format='iso'))
+    df = _normalize(records)
 
     os.makedirs(trusted_dir, exist_ok=True)
-    base = os.path.basename(path)
-    trusted_path = os.path.join(trusted_dir, base)
-    with open(trusted_path, 'w', encoding='utf-8') as f:
-        json.dump(records_proc, f, ensure_ascii=False, indent=2)
+    trusted_path = _trusted_path(trusted_dir, path, skip)
+    with open(trusted_path, 'wb') as f:
+        f.write(_trusted_json(df))
 
-    LOGGER.info('Arquivo processado e salvo em trusted: %s (registros: %d)', trusted_path, len(records_proc))
+    LOGGER.info('Arquivo processado e salvo em trusted: %s (registros: %d)', trusted_path, len(df))
 
     if db and getattr(db, 'connection', None):
         cursor = db.connection.cursor(dictionary=True)
-        insert_q = 'INSERT INTO registro (valor, created_at, paciente_sensor_id) VALUES (%s, %s, %s)'
-
+        sensors_map, paciente_sensor_map = _load_mappings(cursor, paciente.get('id'))
+        stats = _new_insert_stats()
+        rejected = []
+        _insert_rows(df, db, cursor, paciente, sensors_map, paciente_sensor_map, stats, rejected)
+        _commit(db)
         try:
-            cursor.execute('SELECT id, nome FROM sensor')
-            sensor_rows = cursor.fetchall() or []
-
+            cursor.close()
         except Exception:
-            sensor_rows = []
-        def canon(s):
-            return ''.join(ch for ch in str(s or '').lower() if ch.isalnum())
+            pass
+        _dead_letter(os.path.dirname(path), rejected, path)
+        _report_insert_stats(stats)
 
-        sensors_map = {canon(r.get('nome')): r.get('id') for r in sensor_rows}
+    # TODO: Verificar se é valida a remoção após processado
+    os.remove(path)
+    _clear_committed(path)
+    METRICS.counter('consumer_files_total', result='ok').inc()
+
+
+def _first_char(f):
+    while True:
+        ch = f.read(1)
+        if not ch or not ch.isspace():
+            f.seek(0)
+            return ch
+
+
+def iter_record_chunks(path, chunk_size=STREAMING_CHUNK_SIZE, skip=0):
+    """
+    Lê um arquivo raw em blocos de até chunk_size registros, sem carregar o arquivo inteiro.
+    Os `skip` primeiros registros são pulados (retomada após falha, ver COMMITTED_SUFFIX).
+
+    Formatos aceitos:
+    - JSON Lines (.jsonl): primeira linha com {"paciente": ...}, demais linhas com um registro cada.
+    - Payload do produtor ({"paciente": ..., "records": [...]}) ou array de registros
+      (raw_health_data_*.json do DataIngestion), lidos incrementalmente com ijson.
+
+    Yields:
+        tuple: (paciente, lista_de_registros)
+    """
+    if path.endswith('.jsonl'):
+        paciente = {}
+        chunk = []
+        with open(path, 'rb') as f:
+            for i, line in enumerate(f):
+                if not line.strip():
+                    continue
+                if i > 0 and skip:
+                    # linhas já inseridas nem são decodificadas
+                    skip -= 1
+                    continue
+                obj = codec.loads(line)
+                if i == 0 and isinstance(obj, dict) and 'paciente' in obj:
+                    paciente = obj.get('paciente') or {}
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                chunk.append(obj)
+                if len(chunk) >= chunk_size:
+                    yield paciente, chunk
+                    chunk = []
+        if chunk:
+            yield paciente, chunk
+        return
 
-        try:
-            cursor.execute('SELECT id, sensor_id FROM paciente_sensor WHERE paciente_id=%s', (paciente.get('id'),))
-            ps_rows = cursor.fetchall() or []
-        except Exception:
-            ps_rows = []
-        paciente_sensor_map = {r.get('sensor_id'): r.get('id') for r in ps_rows}
-
-        inserted = 0
-        skipped_no_sensor = 0
-        skipped_no_paciente_sensor = 0
-        skipped_invalid_value = 0
-        total_rows = 0
-        altered_id_autoinc = False
-
-        for _, row in df.iterrows():
-            total_rows += 1
-            sensor = row.get('sensor') or row.get('sensor_name') or row.get('nome')
-            valor = row.get('valor') if 'valor' in row.index else None
-            ts = row.get('timestamp')
-
-            if pd.isna(sensor):
-                LOGGER.debug('Linha sem sensor definido — pulando')
-                skipped_no_sensor += 1
+    if not IJSON_AVAILABLE:
+        raise RuntimeError('ijson não instalado: leitura incremental de .json indisponível')
+
+    with open(path, 'rb') as f:
+        if _first_char(f) == b'[':
+            paciente, prefix = {}, 'item'
+        else:
+            paciente = next(ijson.items(f, 'paciente', use_float=True), {}) or {}
+            f.seek(0)
+            prefix = 'records.item'
+
+        chunk = []
+        for record in ijson.items(f, prefix, use_float=True):
+            if skip:
+                skip -= 1
                 continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield paciente, chunk
+                chunk = []
+        if chunk:
+            yield paciente, chunk
+
+
+@METRICS.timed('consumer_process_file_seconds', mode='streaming')
+def process_file_streaming(path, db: DatabaseConnection, trusted_dir, chunk_size=STREAMING_CHUNK_SIZE):
+    """
+    Variante de process_file com memória limitada: valida, normaliza, insere no banco
+    e grava em trusted bloco a bloco (commit por bloco), então o pico de memória depende
+    de chunk_size e não do tamanho do arquivo.
+
+    Se o arquivo quebra no meio, os blocos já confirmados ficam em trusted e a contagem
+    vai junto para raw/broken (COMMITTED_SUFFIX): ao ser reprocessado (ex.:
+    replay_dead_letter.py --requeue-broken) o arquivo recomeça depois deles.
+    """
+    LOGGER.info('Iniciando processamento incremental de arquivo: %s (chunk=%d)', path, chunk_size)
+
+    skip = read_committed(path)
+    if skip:
+        LOGGER.info('Arquivo %s retomado: pulando %d registros já inseridos', path, skip)
+    os.makedirs(trusted_dir, exist_ok=True)
+    trusted_path = _trusted_path(trusted_dir, path, skip)
+    tmp_trusted = trusted_path + '.tmp'
+
+    use_db = bool(db and getattr(db, 'connection', None))
+    cursor = db.connection.cursor(dictionary=True) if use_db else None
+    stats = _new_insert_stats()
+    rejected = []
+    mappings = None
+    paciente = {}
+    written = 0
+    committed = 0
 
-            key = canon(sensor)
-            sensor_id = sensors_map.get(key)
-
-            # fallback
-            if sensor_id is None:
-                try:
-                    cursor.execute('SELECT id, nome FROM sensor WHERE nome LIKE %s LIMIT 1', (f'%{sensor}%',))
-                    res = cursor.fetchone()
-                    if res:
-                        sensor_id = res.get('id')
-                        sensors_map[canon(res.get('nome'))] = sensor_id
-                except Exception:
-                    LOGGER.exception('Erro consultando sensor %s', sensor)
+    try:
+        with open(tmp_trusted, 'wb') as out:
+            out.write(b'[')
+            for paciente, records in iter_record_chunks(path, chunk_size, skip):
+                df = _normalize(records)
+                if use_db:
+                    if mappings is None:
+                        mappings = _load_mappings(cursor, paciente.get('id'))
+                    _insert_rows(df, db, cursor, paciente, mappings[0], mappings[1], stats, rejected)
+                    _commit(db)
+                    _dead_letter(os.path.dirname(path), rejected, path)
+
+                # trusted recebe o bloco só depois do commit: fica igual ao que está no banco
+                if len(df):
+                    if written:
+                        out.write(b',')
+                    out.write(_trusted_json(df)[1:-1])
+                    written += len(df)
+                committed += len(records)
+            out.write(b']')
+    except Exception as e:
+        if use_db:
+            db.connection.rollback()
+            cursor.close()
+        try:
+            if committed:
+                with open(tmp_trusted, 'ab') as out:
+                    out.write(b']')
+                os.replace(tmp_trusted, trusted_path)
+            else:
+                os.remove(tmp_trusted)
+        except OSError:
+            pass
+        _move_to_broken(path, e, committed=skip + committed)
+        return
 
-            if sensor_id is None:
-                skipped_no_sensor += 1
-                LOGGER.debug('Sensor não encontrado para %s', sensor)
-                continue
+    if not written and not stats['total_rows']:
+        os.remove(tmp_trusted)
+        LOGGER.info('Arquivo %s sem registros — removendo', path)
+        os.remove(path)
+        _clear_committed(path)
+        METRICS.counter('consumer_files_total', result='empty').inc()
+        return
 
-            paciente_sensor_id = paciente_sensor_map.get(sensor_id)
-            if paciente_sensor_id is None:
-                skipped_no_paciente_sensor += 1
-                LOGGER.debug('Nenhum mapeamento paciente_sensor para paciente=%s sensor_id=%s', paciente.get('id'), sensor_id)
-                continue
+    os.replace(tmp_trusted, trusted_path)
+    LOGGER.info('Arquivo processado e salvo em trusted: %s (paciente_id=%s registros: %d)', trusted_path, paciente.get('id'), written)
 
-            if valor is None or pd.isna(valor):
-                skipped_invalid_value += 1
-                LOGGER.debug('Valor inválido para sensor %s: %s', sensor, valor)
-                continue
+    if use_db:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        _report_insert_stats(stats)
 
-            # Format timestamp
-            if hasattr(ts, 'strftime'):
-                ts_str = ts.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                ts_str = str(ts)
+    os.remove(path)
+    _clear_committed(path)
+    METRICS.counter('consumer_files_total', result='ok').inc()
+
+
+_SENSOR_NAMES = np.array(SENSORES + (None,), dtype=object)  # código -1 -> None
+
+
+def ring_frame(cols):
+    """
+    DataFrame (sensor, valor, timestamp) a partir das colunas de um slot do SharedBatchRing,
+    no mesmo formato que _normalize produz para _insert_rows. É a única cópia dos dados.
+    """
+    return pd.DataFrame({
+        'sensor': _SENSOR_NAMES[cols['sensor']],
+        'valor': format_valores(cols['valor'], cols['valor2']),
+        'timestamp': pd.to_datetime(cols['timestamp_ms'], unit='ms')
+    })
+
+
+def consume_ring(ring, db: DatabaseConnection = None, timeout=None, raw_dir=None):
+    """
+    Consumidor do modo PRODUCER_SINK=shm: lê os slots publicados pelos workers do
+    produtor na memória compartilhada e insere no banco, até receber STOP.
+
+    Args:
+        ring (SharedBatchRing): Anel criado pelo produtor.
+        db (DatabaseConnection, optional): Conexão; sem ela abre uma com DB_USER/DB_PASSWORD/DB_HOST.
+        timeout (float, optional): Espera máxima por slot (queue.Empty ao estourar). Defaults to None.
+        raw_dir (str, optional): Diretório raw cujo dead_letter/ recebe as linhas rejeitadas.
+            Defaults to output/raw.
+
+    Returns:
+        int: Linhas consumidas.
+    """
+    raw_dir = raw_dir or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'output', 'raw'))
+    own_db = db is None
+    if own_db:
+        load_dotenv()
+        db = DatabaseConnection(user=os.getenv('DB_USER') or '', password=os.getenv('DB_PASSWORD') or '',
+                                host=os.getenv('DB_HOST', 'localhost'), database='health_data')
+        db.open_connection()
+    use_db = bool(db and getattr(db, 'connection', None))
+    cursor = db.connection.cursor(dictionary=True) if use_db else None
+    consumed = 0
 
+    try:
+        while True:
+            slot = ring.get(timeout)
+            if slot == STOP:
+                break
             try:
-                cursor.execute(insert_q, (str(valor), ts_str, paciente_sensor_id))
-                inserted += 1
-            except Exception as e:
-                # Correção de IA
-                # Detectar erro típico quando a coluna id não tem AUTO_INCREMENT no schema
-                msg = str(e)
-                if ("doesn't have a default value" in msg or '1364' in msg) and not altered_id_autoinc:
-                    LOGGER.warning('Erro de schema detectado ao inserir: %s. Tentando adicionar AUTO_INCREMENT em registro.id', msg)
+                paciente_id, cols = ring.read(slot)
+                df = ring_frame(cols)
+                del cols
+            finally:
+                ring.release(slot)
+            consumed += len(df)
+            METRICS.counter('consumer_slots_total').inc()
+            METRICS.gauge('consumer_queue_depth').set(ring.pending())
+
+            if use_db:
+                # erro em um slot não derruba o consumidor: sem ele os workers do produtor
+                # ficariam esperando slot livre para sempre
+                try:
+                    sensors_map, paciente_sensor_map = _load_mappings(cursor, paciente_id)
+                    stats = _new_insert_stats()
+                    rejected = []
+                    _insert_rows(df, db, cursor, {'id': paciente_id}, sensors_map, paciente_sensor_map, stats, rejected)
+                    _commit(db)
+                    _dead_letter(raw_dir, rejected, f'shm:{slot}')
+                    _report_insert_stats(stats)
+                except Exception:
+                    LOGGER.exception('Falha ao inserir o slot %d (paciente %s, %d linhas)', slot, paciente_id, len(df))
+                    METRICS.counter('consumer_slot_errors_total').inc()
                     try:
-                        cursor.execute('ALTER TABLE registro MODIFY COLUMN id INT NOT NULL AUTO_INCREMENT')
-                        db.connection.commit()
-                        altered_id_autoinc = True
-                        cursor.execute(insert_q, (str(valor), ts_str, paciente_sensor_id))
-                        inserted += 1
-                        continue
-                    except Exception:
-                        LOGGER.exception('Falha ao aplicar ALTER TABLE para registro.id')
                         db.connection.rollback()
-                LOGGER.exception('Erro ao inserir registro: sensor=%s paciente_sensor_id=%s (%s)', sensor, paciente_sensor_id, msg)
+                    except Exception:
+                        pass
+    finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        if own_db and use_db:
+            db.close_connection()
+    LOGGER.info('Consumidor do anel encerrado (%d linhas)', consumed)
+    return consumed
+
+
+def replay_dead_letters(db: DatabaseConnection, store: DeadLetterStore, reasons=None) -> dict:
+    """
+    Reprocessa em lote as linhas do dead-letter (ex.: depois de cadastrar o sensor ou o
+    paciente_sensor que faltava): agrupa por paciente, carrega os mapeamentos uma vez por
+    paciente e insere com _insert_rows, um commit por paciente.
+
+    Cada paciente confirmado é registrado em replaying/ (DeadLetterStore.ack) junto com as
+    linhas que continuaram rejeitadas; se o replay for interrompido, o próximo retoma com
+    os mesmos segmentos e motivos e pula os pacientes já confirmados, sem inserir de novo.
+    No fim, as linhas de outros motivos e as ainda rejeitadas voltam para um segmento novo.
+
+    Args:
+        db (DatabaseConnection): Conexão aberta.
+        store (DeadLetterStore): Dead-letter a reprocessar.
+        reasons (iterable, optional): Motivos a reprocessar. Defaults to REPLAY_REASONS
+            (invalid_value fica de fora: valor ausente não passa a ser válido com mapeamento).
+
+    Returns:
+        dict: segmentos, linhas reprocessadas, inseridas, ainda rejeitadas e mantidas.
+    """
+    segments = store.claim()
+    summary = {'segments': len(segments), 'replayed': 0, 'inserted': 0, 'still_rejected': 0, 'kept': 0}
+    if not segments:
+        return summary
+
+    prev_reasons, acked = store.replay_acks()
+    if prev_reasons is not None:
+        reasons = set(prev_reasons)
+        LOGGER.info('Retomando replay interrompido: %d pacientes já confirmados, motivos %s', len(acked), sorted(reasons))
+    else:
+        reasons = set(reasons or REPLAY_REASONS)
+        store.begin_replay(reasons)
+
+    por_paciente = {}
+    keep = []
+    for row in store.iter_rows(segments):
+        if row.get('reason') not in reasons:
+            keep.append(row)
+        elif row.get('paciente_id') not in acked:
+            por_paciente.setdefault(row.get('paciente_id'), []).append(row)
+
+    stats = _new_insert_stats()
+    rejected = [r for rows in acked.values() for r in rows]
+    cursor = db.connection.cursor(dictionary=True)
+    try:
+        for paciente_id, rows in por_paciente.items():
+            df = pd.DataFrame({
+                'sensor': [r.get('sensor') for r in rows],
+                'valor': [r.get('valor') for r in rows],
+                'timestamp': pd.to_datetime([r.get('timestamp') for r in rows], errors='coerce')
+            })
+            sensors_map, paciente_sensor_map = _load_mappings(cursor, paciente_id)
+            rejeitadas = []
+            try:
+                _insert_rows(df, db, cursor, {'id': paciente_id}, sensors_map, paciente_sensor_map, stats,
+                             rejeitadas, raise_errors=True)
+                if not _commit(db):
+                    raise RuntimeError(f'commit do paciente {paciente_id} falhou')
+            except Exception:
                 db.connection.rollback()
-
-        try:
-            db.connection.commit()
-        except Exception:
-            LOGGER.exception('Erro no commit final')
+                LOGGER.exception('Replay interrompido no paciente %s; os segmentos ficam em %s', paciente_id,
+                                 store.replaying_dir)
+                raise
+            store.ack(paciente_id, rejeitadas)
+            rejected.extend(rejeitadas)
+    finally:
         try:
             cursor.close()
         except Exception:
             pass
 
-        LOGGER.info('Linhas no arquivo: %d; Inseridos %d registros no banco (skipped: no_sensor=%d, no_paciente_sensor=%d, invalid_value=%d)',
-                    total_rows, inserted, skipped_no_sensor, skipped_no_paciente_sensor, skipped_invalid_value)
-
-    # TODO: Verificar se é valida a remoção após processado
-    os.remove(path)
+    summary.update(replayed=stats['total_rows'], inserted=stats['inserted'],
+                   still_rejected=len(rejected), kept=len(keep))
+    store.finish_replay(segments, keep + rejected, summary)
+    METRICS.counter('consumer_dead_letter_replayed_total').inc(stats['inserted'])
+    LOGGER.info('Replay do dead-letter: %s', summary)
+    return summary
+
+
+def should_stream(path):
+    if path.endswith('.jsonl'):
+        return True
+    if not IJSON_AVAILABLE:
+        return False
+    if os.getenv('CONSUMER_STREAMING', '0') == '1':
+        return True
+    try:
+        return os.path.getsize(path) >= STREAMING_THRESHOLD_BYTES
+    except OSError:
+        return False
 
 
 def main(poll_interval=10):
+    setup_queue_logging(logging.INFO)
     raw_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'output', 'raw'))
     trusted_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'output', 'trusted'))
+    metrics_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'reports', 'metrics_consumer.jsonl'))
+    METRICS.start_flusher(metrics_path)
+    start_metrics_server(metrics_port('CONSUMER_METRICS_PORT', 9102))
 
     load_dotenv()
 
@@ -237,19 +729,34 @@ def main(poll_interval=10):
     try:
         while True:
             files = list_raw_files(raw_dir)
+            backlog_files, backlog_bytes = raw_backlog(raw_dir)
+            METRICS.gauge('raw_backlog_files').set(backlog_files)
+            METRICS.gauge('raw_backlog_bytes').set(backlog_bytes)
             if not files:
                 LOGGER.debug('Nenhum arquivo novo em %s', raw_dir)
-            for f in files:
+            else:
+                LOGGER.info('Backlog em raw: %d arquivos, %d bytes', backlog_files, backlog_bytes)
+            t0 = time.monotonic()
+            for i, f in enumerate(files):
+                METRICS.gauge('consumer_queue_depth').set(len(files) - i)
                 try:
-                    process_file(f, db, trusted_dir)
+                    if should_stream(f):
+                        process_file_streaming(f, db, trusted_dir)
+                    else:
+                        process_file(f, db, trusted_dir)
                 except Exception as e:
                     LOGGER.exception('Erro processando %s: %s', f, e)
+            METRICS.gauge('consumer_queue_depth').set(0)
+            if files:
+                # vazão de drenagem do último lote, para dimensionar consumidores contra o backlog
+                METRICS.gauge('consumer_drain_files_per_s').set(round(len(files) / max(time.monotonic() - t0, 1e-6), 2))
             time.sleep(poll_interval)
     except KeyboardInterrupt:
         LOGGER.info('Interrompido pelo usuário')
     finally:
         if getattr(db, 'connection', None):
             db.close_connection()
+        stop_queue_logging()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,106 @@
+"""
+Execução assíncrona de um ciclo do produtor (PRODUCER_MODE=async em data_init)
+
+Um ciclo é quase todo I/O (consultas ao banco, escrita + fsync de um JSON por
+paciente) e a geração por paciente é pequena, então no modo Pool o custo dominante
+é processo + pickle + IPC. Aqui:
+- Metadados do banco rodam em uma thread dedicada (a conexão MySQL não é thread-safe).
+- Ciclos pequenos: cada paciente é gerado e gravado em uma thread de escrita
+  (PRODUCER_WRITER_THREADS), sem pickle — o estado dos fluxos é alterado no lugar.
+- Ciclos grandes (>= PRODUCER_ASYNC_PROCESS_MIN_RECORDS registros estimados): geração
+  e serialização vão para um ProcessPoolExecutor pequeno (PRODUCER_ASYNC_CPU_WORKERS),
+  que devolve só os bytes; a gravação continua nas threads.
+"""
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+def estimate_records(tasks) -> int:
+    """
+    Registros que um ciclo vai gerar, a partir de steps/intervalo de cada fluxo das tarefas.
+    """
+    total = 0
+    for task in tasks:
+        sensors, duration_minutes, interval_seconds = task[1], task[2], task[3]
+        for s in sensors:
+            total += s.get('steps') or int(duration_minutes * 60 / (s.get('interval_seconds') or interval_seconds))
+    return total
+
+
+class AsyncProducer:
+    """
+    Executa as tarefas de um ciclo (as mesmas tuplas de data_init.build_due_tasks) com asyncio.
+
+    Args:
+        generate_fn: Gera e grava um paciente -> (caminho, estados) (data_init.generate_patient_window).
+        encode_fn: Gera e serializa um paciente -> (bytes, estados, caminho) (data_init.encode_patient_payload).
+        write_fn: Grava bytes em caminho de forma atômica (data_init.write_payload).
+        writer_threads (int, optional): Threads de escrita. Defaults to env PRODUCER_WRITER_THREADS (8).
+        cpu_workers (int, optional): Processos de geração para ciclos grandes. Defaults to env PRODUCER_ASYNC_CPU_WORKERS (2).
+        process_min_records (int, optional): A partir de quantos registros estimados usar processos.
+            Defaults to env PRODUCER_ASYNC_PROCESS_MIN_RECORDS (200000).
+        process_initializer (callable, optional): initializer do ProcessPoolExecutor (ex.: worker_logging_init).
+        process_initargs (tuple, optional): Argumentos do initializer.
+    """
+
+    def __init__(self, generate_fn, encode_fn, write_fn, writer_threads=None, cpu_workers=None,
+                 process_min_records=None, process_initializer=None, process_initargs=()):
+        self.generate_fn = generate_fn
+        self.encode_fn = encode_fn
+        self.write_fn = write_fn
+        self.writer_threads = writer_threads or int(os.getenv('PRODUCER_WRITER_THREADS', '8'))
+        self.cpu_workers = cpu_workers if cpu_workers is not None else int(os.getenv('PRODUCER_ASYNC_CPU_WORKERS', '2'))
+        if process_min_records is None:
+            process_min_records = int(os.getenv('PRODUCER_ASYNC_PROCESS_MIN_RECORDS', '200000'))
+        self.process_min_records = process_min_records
+        self.process_initializer = process_initializer
+        self.process_initargs = process_initargs
+
+        self._writer = ThreadPoolExecutor(self.writer_threads, thread_name_prefix='producer-writer')
+        self._db = ThreadPoolExecutor(1, thread_name_prefix='producer-db')
+        self._cpu = None
+
+    def _cpu_pool(self):
+        # criado só no primeiro ciclo grande
+        if self._cpu is None:
+            self._cpu = ProcessPoolExecutor(self.cpu_workers, initializer=self.process_initializer,
+                                            initargs=self.process_initargs)
+        return self._cpu
+
+    async def metadata(self, fn, *args):
+        """
+        Roda uma função de banco (ex.: fetch_first_n_patients, build_due_tasks) na thread do banco.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._db, fn, *args)
+
+    def uses_processes(self, tasks) -> bool:
+        return self.cpu_workers > 0 and estimate_records(tasks) >= self.process_min_records
+
+    async def run_cycle(self, tasks) -> list:
+        """
+        Gera e grava todas as tarefas do ciclo.
+
+        Returns:
+            list: (caminho, estados) por tarefa, na ordem de `tasks` (formato de store_window_states).
+        """
+        loop = asyncio.get_running_loop()
+
+        if not self.uses_processes(tasks):
+            return await asyncio.gather(*(loop.run_in_executor(self._writer, self.generate_fn, t) for t in tasks))
+
+        cpu = self._cpu_pool()
+
+        async def gerar_e_gravar(task):
+            data, states, out_path = await loop.run_in_executor(cpu, self.encode_fn, task)
+            path = await loop.run_in_executor(self._writer, self.write_fn, data, out_path)
+            return path, states
+
+        return await asyncio.gather(*(gerar_e_gravar(t) for t in tasks))
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._db.shutdown(wait=True)
+        if self._cpu is not None:
+            self._cpu.shutdown(wait=True)
+            self._cpu = None
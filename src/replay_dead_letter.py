@@ -0,0 +1,88 @@
+"""
+Reprocessa o dead-letter do consumidor (output/raw/dead_letter)
+
+Depois de corrigir os mapeamentos (sensor / paciente_sensor) ou a origem de valores
+inválidos, reinsere em lote as linhas rejeitadas; as que continuam sem mapeamento
+voltam para o dead-letter. --requeue-broken devolve os arquivos de raw/broken para
+raw/, onde o consumidor tenta lê-los de novo.
+
+Uso:
+    python src/replay_dead_letter.py --list
+    python src/replay_dead_letter.py --reasons no_paciente_sensor
+    python src/replay_dead_letter.py --reasons invalid_value
+    python src/replay_dead_letter.py --requeue-broken
+
+Config via env vars: DB_USER, DB_PASSWORD, DB_HOST (opcional)
+"""
+import os
+import json
+import logging
+import argparse
+
+from dotenv import load_dotenv
+
+from services.connection_database import DatabaseConnection
+from process_and_save import COMMITTED_SUFFIX, dead_letter_store, replay_dead_letters
+from utils.dead_letter import REPLAY_REASONS
+
+LOGGER = logging.getLogger(__name__)
+
+
+def requeue_broken(raw_dir) -> list:
+    """
+    Move raw/broken/*.bad de volta para raw/ com o nome original. A contagem de registros
+    já inseridos (COMMITTED_SUFFIX) vai junto, para o consumidor retomar de onde parou.
+
+    Returns:
+        list: Caminhos devolvidos a raw/.
+    """
+    broken_dir = os.path.join(raw_dir, 'broken')
+    if not os.path.isdir(broken_dir):
+        return []
+    moved = []
+    for name in sorted(os.listdir(broken_dir)):
+        if not name.endswith('.bad'):
+            continue
+        target = os.path.join(raw_dir, name[:-len('.bad')])
+        committed = os.path.join(broken_dir, name + COMMITTED_SUFFIX)
+        if os.path.exists(committed):
+            os.replace(committed, target + COMMITTED_SUFFIX)
+        os.replace(os.path.join(broken_dir, name), target)
+        moved.append(target)
+    LOGGER.info('%d arquivos de %s devolvidos para %s', len(moved), broken_dir, raw_dir)
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reprocessa as linhas rejeitadas do consumidor')
+    parser.add_argument('--raw-dir', default=os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'output', 'raw')))
+    parser.add_argument('--reasons', default=','.join(REPLAY_REASONS),
+                        help='motivos a reprocessar, separados por vírgula (invalid_value só se pedido)')
+    parser.add_argument('--list', action='store_true', help='só mostra as linhas pendentes por motivo e a quarentena')
+    parser.add_argument('--requeue-broken', action='store_true', help='devolve raw/broken/*.bad para raw/')
+    args = parser.parse_args()
+
+    store = dead_letter_store(args.raw_dir)
+    if args.list:
+        print(json.dumps(store.summary(), indent=2))
+        return
+    if args.requeue_broken:
+        print(json.dumps({'requeued': requeue_broken(args.raw_dir)}, indent=2))
+        return
+
+    load_dotenv()
+    db = DatabaseConnection(user=os.getenv('DB_USER') or '', password=os.getenv('DB_PASSWORD') or '',
+                            host=os.getenv('DB_HOST', 'localhost'), database='health_data')
+    db.open_connection()
+    if not getattr(db, 'connection', None):
+        LOGGER.error('Sem conexão com o banco; nada reprocessado')
+        return
+    try:
+        reasons = [r.strip() for r in args.reasons.split(',') if r.strip()]
+        print(json.dumps(replay_dead_letters(db, store, reasons), indent=2))
+    finally:
+        db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import os
+
+
+def raw_backlog(raw_dir: str, suffix: tuple = ('.json', '.jsonl')) -> tuple:
+    """
+    Conta os arquivos pendentes em raw_dir (apenas o diretório, sem subpastas).
+
+    Args:
+        raw_dir (str): Diretório de arquivos brutos (ex.: output/raw).
+        suffix (tuple, optional): Extensões consideradas pendentes. Defaults to ('.json', '.jsonl').
+
+    Returns:
+        tuple: (quantidade_de_arquivos, total_de_bytes).
+    """
+    files = 0
+    total = 0
+    try:
+        with os.scandir(raw_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(suffix):
+                    continue
+                try:
+                    total += entry.stat().st_size
+                except OSError:
+                    continue
+                files += 1
+    except FileNotFoundError:
+        pass
+    return files, total
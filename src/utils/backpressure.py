@@ -0,0 +1,109 @@
+"""
+Controle de fluxo do produtor a partir do backlog do consumidor
+
+O backlog (arquivos/bytes pendentes em output/raw, ou slots pendentes do anel no
+modo PRODUCER_SINK=shm) é comparado com as marcas d'água; a razão
+max(arquivos / high_files, bytes / high_bytes) define o nível:
+
+    razão < 1      normal    ciclo normal
+    1 <= razão < 2 lento     intervalo entre ciclos multiplicado por slow_factor
+    2 <= razão < 4 descarte  além de lento, sensores de baixa prioridade saem das tarefas
+    razão >= 4     pausa     o ciclo não gera nada
+
+Para descer de nível a razão precisa cair abaixo de low_ratio x o limiar do nível
+atual (histerese), evitando alternar a cada ciclo perto de uma marca.
+"""
+import os
+
+NIVEIS = ('normal', 'lento', 'descarte', 'pausa')
+LIMIARES = (1.0, 2.0, 4.0)
+
+
+class Backpressure:
+    """
+    Args:
+        high_files (int, optional): Marca d'água em arquivos (0 desabilita).
+            Defaults to env BACKPRESSURE_HIGH_FILES (1000).
+        high_bytes (int, optional): Marca d'água em bytes (0 desabilita).
+            Defaults to env BACKPRESSURE_HIGH_BYTES (256 MiB).
+        low_ratio (float, optional): Fração do limiar abaixo da qual o nível desce.
+            Defaults to env BACKPRESSURE_LOW_RATIO (0.8).
+        slow_factor (float, optional): Multiplicador do intervalo nos níveis lento/descarte.
+            Defaults to env BACKPRESSURE_SLOW_FACTOR (2).
+        shed_sensors (iterable, optional): Sensores descartados a partir do nível descarte.
+            Defaults to env BACKPRESSURE_SHED_SENSORS ('movimentacao,umidade_pele').
+    """
+
+    def __init__(self, high_files=None, high_bytes=None, low_ratio=None, slow_factor=None, shed_sensors=None):
+        self.high_files = high_files if high_files is not None else int(os.getenv('BACKPRESSURE_HIGH_FILES', '1000'))
+        self.high_bytes = high_bytes if high_bytes is not None else int(os.getenv('BACKPRESSURE_HIGH_BYTES', str(256 << 20)))
+        self.low_ratio = low_ratio if low_ratio is not None else float(os.getenv('BACKPRESSURE_LOW_RATIO', '0.8'))
+        self.slow_factor = slow_factor if slow_factor is not None else float(os.getenv('BACKPRESSURE_SLOW_FACTOR', '2'))
+        if shed_sensors is None:
+            shed_sensors = os.getenv('BACKPRESSURE_SHED_SENSORS', 'movimentacao,umidade_pele').split(',')
+        self.shed_sensors = {s.strip().lower() for s in shed_sensors if s.strip()}
+        self.level = 0
+        self.ratio = 0.0
+
+    @property
+    def state(self) -> str:
+        return NIVEIS[self.level]
+
+    def _ratio(self, files, size):
+        ratios = [0.0]
+        if self.high_files > 0:
+            ratios.append(files / self.high_files)
+        if self.high_bytes > 0:
+            ratios.append(size / self.high_bytes)
+        return max(ratios)
+
+    def update(self, files: int, size: int = 0) -> str:
+        """
+        Recalcula o nível com o backlog atual.
+
+        Args:
+            files (int): Arquivos (ou slots) pendentes.
+            size (int, optional): Bytes pendentes. Defaults to 0.
+
+        Returns:
+            str: Nível resultante (um de NIVEIS).
+        """
+        self.ratio = self._ratio(files, size)
+        alvo = sum(1 for limiar in LIMIARES if self.ratio >= limiar)
+        if alvo >= self.level:
+            self.level = alvo
+        else:
+            # desce um nível de cada vez, só abaixo da marca baixa do nível atual
+            while self.level > alvo and self.ratio < LIMIARES[self.level - 1] * self.low_ratio:
+                self.level -= 1
+        return self.state
+
+    def sleep_seconds(self, interval: float) -> float:
+        return interval * self.slow_factor if self.level in (1, 2) else interval
+
+    def paused(self) -> bool:
+        return self.level >= 3
+
+    def _low_priority(self, sensor: dict) -> bool:
+        # mesmo casamento por substring de data_init.import_sensor_class
+        nome = (sensor.get('nome') or sensor.get('sensor_nome') or '').lower()
+        return any(k in nome for k in self.shed_sensors)
+
+    def shed(self, tasks) -> tuple:
+        """
+        No nível descarte, remove das tarefas os sensores de shed_sensors
+        (tarefas que ficam sem sensores são removidas).
+
+        Returns:
+            tuple: (tarefas, quantidade_de_fluxos_descartados).
+        """
+        if self.level < 2 or not self.shed_sensors:
+            return tasks, 0
+        kept = []
+        dropped = 0
+        for task in tasks:
+            sensors = [s for s in task[1] if not self._low_priority(s)]
+            dropped += len(task[1]) - len(sensors)
+            if sensors:
+                kept.append((task[0], sensors) + tuple(task[2:]))
+        return kept, dropped
@@ -0,0 +1,182 @@
+"""
+Camada de serialização JSON do pipeline.
+
+Usa orjson ou msgspec quando instalados (nessa ordem de preferência, ou a escolhida
+em JSON_CODEC=orjson|msgspec|json) e cai para o módulo json da stdlib. Todos os
+backends serializam Decimal (como número) e date/datetime/time (ISO 8601), que
+aparecem nas linhas de `paciente` vindas do MySQL.
+"""
+import os
+import json
+from decimal import Decimal
+from datetime import date, datetime, time
+from typing import List, Optional, Union
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except Exception:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except Exception:
+    msgspec = None
+    MSGSPEC_AVAILABLE = False
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):
+        # escalares e arrays NumPy (o orjson trata com OPT_SERIALIZE_NUMPY; o msgspec não)
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class _StdlibCodec:
+    name = 'json'
+    DecodeError = (json.JSONDecodeError, UnicodeDecodeError)
+
+    def dumps(self, obj, indent: bool = False) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None, default=_default).encode('utf-8')
+
+    def loads(self, data: Union[bytes, str]):
+        return json.loads(data)
+
+
+class _OrjsonCodec:
+    name = 'orjson'
+    DecodeError = (orjson.JSONDecodeError,) if ORJSON_AVAILABLE else ()
+
+    def dumps(self, obj, indent: bool = False) -> bytes:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def loads(self, data: Union[bytes, str]):
+        return orjson.loads(data)
+
+
+class _MsgspecCodec:
+    name = 'msgspec'
+    DecodeError = (msgspec.DecodeError,) if MSGSPEC_AVAILABLE else ()
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder(enc_hook=_default, decimal_format='number')
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj, indent: bool = False) -> bytes:
+        data = self._encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if indent else data
+
+    def loads(self, data: Union[bytes, str]):
+        return self._decoder.decode(data)
+
+
+def get_codec(name: Optional[str] = None):
+    """
+    Retorna o codec pedido ou o mais rápido disponível.
+
+    Args:
+        name (str, optional): 'orjson', 'msgspec' ou 'json'. Defaults to env JSON_CODEC.
+
+    Returns:
+        Objeto com dumps(obj, indent=False) -> bytes, loads(data) e DecodeError.
+    """
+    name = (name or os.getenv('JSON_CODEC', '')).lower()
+    if name == 'json':
+        return _StdlibCodec()
+    if name in ('', 'orjson') and ORJSON_AVAILABLE:
+        return _OrjsonCodec()
+    if name in ('', 'msgspec', 'orjson') and MSGSPEC_AVAILABLE:
+        return _MsgspecCodec()
+    return _StdlibCodec()
+
+
+CODEC = get_codec()
+# inclui o do msgspec mesmo com outro codec ativo: decode_payload usa msgspec quando instalado
+DecodeError = tuple(set(_StdlibCodec.DecodeError + CODEC.DecodeError + _MsgspecCodec.DecodeError))
+
+
+def dumps(obj, indent: bool = False) -> bytes:
+    return CODEC.dumps(obj, indent=indent)
+
+
+def loads(data: Union[bytes, str]):
+    return CODEC.loads(data)
+
+
+# Decodificação tipada do payload raw (paciente + records) quando msgspec está disponível
+# e JSON_CODEC não força a stdlib. Os registros recusam campos desconhecidos: um payload
+# com campos que o schema não conhece (ou tipos diferentes) cai na decodificação sem
+# schema em vez de perder dados; todo campo novo dos sensores entra aqui.
+TYPED_DECODE = MSGSPEC_AVAILABLE and CODEC.name != 'json'
+
+if MSGSPEC_AVAILABLE:
+    class Aceleracao(msgspec.Struct, forbid_unknown_fields=True):
+        x: float
+        y: float
+        z: float
+
+    class Ppg(msgspec.Struct, forbid_unknown_fields=True):
+        hz: Union[int, float]
+        red: List[float]
+        ir: List[float]
+
+    class ImuFeatures(msgspec.Struct, forbid_unknown_fields=True):
+        magnitude_media: float
+        magnitude_max: float
+        magnitude_var: float
+        jerk_max: float
+        giro_media: float
+        hz: Union[int, float]
+        queda: bool
+
+    # sensor/timestamp ausentes passam: o consumidor descarta a linha ou a conta como no_sensor
+    class RawRecord(msgspec.Struct, omit_defaults=True, forbid_unknown_fields=True):
+        sensor: Optional[str] = None
+        timestamp: Optional[str] = None
+        valor: Union[int, float, str, None] = None
+        unidade: Optional[str] = None
+        aceleracao: Optional[Aceleracao] = None
+        features: Optional[ImuFeatures] = None
+        ppg: Optional[Ppg] = None
+
+    class RawPayload(msgspec.Struct):
+        paciente: dict
+        generated_at: str
+        records: List[RawRecord]
+
+    _PAYLOAD_DECODER = msgspec.json.Decoder(RawPayload)
+else:
+    RawPayload = None
+
+
+def decode_payload(data: Union[bytes, str]):
+    """
+    Decodifica um arquivo raw em RawPayload/RawRecord quando TYPED_DECODE; payloads fora
+    do schema (e todos os casos sem TYPED_DECODE) voltam como dict de loads().
+    JSON malformado levanta DecodeError nos dois caminhos.
+    """
+    if TYPED_DECODE:
+        try:
+            return _PAYLOAD_DECODER.decode(data)
+        except msgspec.ValidationError:
+            pass
+    return loads(data)
+
+
+def payload_parts(payload) -> tuple:
+    """
+    Separa um payload de decode_payload em (paciente, registros como dicts),
+    seja ele um RawPayload ou o dict da decodificação sem schema.
+    """
+    if RawPayload is not None and isinstance(payload, RawPayload):
+        return payload.paciente, msgspec.to_builtins(payload.records)
+    return payload.get('paciente', {}), payload.get('records', [])
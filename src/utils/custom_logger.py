@@ -1,6 +1,24 @@
 import os
+import re
+import gzip
+import json
+import time
+import shutil
+import atexit
 import logging
-from datetime import datetime, timedelta
+import threading
+import multiprocessing
+from datetime import date, datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
+
+DEFAULT_FORMAT = '[%(asctime)s] [%(levelname)s] [pid=%(process)d] %(name)s: %(message)s'
+DEFAULT_DATEFMT = '%d/%m/%Y %H:%M:%S'
+
+# Lock de compressão mais antigo que isso é sobra de um processo que morreu
+LOCK_STALE_MINUTES = float(os.getenv('LOG_LOCK_STALE_MINUTES', '10'))
+
+_LOG_QUEUE = None
+_LOG_LISTENER = None
 
 def custom_logger(name: str, file_path: str = None, level: int = logging.DEBUG) -> logging.Logger:
     """
@@ -23,70 +41,304 @@ def custom_logger(name: str, file_path: str = None, level: int = logging.DEBUG)
 
     logging.getLogger().setLevel(logging.WARNING)
 
+    if _LOG_QUEUE is not None:
+        # Logging assíncrono ativo: os handlers reais ficam no listener
+        return logger
+
     if not logger.hasHandlers():
         stream_handler = logging.StreamHandler()
-        formatter = logging.Formatter('[%(asctime)s] [%(levelname)s] [pid=%(process)d] %(name)s: %(message)s', datefmt='%d/%m/%Y %H:%M:%S')
+        formatter = logging.Formatter(DEFAULT_FORMAT, datefmt=DEFAULT_DATEFMT)
         stream_handler.setFormatter(formatter)
         logger.addHandler(stream_handler)
-        project_root = os.path.dirname(os.path.abspath(__file__))
-        log_dir = os.path.join(project_root, '..', '..', 'log')
-        os.makedirs(log_dir, exist_ok=True)
-
-        _cleanup_old_logs(log_dir)
-
         if file_path is None:
-            file_path = os.path.join(log_dir, 'log.log')
+            project_root = os.path.dirname(os.path.abspath(__file__))
+            file_path = os.path.join(project_root, '..', '..', 'log', 'log.log')
 
-        file_handler = logging.FileHandler(file_path, encoding='utf-8')
+        file_handler = DailySegmentHandler.from_path(file_path)
         file_handler.setFormatter(formatter)
         logger.addHandler(file_handler)
 
     return logger
 
-def _cleanup_old_logs(directory: str, days: int = 10):
+class JsonFormatter(logging.Formatter):
+    """
+    Formata cada registro como um objeto JSON por linha.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'msg': record.getMessage()
+        }
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limita registros de nível <= `level` a `per_second` por (logger, mensagem) por segundo.
+    Registros descartados são contados e o total aparece no próximo registro aceito.
+
+    Args:
+        per_second (int, optional): Máximo de registros por chave por segundo. Defaults to 5.
+        level (int, optional): Nível máximo afetado. Defaults to logging.DEBUG.
+    """
+
+    def __init__(self, per_second: int = 5, level: int = logging.DEBUG):
+        super().__init__()
+        self.per_second = per_second
+        self.level = level
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level:
+            return True
+        key = (record.name, record.msg)
+        now = int(time.monotonic())
+        with self._lock:
+            window, count, dropped = self._windows.get(key, (now, 0, 0))
+            if window != now:
+                window, count = now, 0
+            if count >= self.per_second:
+                self._windows[key] = (window, count, dropped + 1)
+                return False
+            self._windows[key] = (window, count + 1, 0)
+        if dropped:
+            record.msg = f'{record.msg} (+{dropped} suprimidos)'
+        return True
+
+
+def _build_handlers(json_output: bool, file_path: str = None) -> list:
+    formatter = JsonFormatter() if json_output else logging.Formatter(DEFAULT_FORMAT, datefmt=DEFAULT_DATEFMT)
+    handlers = [logging.StreamHandler()]
+    if file_path:
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        handlers.append(DailySegmentHandler.from_path(file_path))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def _install_queue_handler(queue, level: int, debug_per_second: int):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    queue_handler = QueueHandler(queue)
+    queue_handler.addFilter(RateLimitFilter(per_second=debug_per_second))
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+
+def setup_queue_logging(level: int = logging.INFO, json_output: bool = None, file_path: str = None,
+                        debug_per_second: int = 5):
+    """
+    Configura logging não bloqueante: o processo principal e os workers só enfileiram
+    registros (QueueHandler) e um único QueueListener, em thread do processo principal,
+    escreve no console/arquivo. DEBUG é amostrado por RateLimitFilter.
+
+    Args:
+        level (int, optional): Nível do logger raiz. Defaults to logging.INFO.
+        json_output (bool, optional): Saída JSON por linha. Defaults to env LOG_JSON=1.
+        file_path (str, optional): Arquivo de log adicional. Defaults to None.
+        debug_per_second (int, optional): Limite de DEBUG por mensagem por segundo. Defaults to 5.
+
+    Returns:
+        multiprocessing.Queue: Fila a ser passada para worker_logging_init nos workers.
+    """
+    global _LOG_QUEUE, _LOG_LISTENER
+    if _LOG_QUEUE is not None:
+        return _LOG_QUEUE
+
+    if json_output is None:
+        json_output = os.getenv('LOG_JSON', '0') == '1'
+
+    queue = multiprocessing.Queue(-1)
+    listener = QueueListener(queue, *_build_handlers(json_output, file_path), respect_handler_level=True)
+    listener.start()
+    _install_queue_handler(queue, level, debug_per_second)
+
+    _LOG_QUEUE, _LOG_LISTENER = queue, listener
+    atexit.register(stop_queue_logging)
+    return queue
+
+
+def worker_logging_init(queue, level: int = logging.INFO, debug_per_second: int = 5):
+    """
+    Initializer para multiprocessing.Pool: direciona o logging do worker para a fila
+    do processo principal (funciona com fork e spawn).
+    """
+    global _LOG_QUEUE
+    _LOG_QUEUE = queue
+    _install_queue_handler(queue, level, debug_per_second)
+
+
+def stop_queue_logging():
+    """
+    Esvazia a fila e encerra o listener.
+    """
+    global _LOG_QUEUE, _LOG_LISTENER
+    if _LOG_LISTENER is not None:
+        _LOG_LISTENER.stop()
+    _LOG_QUEUE, _LOG_LISTENER = None, None
+
+
+class DailySegmentHandler(logging.Handler):
     """
-    Preserve only the log entries in log.log that are within the last `days`.
-    Do not remove any files; only truncate/rewrite log.log keeping recent entries.
+    Grava o log em segmentos diários (<prefix>.AAAA-MM-DD.log), comprime os segmentos
+    de dias anteriores (.log.gz) e apaga segmentos inteiros mais antigos que
+    `retention_days`. A retenção só lista os nomes dos segmentos, sem ler o conteúdo.
 
-    Lines that do not start with a timestamp (continuation lines) are kept only if
-    they belong to a log entry whose timestamp is within the cutoff. Lines without
-    any preceding timestamp are treated as old and removed.
+    Cada registro é gravado com uma única chamada write() em um arquivo aberto com
+    O_APPEND, então vários processos podem anexar ao mesmo segmento sem perder linhas.
+
+    Um arquivo legado <prefix>.log (de antes dos segmentos) é anexado uma única vez ao
+    segmento do dia da sua última modificação, e daí segue a retenção normal.
+
+    Args:
+        directory (str): Diretório dos segmentos.
+        prefix (str, optional): Prefixo dos arquivos. Defaults to 'log'.
+        retention_days (int, optional): Dias mantidos. Defaults to 10.
+        compress (bool, optional): Comprimir segmentos de dias anteriores. Defaults to True.
     """
-    cutoff = datetime.now() - timedelta(days=days)
-    fpath = os.path.join(directory, 'log.log')
-
-    if not os.path.isfile(fpath):
-        return
-
-    kept_lines = []
-    last_ts = None
-    try:
-        with open(fpath, 'r', encoding='utf-8') as f:
-            for line in f:
-                stripped = line.lstrip()
-                if stripped.startswith('['):
-                    end = stripped.find(']')
-                    if end != -1:
-                        ts_str = stripped[1:end]
-                        try:
-                            ts = datetime.strptime(ts_str, '%d/%m/%Y %H:%M:%S')
-                            last_ts = ts
-                            if ts >= cutoff:
-                                kept_lines.append(line)
-                        except Exception:
-                            if last_ts and last_ts >= cutoff:
-                                kept_lines.append(line)
-                    else:
-                        if last_ts and last_ts >= cutoff:
-                            kept_lines.append(line)
-                else:
-                    if last_ts and last_ts >= cutoff:
-                        kept_lines.append(line)
-    except Exception:
-        return
-
-    try:
-        with open(fpath, 'w', encoding='utf-8') as f:
-            f.writelines(kept_lines)
-    except Exception:
-        pass
\ No newline at end of file
+
+    def __init__(self, directory: str, prefix: str = 'log', retention_days: int = 10, compress: bool = True):
+        super().__init__()
+        self.directory = directory
+        self.prefix = prefix
+        self.retention_days = retention_days
+        self.compress = compress
+        self._pattern = re.compile(rf'^{re.escape(prefix)}\.(\d{{4}}-\d{{2}}-\d{{2}})\.log(\.gz)?$')
+        self._day = None
+        self._fd = None
+        os.makedirs(directory, exist_ok=True)
+        self._migrate_legacy()
+
+    @classmethod
+    def from_path(cls, file_path: str, **kwargs):
+        directory, filename = os.path.split(os.path.abspath(file_path))
+        return cls(directory, prefix=os.path.splitext(filename)[0], **kwargs)
+
+    def segment_path(self, day: date) -> str:
+        return os.path.join(self.directory, f'{self.prefix}.{day.isoformat()}.log')
+
+    def _migrate_legacy(self):
+        legacy_path = os.path.join(self.directory, f'{self.prefix}.log')
+        # rename atômico: só um processo assume o arquivo legado
+        claimed_path = f'{legacy_path}.{os.getpid()}.migrating'
+        try:
+            day = date.fromtimestamp(os.path.getmtime(legacy_path))
+            os.rename(legacy_path, claimed_path)
+        except OSError:
+            return
+        try:
+            flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0)
+            with open(claimed_path, 'rb') as src, os.fdopen(os.open(self.segment_path(day), flags, 0o644), 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(claimed_path)
+        except OSError:
+            pass
+
+    def _acquire_lock(self, lock_path: str):
+        """
+        Cria o lock de forma exclusiva. Um lock mais antigo que LOCK_STALE_MINUTES é
+        removido (processo que morreu comprimindo) e a criação é tentada mais uma vez.
+        """
+        for _ in range(2):
+            try:
+                return os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) < LOCK_STALE_MINUTES * 60:
+                        return None
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+            except OSError:
+                return None
+        return None
+
+    def _open_segment(self, day: date):
+        if self._fd is not None:
+            os.close(self._fd)
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0)
+        self._fd = os.open(self.segment_path(day), flags, 0o644)
+        self._day = day
+        threading.Thread(target=self.maintain, args=(day,), name='log-maintenance', daemon=True).start()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            day = date.fromtimestamp(record.created)
+            if day != self._day:
+                self._open_segment(day)
+            os.write(self._fd, (self.format(record) + '\n').encode('utf-8'))
+        except Exception:
+            self.handleError(record)
+
+    def maintain(self, today: date = None):
+        """
+        Aplica retenção e compressão. Executado em thread a cada troca de segmento.
+        """
+        today = today or date.today()
+        cutoff = today - timedelta(days=self.retention_days)
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+
+        for name in names:
+            match = self._pattern.match(name)
+            if not match:
+                continue
+            try:
+                day = date.fromisoformat(match.group(1))
+            except ValueError:
+                continue
+            path = os.path.join(self.directory, name)
+            if day < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            elif self.compress and day < today and not match.group(2):
+                self._compress_segment(path)
+
+    def _compress_segment(self, path: str):
+        # Lock por arquivo: só um processo comprime cada segmento
+        lock_path = path + '.lock'
+        lock_fd = self._acquire_lock(lock_path)
+        if lock_fd is None:
+            return
+        try:
+            # aguarda escritores atrasados da virada do dia
+            if time.time() - os.path.getmtime(path) < 60:
+                return
+            tmp_path = path + '.gz.tmp'
+            with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, path + '.gz')
+            os.remove(path)
+        except OSError:
+            pass
+        finally:
+            os.close(lock_fd)
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    def close(self):
+        self.acquire()
+        try:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+        finally:
+            self.release()
+        super().close()
@@ -0,0 +1,219 @@
+"""
+Dead-letter do consumidor: linhas rejeitadas e quarentena de arquivos quebrados
+
+Linhas que process_and_save._insert_rows rejeita (REASONS) são anexadas em segmentos
+JSON Lines com gzip em output/raw/dead_letter/, um membro gzip por arquivo processado
+(append-only; gzip.open lê os membros concatenados). Cada linha:
+{"reason", "paciente_id", "sensor", "valor", "timestamp", "source"}.
+
+Arquivos ilegíveis continuam em raw/broken/*.bad e são registrados em index.jsonl
+(junto com cada replay). O replay reivindica os segmentos movendo-os para
+dead_letter/replaying/ antes de ler e confirma cada paciente inserido em
+replaying/acks.jsonl; um replay interrompido é retomado no próximo a partir dali.
+"""
+import os
+import gzip
+import time
+from datetime import datetime
+
+from utils import codec
+
+REASONS = ('no_sensor', 'no_paciente_sensor', 'invalid_value')
+# invalid_value (valor ausente) nunca passa no replay; só sai do dead-letter pedindo explicitamente
+REPLAY_REASONS = ('no_sensor', 'no_paciente_sensor')
+SEGMENT_SUFFIX = '.jsonl.gz'
+
+
+def rejected_row(reason: str, paciente_id, sensor, valor, timestamp, source=None) -> dict:
+    """
+    Linha do dead-letter; valores NumPy/pandas viram tipos JSON e NaN vira None.
+    """
+    if hasattr(valor, 'item'):
+        valor = valor.item()
+    if isinstance(valor, float) and valor != valor:
+        valor = None
+    if sensor is not None and not isinstance(sensor, str):
+        sensor = None if sensor != sensor else str(sensor)
+    return {'reason': reason, 'paciente_id': paciente_id, 'sensor': sensor, 'valor': valor,
+            'timestamp': None if timestamp is None else str(timestamp), 'source': source}
+
+
+class DeadLetterStore:
+    """
+    Segmentos de linhas rejeitadas + índice de quarentena em `base_dir`.
+
+    Args:
+        base_dir (str): Diretório do dead-letter (ex.: output/raw/dead_letter).
+        segment_max_bytes (int, optional): Tamanho a partir do qual um novo segmento é aberto.
+            Defaults to env DEAD_LETTER_SEGMENT_MB (64) MiB.
+        settle_seconds (float, optional): Idade mínima de um segmento para o replay reivindicá-lo
+            (evita pegar um segmento no meio de um append). Defaults to 2.0.
+    """
+
+    def __init__(self, base_dir: str, segment_max_bytes: int = None, settle_seconds: float = 2.0):
+        self.base_dir = base_dir
+        if segment_max_bytes is None:
+            segment_max_bytes = int(float(os.getenv('DEAD_LETTER_SEGMENT_MB', '64')) * 1024 * 1024)
+        self.segment_max_bytes = segment_max_bytes
+        self.settle_seconds = settle_seconds
+        self.index_path = os.path.join(base_dir, 'index.jsonl')
+        self.replaying_dir = os.path.join(base_dir, 'replaying')
+        self.acks_path = os.path.join(self.replaying_dir, 'acks.jsonl')
+        self._segment = None
+
+    def _new_segment(self):
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        return os.path.join(self.base_dir, f'dl_{os.getpid()}_{stamp}{SEGMENT_SUFFIX}')
+
+    def append(self, rows, source=None) -> int:
+        """
+        Anexa as linhas como um membro gzip no segmento atual deste processo.
+
+        Args:
+            rows (list): Dicts de rejected_row.
+            source (str, optional): Origem preenchida nas linhas que não têm uma.
+
+        Returns:
+            int: Linhas gravadas.
+        """
+        if not rows:
+            return 0
+        os.makedirs(self.base_dir, exist_ok=True)
+        try:
+            if self._segment is None or os.path.getsize(self._segment) >= self.segment_max_bytes:
+                self._segment = self._new_segment()
+        except FileNotFoundError:
+            pass  # reivindicado por um replay: o append recria o arquivo com o mesmo nome
+        data = b''.join(codec.dumps(dict(r, source=r.get('source') or source)) + b'\n' for r in rows)
+        with open(self._segment, 'ab') as f:
+            f.write(gzip.compress(data))
+        return len(rows)
+
+    def _log(self, entry: dict):
+        os.makedirs(self.base_dir, exist_ok=True)
+        with open(self.index_path, 'ab') as f:
+            f.write(codec.dumps(dict(entry, at=datetime.now().isoformat(timespec='seconds'))) + b'\n')
+
+    def quarantine(self, bad_path: str, error, source=None, committed: int = 0):
+        """
+        Registra no índice um arquivo movido para raw/broken
+        (committed: registros do início do arquivo que já foram inseridos).
+        """
+        self._log({'event': 'broken', 'path': bad_path, 'source': source, 'error': str(error), 'committed': committed})
+
+    def index(self) -> list:
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, 'rb') as f:
+            return [codec.loads(line) for line in f if line.strip()]
+
+    def segments(self, directory: str = None) -> list:
+        directory = directory or self.base_dir
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(SEGMENT_SUFFIX))
+
+    def claim(self) -> list:
+        """
+        Move os segmentos assentados para replaying/ e devolve os que estão lá. Se há um
+        replay interrompido (segmentos já em replaying/), devolve só esses: as confirmações
+        por paciente valem para eles e não para segmentos novos.
+        """
+        os.makedirs(self.replaying_dir, exist_ok=True)
+        pendentes = self.segments(self.replaying_dir)
+        if pendentes:
+            return pendentes
+        self._finish_leftovers()
+        limite = time.time() - self.settle_seconds
+        for seg in self.segments():
+            try:
+                if os.path.getmtime(seg) <= limite:
+                    os.replace(seg, os.path.join(self.replaying_dir, os.path.basename(seg)))
+            except FileNotFoundError:
+                continue
+        return self.segments(self.replaying_dir)
+
+    @staticmethod
+    def iter_rows(segments):
+        for seg in segments:
+            with gzip.open(seg, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        yield codec.loads(line)
+
+    def _append_line(self, path, entry: dict):
+        with open(path, 'ab') as f:
+            f.write(codec.dumps(entry) + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def begin_replay(self, reasons):
+        self._append_line(self.acks_path, {'reasons': sorted(reasons)})
+
+    def ack(self, paciente_id, rejected: list):
+        """
+        Confirma um paciente já inserido (e commitado) no replay, com as linhas dele que
+        continuaram rejeitadas.
+        """
+        self._append_line(self.acks_path, {'paciente_id': paciente_id, 'rejected': rejected})
+
+    def replay_acks(self) -> tuple:
+        """
+        Returns:
+            tuple: (motivos do replay em andamento ou None, {paciente_id: linhas ainda rejeitadas}).
+        """
+        if not os.path.exists(self.acks_path):
+            return None, {}
+        reasons = None
+        acked = {}
+        with open(self.acks_path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = codec.loads(line)
+                except codec.DecodeError:
+                    continue  # última linha incompleta (queda no meio do append)
+                if 'reasons' in entry:
+                    reasons = entry['reasons']
+                else:
+                    acked[entry['paciente_id']] = entry.get('rejected') or []
+        return reasons, acked
+
+    def _out_path(self):
+        return os.path.join(self.replaying_dir, 'saida' + SEGMENT_SUFFIX + '.tmp')
+
+    def _finish_leftovers(self):
+        # queda depois de apagar os segmentos lidos: publica a saída que ficou e descarta as confirmações
+        if os.path.exists(self._out_path()):
+            os.replace(self._out_path(), self._new_segment())
+        try:
+            os.remove(self.acks_path)
+        except FileNotFoundError:
+            pass
+
+    def finish_replay(self, segments, rows, summary: dict):
+        """
+        Fecha o replay: `rows` (mantidas + ainda rejeitadas) viram um segmento novo.
+
+        A saída é montada em replaying/ e só publicada depois que os segmentos lidos
+        são apagados; se o processo cair antes disso ela é recalculada no próximo replay.
+        """
+        out = self._out_path()
+        if rows:
+            data = b''.join(codec.dumps(dict(r, source=r.get('source') or 'replay')) + b'\n' for r in rows)
+            with open(out, 'wb') as f:
+                f.write(gzip.compress(data))
+        for seg in segments:
+            os.remove(seg)
+        self._finish_leftovers()
+        self._log(dict(summary, event='replay', segments=len(segments)))
+
+    def summary(self) -> dict:
+        """
+        Linhas pendentes por motivo e arquivos em quarentena (para --list do replay).
+        """
+        counts = {}
+        for row in self.iter_rows(self.segments() + self.segments(self.replaying_dir)):
+            counts[row.get('reason')] = counts.get(row.get('reason'), 0) + 1
+        broken_dir = os.path.join(os.path.dirname(self.base_dir), 'broken')
+        broken = sorted(n for n in os.listdir(broken_dir) if n.endswith('.bad')) if os.path.isdir(broken_dir) else []
+        return {'rows': counts, 'broken_files': broken}
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import bisect
+import atexit
+import threading
+import tracemalloc
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+class Counter:
+    """
+    Contador monotônico thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """
+    Valor instantâneo (ex.: tamanho de fila, backlog).
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """
+    Histograma de buckets fixos (limites superiores, em segundos por padrão).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.sum += value
+
+
+class _Timed:
+    """
+    Mede a duração de um bloco com relógio monotônico e registra em um histograma.
+    Funciona como context manager ou decorator. Com trace_memory=True, uma a cada
+    sample_every execuções também mede o pico de memória via tracemalloc.
+    """
+
+    def __init__(self, registry, name: str, labels: dict, trace_memory: bool, sample_every: int):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.trace_memory = trace_memory
+        self.sample_every = max(1, sample_every)
+        self._local = threading.local()
+        self._calls = 0
+
+    def __enter__(self):
+        self._calls += 1
+        tracing = (self.trace_memory and (self._calls - 1) % self.sample_every == 0
+                   and not tracemalloc.is_tracing())
+        if tracing:
+            tracemalloc.start()
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append((time.perf_counter(), tracing))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        start, tracing = self._local.stack.pop()
+        elapsed = time.perf_counter() - start
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.registry.gauge(f'{self.name}_peak_memory_bytes', **self.labels).set(peak)
+        self.registry.histogram(self.name, **self.labels).observe(elapsed)
+        return False
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class MetricsRegistry:
+    """
+    Registro em memória de contadores, gauges e histogramas.
+
+    As métricas vivem no processo que as registra; workers de multiprocessing.Pool
+    têm registros próprios, por isso a instrumentação fica no processo pai.
+    O flush para disco é feito por uma thread em background (start_flusher), nunca
+    no caminho quente.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._flusher = None
+        self._stop = threading.Event()
+
+    def _get(self, kind, name, labels, factory):
+        key = _key(name, labels)
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = (kind, factory())
+                    self._metrics[key] = metric
+        return metric[1]
+
+    def counter(self, name: str, **labels) -> Counter:
+        return self._get('counter', name, labels, Counter)
+
+    def gauge(self, name: str, **labels) -> Gauge:
+        return self._get('gauge', name, labels, Gauge)
+
+    def histogram(self, name: str, buckets=DEFAULT_BUCKETS, **labels) -> Histogram:
+        return self._get('histogram', name, labels, lambda: Histogram(buckets))
+
+    def timed(self, name: str, trace_memory: bool = None, sample_every: int = 100, **labels) -> _Timed:
+        """
+        Timer usável como decorator (@METRICS.timed('x')) ou context manager
+        (with METRICS.timed('x'): ...). tracemalloc só é ligado se trace_memory=True
+        ou METRICS_TRACEMALLOC=1.
+        """
+        if trace_memory is None:
+            trace_memory = os.getenv('METRICS_TRACEMALLOC', '0') == '1'
+        return _Timed(self, name, labels, trace_memory, sample_every)
+
+    def items(self):
+        with self._lock:
+            return [(name, dict(labels), kind, metric) for (name, labels), (kind, metric) in self._metrics.items()]
+
+    def snapshot(self) -> dict:
+        """
+        Retorna um dicionário serializável com o estado atual das métricas.
+        """
+        out = []
+        for name, labels, kind, metric in self.items():
+            entry = {'name': name, 'type': kind, 'labels': labels}
+            if kind == 'histogram':
+                entry.update({'count': metric.count, 'sum': metric.sum,
+                              'buckets': dict(zip([str(b) for b in metric.buckets] + ['+Inf'], metric.counts))})
+            else:
+                entry['value'] = metric.value
+            out.append(entry)
+        return {'timestamp': time.time(), 'pid': os.getpid(), 'metrics': out}
+
+    def flush(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.snapshot()) + '\n')
+
+    def start_flusher(self, path: str, interval: float = 30.0):
+        """
+        Inicia uma thread daemon que grava um snapshot (JSON Lines) em `path` a cada
+        `interval` segundos e uma última vez ao encerrar o processo.
+        """
+        if self._flusher is not None:
+            return
+
+        def _loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.flush(path)
+                except Exception:
+                    pass
+
+        self._flusher = threading.Thread(target=_loop, name='metrics-flusher', daemon=True)
+        self._flusher.start()
+        atexit.register(self.stop_flusher, path)
+
+    def stop_flusher(self, path: str = None):
+        if self._flusher is None:
+            return
+        self._stop.set()
+        self._flusher.join(timeout=5)
+        self._flusher = None
+        if path:
+            try:
+                self.flush(path)
+            except Exception:
+                pass
+
+
+METRICS = MetricsRegistry()
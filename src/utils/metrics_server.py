@@ -0,0 +1,97 @@
+import os
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.metrics import METRICS, MetricsRegistry
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _format_labels(labels: dict, extra: dict = None) -> str:
+    merged = dict(labels)
+    if extra:
+        merged.update(extra)
+    if not merged:
+        return ''
+    parts = []
+    for k, v in merged.items():
+        value = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{k}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def render_prometheus(registry: MetricsRegistry) -> str:
+    """
+    Serializa o registro no formato texto de exposição do Prometheus (0.0.4).
+    """
+    grouped = {}
+    for name, labels, kind, metric in registry.items():
+        grouped.setdefault((name, kind), []).append((labels, metric))
+
+    lines = []
+    for (name, kind), series in sorted(grouped.items()):
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, metric in series:
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric.buckets, metric.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, {"le": bound})} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, {"le": "+Inf"})} {metric.count}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {metric.sum}')
+                lines.append(f'{name}_count{_format_labels(labels)} {metric.count}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {metric.value}')
+    return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(port: int, registry: MetricsRegistry = METRICS, host: str = None):
+    """
+    Sobe um servidor HTTP em thread daemon expondo GET /metrics.
+
+    Args:
+        port (int): Porta de escuta; 0 ou negativa desabilita o servidor.
+        registry (MetricsRegistry, optional): Registro exposto. Defaults to METRICS.
+        host (str, optional): Interface de escuta. Defaults to env METRICS_HOST ('127.0.0.1';
+            '0.0.0.0' expõe o endpoint, sem autenticação, em todas as interfaces).
+
+    Returns:
+        ThreadingHTTPServer | None: O servidor iniciado, ou None se desabilitado/falhou.
+    """
+    if not port or port <= 0:
+        return None
+    host = host or os.getenv('METRICS_HOST', '127.0.0.1')
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render_prometheus(registry).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        LOGGER.warning('Não foi possível abrir o endpoint de métricas na porta %s: %s', port, e)
+        return None
+
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    LOGGER.info('Endpoint de métricas em http://%s:%d/metrics', host, port)
+    return server
+
+
+def metrics_port(env_var: str, default: int) -> int:
+    try:
+        return int(os.getenv(env_var, str(default)))
+    except ValueError:
+        return default
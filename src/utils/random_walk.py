@@ -0,0 +1,57 @@
+import math
+
+import numpy as np
+
+# scipy é opcional: lfilter faz a recursão do AR(1) em C; sem ele, laço em Python (também O(n))
+try:
+    from scipy.signal import lfilter
+    SCIPY_AVAILABLE = True
+except Exception:
+    lfilter = None
+    SCIPY_AVAILABLE = False
+
+
+def ar1_coef(interval_seconds: float, tau_seconds: float, sd: float) -> tuple:
+    """
+    Parâmetros de um AR(1) amostrado a cada interval_seconds.
+
+    Args:
+        interval_seconds (float): Intervalo entre amostras.
+        tau_seconds (float): Constante de tempo da reversão à média.
+        sd (float): Desvio padrão estacionário do processo.
+
+    Returns:
+        tuple: (phi, sigma) — coeficiente e desvio da inovação por amostra.
+    """
+    phi = math.exp(-interval_seconds / tau_seconds)
+    return phi, sd * math.sqrt(1 - phi * phi)
+
+
+def ar1_walk(rng: np.random.Generator, x0: float, phi: float, sigma: float, steps: int) -> np.ndarray:
+    """
+    Continua um AR(1) de média zero a partir de x0: x[k] = phi * x[k-1] + e[k].
+
+    Recursão O(steps) (scipy.signal.lfilter quando disponível), semeada com phi * x0,
+    de modo que o próximo lote parte do último valor do anterior sem descontinuidade.
+
+    Args:
+        rng (np.random.Generator): Gerador do fluxo.
+        x0 (float): Último valor do lote anterior.
+        phi (float): Coeficiente (ar1_coef).
+        sigma (float): Desvio da inovação (ar1_coef).
+        steps (int): Amostras a gerar.
+
+    Returns:
+        np.ndarray: Os próximos `steps` valores (sem incluir x0).
+    """
+    if steps <= 0:
+        return np.empty(0)
+    e = rng.normal(0, sigma, steps)
+    if SCIPY_AVAILABLE:
+        return lfilter([1.0], [1.0, -phi], e, zi=[phi * x0])[0]
+    out = np.empty(steps)
+    x = x0
+    for k, ek in enumerate(e.tolist()):
+        x = phi * x + ek
+        out[k] = x
+    return out
@@ -0,0 +1,73 @@
+import os
+import zlib
+from typing import Optional
+
+import numpy as np
+
+
+def run_seed(seed: Optional[int] = None) -> int:
+    """
+    Semente da execução: a informada, a de SIM_SEED ou uma nova entropia do SO.
+
+    Registrar o valor retornado (ele é logado em data_init) permite repetir a execução.
+
+    Returns:
+        int: Semente raiz da árvore de SeedSequence.
+    """
+    if seed is None:
+        env = os.getenv('SIM_SEED')
+        seed = int(env) if env else None
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    return int(seed)
+
+
+def stream_key(value) -> int:
+    """
+    Converte um identificador (id numérico ou nome de sensor) em inteiro para spawn_key.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return zlib.crc32(str(value).encode('utf-8'))
+
+
+def patient_seed(seed: int, paciente_id, cycle: int = 0) -> np.random.SeedSequence:
+    """
+    Nó da árvore de sementes de um paciente em um ciclo.
+
+    Equivale a SeedSequence(seed).spawn(...) endereçado por (ciclo, paciente), de modo que
+    o resultado não depende da ordem em que os pacientes são distribuídos entre os workers.
+
+    Args:
+        seed (int): Semente da execução (run_seed()).
+        paciente_id: Id do paciente.
+        cycle (int, optional): Número do ciclo de geração. Defaults to 0.
+
+    Returns:
+        np.random.SeedSequence: Semente do paciente (picklável, vai junto com a tarefa).
+    """
+    return np.random.SeedSequence(seed, spawn_key=(int(cycle), stream_key(paciente_id)))
+
+
+def sensor_rng(patient_seq: np.random.SeedSequence, sensor: dict) -> np.random.Generator:
+    """
+    Generator independente para um sensor do paciente, filho de patient_seq.
+
+    Args:
+        patient_seq (np.random.SeedSequence): Semente do paciente (patient_seed()).
+        sensor (dict): Linha de sensor; a chave é paciente_sensor_id, sensor_id ou nome.
+
+    Returns:
+        np.random.Generator: Gerador PCG64 exclusivo do fluxo paciente-sensor.
+    """
+    key = sensor.get('paciente_sensor_id') or sensor.get('sensor_id') or sensor.get('nome')
+    child = np.random.SeedSequence(patient_seq.entropy, spawn_key=patient_seq.spawn_key + (stream_key(key),))
+    return np.random.default_rng(child)
+
+
+def ensure_rng(rng: Optional[np.random.Generator] = None) -> np.random.Generator:
+    """
+    Usado pelos start() dos sensores: devolve o rng recebido ou um novo, não semeado.
+    """
+    return rng if rng is not None else np.random.default_rng()
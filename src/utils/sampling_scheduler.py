@@ -0,0 +1,111 @@
+import math
+import heapq
+
+
+def stream_id(sensor: dict):
+    """
+    Identificador do fluxo de um sensor dentro do paciente.
+    """
+    return sensor.get('paciente_sensor_id') or sensor.get('sensor_id') or sensor.get('nome')
+
+
+class SamplingScheduler:
+    """
+    Agenda a geração de cada fluxo paciente-sensor na sua própria taxa
+    (paciente_sensor.intervalo_captura, em segundos).
+
+    Cada fluxo guarda o instante da próxima amostra (next_due) em um heap; a cada
+    janela só os fluxos com next_due dentro da janela são acordados, e cada um gera
+    exatamente as amostras que caem nela. Um sensor de 300 s, por exemplo, produz
+    uma amostra a cada 30 janelas de 10 s.
+
+    Cada fluxo também guarda o estado do simulador (`state`: rng, fase, deriva...),
+    enviado junto com a tarefa e devolvido pelo worker via store_states(), para que
+    o lote seguinte continue de onde o anterior parou.
+
+    Args:
+        default_interval_seconds (float, optional): Intervalo usado quando
+            intervalo_captura está vazio ou inválido. Defaults to 1.
+    """
+
+    def __init__(self, default_interval_seconds: float = 1):
+        self.default_interval_seconds = default_interval_seconds
+        self._streams = {}
+        self._by_patient = {}
+        self._heap = []
+
+    def _interval(self, sensor: dict) -> float:
+        try:
+            interval = float(sensor.get('intervalo_captura') or 0)
+        except (TypeError, ValueError):
+            interval = 0
+        return interval if interval > 0 else self.default_interval_seconds
+
+    def sync(self, paciente: dict, sensors: list, now: float):
+        """
+        Registra fluxos novos (devidos imediatamente) e atualiza intervalo/metadados
+        dos existentes. Fluxos que deixaram de existir são descartados ao sair do heap.
+        """
+        pid = paciente.get('id')
+        present = set()
+        for s in sensors:
+            key = (pid, stream_id(s))
+            present.add(key)
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = {'next_due': now, 'state': {}}
+                self._streams[key] = stream
+                heapq.heappush(self._heap, (now, key))
+            stream.update(paciente=paciente, sensor=s, interval=self._interval(s), active=True)
+
+        for key in self._by_patient.get(pid, set()) - present:
+            if key in self._streams:
+                self._streams[key]['active'] = False
+        self._by_patient[pid] = present
+
+    def due(self, window_start: float, window_seconds: float) -> dict:
+        """
+        Retira do heap os fluxos devidos em [window_start, window_start + window_seconds).
+
+        Returns:
+            dict: paciente_id -> (paciente, [sensor + {'interval_seconds', 'steps', 'state',
+            'start_ts'}]); start_ts (epoch) é o instante da primeira amostra do lote.
+        """
+        window_end = window_start + window_seconds
+        by_patient = {}
+        while self._heap and self._heap[0][0] < window_end:
+            next_due, key = heapq.heappop(self._heap)
+            stream = self._streams.get(key)
+            if stream is None or stream['next_due'] != next_due:
+                continue
+            if not stream['active']:
+                del self._streams[key]
+                continue
+
+            # fluxos atrasados (ex.: ciclo lento) não recuperam o passado: pulam só os
+            # intervalos inteiros perdidos, e as amostras seguem na mesma grade do fluxo
+            interval = stream['interval']
+            start = next_due
+            if next_due < window_start:
+                start += math.floor((window_start - next_due) / interval) * interval
+            steps = max(1, math.ceil((window_end - start) / interval))
+            stream['next_due'] = start + steps * interval
+            heapq.heappush(self._heap, (stream['next_due'], key))
+
+            paciente = stream['paciente']
+            entry = by_patient.setdefault(paciente.get('id'), (paciente, []))
+            entry[1].append(dict(stream['sensor'], interval_seconds=interval, steps=steps, state=stream['state'],
+                                 start_ts=start))
+        return by_patient
+
+    def store_states(self, paciente_id, states: dict):
+        """
+        Guarda o estado devolvido pelo worker (stream_id -> state) de cada fluxo do paciente.
+        """
+        for sid, state in states.items():
+            stream = self._streams.get((paciente_id, sid))
+            if stream is not None:
+                stream['state'] = state
+
+    def __len__(self):
+        return len(self._streams)
@@ -0,0 +1,215 @@
+"""
+Anel de slots colunares em memória compartilhada (multiprocessing.shared_memory)
+
+Workers do produtor escrevem os registros de um paciente direto nas colunas de um
+slot livre e publicam só o índice do slot; o consumidor lê as colunas como views
+NumPy sobre o mesmo buffer (sem cópia nem pickle) e devolve o slot ao anel. Sem
+slot livre, acquire() bloqueia — o produtor espera o consumidor.
+
+Layout de cada slot: cabeçalho int64[2] (linhas, paciente_id) seguido das colunas
+de COLUNAS, cada uma com `rows` posições.
+"""
+from multiprocessing import Queue
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+COLUNAS = (
+    ('sensor', np.int16),
+    ('valor', np.float64),
+    ('valor2', np.float64),
+    ('timestamp_ms', np.int64)
+)
+
+# Código do sensor = posição na tupla (-1 = desconhecido)
+SENSORES = (
+    'frequencia_cardiaca',
+    'glicose',
+    'temperatura_corporal',
+    'pressao_arterial',
+    'nivel_oxigenacao',
+    'umidade_pele',
+    'movimentacao'
+)
+SENSOR_CODES = {nome: i for i, nome in enumerate(SENSORES)}
+
+# Valores categóricos (estado da movimentação): valor = NaN e valor2 = índice
+CATEGORIAS = ('parado', 'movimento', 'queda')
+CATEGORIA_CODES = {nome: i for i, nome in enumerate(CATEGORIAS)}
+
+STOP = -1
+
+
+def _layout(rows):
+    offsets = {}
+    pos = 16
+    for nome, dtype in COLUNAS:
+        pos = (pos + 7) // 8 * 8
+        offsets[nome] = pos
+        pos += rows * np.dtype(dtype).itemsize
+    return offsets, (pos + 7) // 8 * 8
+
+
+def _split_valor(v):
+    # número -> (v, NaN); "120/80" -> (120, 80); categoria -> (NaN, índice)
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v), np.nan
+    if isinstance(v, str):
+        if v in CATEGORIA_CODES:
+            return np.nan, float(CATEGORIA_CODES[v])
+        a, _, b = v.partition('/')
+        try:
+            return float(a), float(b) if b else np.nan
+        except ValueError:
+            pass
+    return np.nan, np.nan
+
+
+def records_to_columns(records) -> dict:
+    """
+    Converte registros do produtor ({'sensor', 'valor', 'timestamp'}) em colunas do anel.
+    Registros sem valor numérico/categórico (ex.: movimentação simples) ficam com NaN.
+    """
+    n = len(records)
+    valores = [_split_valor(r.get('valor')) for r in records]
+    return {
+        'sensor': np.fromiter((SENSOR_CODES.get(r.get('sensor'), -1) for r in records), np.int16, n),
+        'valor': np.fromiter((v[0] for v in valores), np.float64, n),
+        'valor2': np.fromiter((v[1] for v in valores), np.float64, n),
+        'timestamp_ms': np.array([r.get('timestamp') for r in records], dtype='datetime64[ms]').astype(np.int64)
+    }
+
+
+def format_valores(valor, valor2) -> list:
+    """
+    Inverso de _split_valor para um slot inteiro: devolve os valores como texto
+    (o formato gravado em registro.valor), None onde não há valor.
+    """
+    out = []
+    for a, b in zip(valor.tolist(), valor2.tolist()):
+        if a != a:
+            out.append(CATEGORIAS[int(b)] if b == b else None)
+        elif b == b:
+            out.append(f'{a:g}/{b:g}')
+        else:
+            out.append(a)
+    return out
+
+
+class SharedBatchRing:
+    """
+    Anel de `slots` slots de até `rows` linhas cada.
+
+    Criado no processo pai e passado aos filhos (args de Process ou initargs de Pool):
+    no filho o objeto se reconecta ao mesmo segmento pelo nome.
+
+    Args:
+        slots (int, optional): Quantidade de slots. Defaults to 64.
+        rows (int, optional): Linhas por slot. Defaults to 4096.
+    """
+
+    def __init__(self, slots: int = 64, rows: int = 4096, _attach: dict = None):
+        self.slots = slots
+        self.rows = rows
+        self._offsets, self.slot_bytes = _layout(rows)
+        if _attach is None:
+            self.shm = SharedMemory(create=True, size=slots * self.slot_bytes)
+            self.free = Queue()
+            self.ready = Queue()
+            for i in range(slots):
+                self.free.put(i)
+            self._owner = True
+        else:
+            self.shm = SharedMemory(name=_attach['name'])
+            self.free = _attach['free']
+            self.ready = _attach['ready']
+            self._owner = False
+        self.name = self.shm.name
+
+    def __getstate__(self):
+        return {'slots': self.slots, 'rows': self.rows,
+                'attach': {'name': self.name, 'free': self.free, 'ready': self.ready}}
+
+    def __setstate__(self, state):
+        self.__init__(state['slots'], state['rows'], _attach=state['attach'])
+
+    def _views(self, slot):
+        base = slot * self.slot_bytes
+        header = np.ndarray((2,), dtype=np.int64, buffer=self.shm.buf, offset=base)
+        cols = {nome: np.ndarray((self.rows,), dtype=dtype, buffer=self.shm.buf, offset=base + self._offsets[nome])
+                for nome, dtype in COLUNAS}
+        return header, cols
+
+    def acquire(self, timeout=None) -> int:
+        """
+        Reserva um slot livre (bloqueia até haver um, ou levanta queue.Empty após timeout).
+        """
+        return self.free.get(timeout=timeout)
+
+    def write(self, slot: int, paciente_id: int, columns: dict, start: int = 0) -> int:
+        """
+        Copia columns[start:start + rows] para o slot. Retorna quantas linhas foram escritas.
+        """
+        header, cols = self._views(slot)
+        n = min(self.rows, len(columns['sensor']) - start)
+        for nome, _ in COLUNAS:
+            cols[nome][:n] = columns[nome][start:start + n]
+        header[0] = n
+        header[1] = paciente_id
+        return n
+
+    def publish(self, slot: int):
+        self.ready.put(slot)
+
+    def put(self, paciente_id: int, columns: dict, timeout=None) -> list:
+        """
+        acquire + write + publish, dividindo em vários slots se passar de `rows` linhas.
+
+        Returns:
+            list: Slots publicados.
+        """
+        total = len(columns['sensor'])
+        published = []
+        start = 0
+        while start < total or not published:
+            slot = self.acquire(timeout)
+            start += self.write(slot, paciente_id, columns, start)
+            self.publish(slot)
+            published.append(slot)
+        return published
+
+    def get(self, timeout=None):
+        """
+        Próximo slot publicado (ou STOP). Levanta queue.Empty após timeout.
+        """
+        return self.ready.get(timeout=timeout)
+
+    def read(self, slot: int) -> tuple:
+        """
+        Views sem cópia do slot: (paciente_id, {coluna: array[:linhas]}).
+        As views deixam de valer após release(slot).
+        """
+        header, cols = self._views(slot)
+        n = int(header[0])
+        return int(header[1]), {nome: col[:n] for nome, col in cols.items()}
+
+    def release(self, slot: int):
+        self.free.put(slot)
+
+    def pending(self) -> int:
+        """
+        Slots publicados e ainda não consumidos (aproximado; -1 onde qsize não existe, ex.: macOS).
+        """
+        try:
+            return self.ready.qsize()
+        except NotImplementedError:
+            return -1
+
+    def stop(self):
+        self.ready.put(STOP)
+
+    def close(self):
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
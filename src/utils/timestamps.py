@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import numpy as np
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def batch_timestamps(start: datetime, steps: int, interval_seconds: float) -> np.ndarray:
+    """
+    Gera os instantes de um lote como um único arange datetime64 (resolução de ms).
+
+    Args:
+        start (datetime): Instante da primeira amostra.
+        steps (int): Quantidade de amostras.
+        interval_seconds (float): Intervalo entre amostras.
+
+    Returns:
+        np.ndarray: Array datetime64[ms] com `steps` instantes.
+    """
+    step_ms = int(round(interval_seconds * 1000))
+    return np.datetime64(start, 'ms') + np.arange(steps, dtype='int64') * np.timedelta64(step_ms, 'ms')
+
+
+def epoch_ms(timestamps: np.ndarray) -> np.ndarray:
+    """
+    Instantes como inteiros (ms desde epoch), para saídas binárias que não precisam de texto.
+    """
+    return timestamps.astype('datetime64[ms]').astype('int64')
+
+
+def format_timestamps(timestamps: np.ndarray) -> list:
+    """
+    Formata o lote inteiro de uma vez no padrão TIMESTAMP_FORMAT ('AAAA-MM-DD HH:MM:SS').
+
+    Equivale a strftime por amostra (truncando frações de segundo), mas vetorizado.
+    """
+    iso = np.datetime_as_string(timestamps.astype('datetime64[s]'), unit='s')
+    return np.char.replace(iso, 'T', ' ').tolist()
+
+
+def format_batch(start: datetime, steps: int, interval_seconds: float) -> list:
+    """
+    Atalho para format_timestamps(batch_timestamps(...)), usado pelas classes de sensores.
+    """
+    if steps <= 0:
+        return []
+    return format_timestamps(batch_timestamps(start, steps, interval_seconds))
@@ -5,17 +5,16 @@ import os
 
 from datetime import datetime, timedelta
 import numpy as np, pandas as pd
-import random
 from services.connection_database import DatabaseConnection
 
 def calcular_tempos(pontos_por_dia=288, intervalo_minutos=5):
     # define o inicio no multiplo de 5 minutos mais proximo
     inicio = datetime.now().replace(second=0, microsecond=0)
     inicio -= timedelta(minutes=inicio.minute % intervalo_minutos)
-    # gera lista de tempos
-    tempos = [inicio + timedelta(minutes=intervalo_minutos*i) for i in range(pontos_por_dia)]
+    # gera os tempos como um unico arange datetime64
+    tempos = np.datetime64(inicio, 'm') + np.arange(pontos_por_dia) * np.timedelta64(intervalo_minutos, 'm')
     # converte para minutos desde meia-noite
-    minutos = np.array([t.hour*60 + t.minute for t in tempos])
+    minutos = ((tempos - tempos.astype('datetime64[D]')) // np.timedelta64(1, 'm')).astype(int)
     return tempos, minutos
 
 def curva_circadiana(minutos, config):
@@ -24,13 +23,13 @@ def curva_circadiana(minutos, config):
     fase = 180  # pico as 12h (180 minutos apos 9h)
     return amplitude * np.sin(2 * np.pi * (minutos - fase) / 1440)
 
-def pico_refeicao(minutos, hora_refeicao, config):
+def pico_refeicao(minutos, hora_refeicao, config, rng):
     # modela pico gaussiano apos refeicao
     hh, mm = map(int, hora_refeicao.split(':'))
     mu = hh*60 + mm + config.get('atraso_pico', 45)  # pico apos atraso
     sigma = config.get('sigma_pico', 30)  # largura do pico em minutos
     aumento_min, aumento_max = config.get('aumento_pico', (40, 90))
-    amplitude = random.randint(aumento_min, aumento_max)
+    amplitude = rng.integers(aumento_min, aumento_max, endpoint=True)
     return amplitude * np.exp(-0.5 * ((minutos - mu) / sigma) ** 2)
 
 def fenomeno_amanhecer(minutos, config):
@@ -40,7 +39,9 @@ def fenomeno_amanhecer(minutos, config):
     amplitude = config.get('amplitude_amanhecer', 20)
     return amplitude * np.exp(-0.5 * ((minutos - mu) / sigma) ** 2)
 
-def gerar_dados_glicose(config):
+def gerar_dados_glicose(config, rng=None):
+    # rng: numpy Generator (ex.: np.random.default_rng(seed)) para repetir a mesma serie
+    rng = rng if rng is not None else np.random.default_rng(config.get('seed'))
     # configuracoes padrao
     glicose_base = config.get('glicose_base', 100)
     horarios_refeicoes = config.get('horarios_refeicoes', ['08:00', '13:00', '19:00'])
@@ -60,20 +61,20 @@ def gerar_dados_glicose(config):
 
     # adiciona picos de refeicoes
     for hora in horarios_refeicoes:
-        glicose += pico_refeicao(minutos, hora, config)
+        glicose += pico_refeicao(minutos, hora, config, rng)
 
     # adiciona fenomeno do amanhecer
     glicose += fenomeno_amanhecer(minutos, config)
 
     # adiciona ruido aleatorio
-    glicose += np.random.normal(0, nivel_ruido, pontos_por_dia)
+    glicose += rng.normal(0, nivel_ruido, pontos_por_dia)
 
     # limita valores entre minimo e maximo
     glicose = np.clip(glicose, glicose_min, glicose_max)
 
     # cria dataframe com resultados
     df = pd.DataFrame({
-        'timestamp': [t.strftime('%Y-%m-%d %H:%M:%S') for t in tempos],
+        'timestamp': np.char.replace(np.datetime_as_string(tempos, unit='s'), 'T', ' '),
         'glicose': np.round(glicose, 1)
     })
 
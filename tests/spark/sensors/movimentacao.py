@@ -3,21 +3,29 @@
 
 import csv
 import time
-import random
+import numpy as np
 # from services.azure_service import AzureIoTHub
 
 class MPU6050:
-    def __init__(self):
+    # Faixas (min, max) de aceleração por eixo e limite do giroscópio (±) por cenário
+    FAIXAS = {
+        "caminhada": ([(-1, 1), (-1, 1), (0.8, 1.2)], 50),
+        "sedentario": ([(-0.1, 0.1), (-0.1, 0.1), (0.9, 1.1)], 5),
+        "padrao": ([(-2, 2), (-2, 2), (-2, 2)], 250),
+    }
+
+    def __init__(self, rng=None):
         # Inicializa o sensor (simulado)
         print("Sensor MPU6050 inicializado.")
         self.cenario = "padrao"  # Cenário padrão
+        self.rng = rng if rng is not None else np.random.default_rng()
 
     def configurar_cenario(self, cenario):
         """
         Configura o cenário para a geração de dados.
         Cenários disponíveis: 'caminhada', 'sedentario', 'padrao'.
         """
-        if cenario in ["caminhada", "sedentario", "padrao"]:
+        if cenario in self.FAIXAS:
             self.cenario = cenario
             print(f"Cenário configurado para: {cenario}")
         else:
@@ -28,67 +36,45 @@ class MPU6050:
         Gera dados simulados para o sensor MPU6050 com base no cenário configurado.
         Retorna um dicionário com valores de aceleração e giroscópio.
         """
-        if self.cenario == "caminhada":
-            dados = {
-                "aceleracao": {
-                    "x": round(random.uniform(-1, 1), 2),
-                    "y": round(random.uniform(-1, 1), 2),
-                    "z": round(random.uniform(0.8, 1.2), 2),
-                },
-                "giroscopio": {
-                    "x": round(random.uniform(-50, 50), 2),
-                    "y": round(random.uniform(-50, 50), 2),
-                    "z": round(random.uniform(-50, 50), 2),
-                },
-            }
-        elif self.cenario == "sedentario":
-            dados = {
-                "aceleracao": {
-                    "x": round(random.uniform(-0.1, 0.1), 2),
-                    "y": round(random.uniform(-0.1, 0.1), 2),
-                    "z": round(random.uniform(0.9, 1.1), 2),
-                },
-                "giroscopio": {
-                    "x": round(random.uniform(-5, 5), 2),
-                    "y": round(random.uniform(-5, 5), 2),
-                    "z": round(random.uniform(-5, 5), 2),
-                },
-            }
-        else:
-            # Cenário padrão
-            dados = {
-                "aceleracao": {
-                    "x": round(random.uniform(-2, 2), 2),
-                    "y": round(random.uniform(-2, 2), 2),
-                    "z": round(random.uniform(-2, 2), 2),
-                },
-                "giroscopio": {
-                    "x": round(random.uniform(-250, 250), 2),
-                    "y": round(random.uniform(-250, 250), 2),
-                    "z": round(random.uniform(-250, 250), 2),
-                },
-            }
-        return dados
+        aceleracao, giroscopio = self.gerar_lote(1, hz=1)
+        return {
+            "aceleracao": dict(zip("xyz", aceleracao[0].tolist())),
+            "giroscopio": dict(zip("xyz", giroscopio[0].tolist())),
+        }
+
+    def gerar_lote(self, segundos, hz=100, rng=None):
+        """
+        Versão em lote de gerar_dados: `segundos * hz` amostras do cenário atual em uma
+        única chamada vetorizada. Retorna (aceleracao, giroscopio) como arrays (n, 3).
+        """
+        rng = rng if rng is not None else self.rng
+        n = int(round(segundos * hz))
+        faixas, giro = self.FAIXAS[self.cenario]
+        baixo, alto = np.array(faixas, dtype=float).T
+        aceleracao = np.round(rng.uniform(baixo, alto, (n, 3)), 2)
+        giroscopio = np.round(rng.uniform(-giro, giro, (n, 3)), 2)
+        return aceleracao, giroscopio
+
+    def interpretar_lote(self, aceleracao, giroscopio):
+        """
+        Versão vetorizada de interpretar_dados: mesma regra, aplicada a todas as amostras.
+        """
+        magnitude = np.linalg.norm(aceleracao, axis=1)
+        parado = (magnitude < 0.5) & (np.abs(giroscopio) < 10).all(axis=1)
+        return np.select(
+            [parado, magnitude > 2.5, (magnitude >= 0.5) & (magnitude <= 2.5)],
+            ["Usuário está parado", "Possível queda detectada", "Usuário está em movimento"],
+            default="Estado desconhecido"
+        )
 
     def interpretar_dados(self, dados):
         """
         Interpreta os dados do sensor para determinar o estado do usuário.
         Retorna uma string com a interpretação.
         """
-        aceleracao = dados["aceleracao"]
-        giroscopio = dados["giroscopio"]
-
-        # Magnitude da aceleração (em g)
-        magnitude_aceleracao = (aceleracao["x"]**2 + aceleracao["y"]**2 + aceleracao["z"]**2)**0.5
-
-        if magnitude_aceleracao < 0.5 and all(abs(giroscopio[axis]) < 10 for axis in ["x", "y", "z"]):
-            return "Usuário está parado"
-        elif magnitude_aceleracao > 2.5:
-            return "Possível queda detectada"
-        elif magnitude_aceleracao >= 0.5 and magnitude_aceleracao <= 2.5:
-            return "Usuário está em movimento"
-        else:
-            return "Estado desconhecido"
+        aceleracao = np.array([[dados["aceleracao"][eixo] for eixo in "xyz"]], dtype=float)
+        giroscopio = np.array([[dados["giroscopio"][eixo] for eixo in "xyz"]], dtype=float)
+        return str(self.interpretar_lote(aceleracao, giroscopio)[0])
 
     def iniciar_monitoramento(self, intervalo=1, dados_csv="dados_sensor.csv", performance_csv="performance.csv"):
         """
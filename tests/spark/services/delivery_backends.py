@@ -0,0 +1,267 @@
+import os
+import time
+import random
+import shutil
+import asyncio
+import threading
+
+# SDKs de nuvem são opcionais; os backends correspondentes ficam indisponíveis sem eles
+try:
+    from azure.storage.blob import BlobServiceClient
+    AZURE_AVAILABLE = True
+except Exception:
+    BlobServiceClient = None
+    AZURE_AVAILABLE = False
+
+try:
+    from google.cloud import storage as gcs_storage
+    GCS_AVAILABLE = True
+except Exception:
+    gcs_storage = None
+    GCS_AVAILABLE = False
+
+
+def listar_arquivos(local_path, remote_key):
+    """
+    Lista (arquivo_local, chave_remota) para um arquivo ou diretório.
+    """
+    if not os.path.isdir(local_path):
+        return [(local_path, remote_key)]
+
+    arquivos = []
+    for root, dirs, files in os.walk(local_path):
+        for file in files:
+            local_file = os.path.join(root, file)
+            relative_path = os.path.relpath(local_file, local_path)
+            arquivos.append((local_file, f"{remote_key}/{relative_path}".replace("\\", "/")))
+    return arquivos
+
+
+class LimitadorBanda:
+    """
+    Token bucket compartilhado pelas threads de um backend: consumir(n) registra n bytes
+    enviados e bloqueia o chamador pelo tempo que faltar para a taxa voltar a mb_s.
+    Rajadas de até rajada_s segundos de banda passam sem espera.
+    """
+
+    def __init__(self, mb_s, rajada_s=0.25):
+        self.taxa = mb_s * 1024 * 1024
+        self.capacidade = max(1.0, self.taxa * rajada_s)
+        self._credito = self.capacidade
+        self._atualizado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consumir(self, n):
+        with self._lock:
+            agora = time.monotonic()
+            self._credito = min(self.capacidade, self._credito + (agora - self._atualizado_em) * self.taxa)
+            self._atualizado_em = agora
+            self._credito -= n
+            espera = -self._credito / self.taxa if self._credito < 0 else 0.0
+        if espera > 0:
+            time.sleep(espera)
+
+
+class LeitorLimitado:
+    """
+    Envolve um arquivo aberto em modo binário: cada read() passa pelo LimitadorBanda antes
+    de devolver os bytes ao SDK que está enviando.
+    """
+
+    def __init__(self, arquivo, limitador):
+        self._arquivo = arquivo
+        self._limitador = limitador
+
+    def read(self, size=-1):
+        data = self._arquivo.read(size)
+        self._limitador.consumir(len(data))
+        return data
+
+    def __getattr__(self, nome):
+        return getattr(self._arquivo, nome)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._arquivo.close()
+
+
+class DeliveryBackend:
+    """
+    Interface de um destino de entrega. Subclasses implementam enviar(), que é
+    síncrono e executado em thread pelo TransferScheduler.
+
+    Attributes:
+        nome (str): Identificador do backend (usado nas chaves do resultado).
+        max_concorrencia (int): Transferências simultâneas permitidas neste backend.
+        banda_max_mb_s (float): Limite de banda em MB/s (None = sem limite).
+        tentativas (int): Número máximo de tentativas por transferência.
+    """
+    nome = "base"
+
+    def __init__(self, max_concorrencia=4, banda_max_mb_s=None, tentativas=3):
+        self.max_concorrencia = max_concorrencia
+        self.banda_max_mb_s = banda_max_mb_s
+        self.tentativas = tentativas
+        # um limitador por backend: vale para a soma das transferências simultâneas dele
+        self.limitador = LimitadorBanda(banda_max_mb_s) if banda_max_mb_s else None
+
+    def disponivel(self):
+        return True
+
+    def abrir(self, local_file):
+        f = open(local_file, 'rb')
+        return LeitorLimitado(f, self.limitador) if self.limitador else f
+
+    def enviar(self, local_path, remote_key):
+        raise NotImplementedError
+
+
+class LocalBackupBackend(DeliveryBackend):
+    nome = "local"
+
+    def __init__(self, delivery, backup_dir="../../artifacts", **kwargs):
+        super().__init__(**kwargs)
+        self.delivery = delivery
+        self.backup_dir = backup_dir
+
+    def enviar(self, local_path, remote_key):
+        return self.delivery.create_local_backup(local_path, self.backup_dir)
+
+
+class S3Backend(DeliveryBackend):
+    nome = "aws"
+
+    def __init__(self, delivery, **kwargs):
+        super().__init__(**kwargs)
+        self.delivery = delivery
+
+    def disponivel(self):
+        return self.delivery.setup_aws_client() is not None
+
+    def enviar(self, local_path, remote_key):
+        if not self.delivery.upload_to_aws_s3(local_path, remote_key, limitador=self.limitador):
+            raise RuntimeError(f"Falha no upload S3 de {local_path}")
+        return True
+
+
+class AzureBlobBackend(DeliveryBackend):
+    nome = "azure"
+
+    def __init__(self, container_name, **kwargs):
+        super().__init__(**kwargs)
+        self.container_name = container_name
+        self._container = None
+
+    def disponivel(self):
+        return AZURE_AVAILABLE and bool(os.getenv('AZURE_STORAGE_CONNECTION_STRING'))
+
+    def _container_client(self):
+        if self._container is None:
+            service = BlobServiceClient.from_connection_string(os.getenv('AZURE_STORAGE_CONNECTION_STRING'))
+            self._container = service.get_container_client(self.container_name)
+        return self._container
+
+    def enviar(self, local_path, remote_key):
+        container = self._container_client()
+        for local_file, blob_name in listar_arquivos(local_path, remote_key):
+            with self.abrir(local_file) as f:
+                container.upload_blob(blob_name, f, length=os.path.getsize(local_file), overwrite=True,
+                                      max_concurrency=self.max_concorrencia)
+        return True
+
+
+class GCSBackend(DeliveryBackend):
+    nome = "gcp"
+
+    def __init__(self, bucket_name, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket_name = bucket_name
+        self._bucket = None
+
+    def disponivel(self):
+        return GCS_AVAILABLE
+
+    def enviar(self, local_path, remote_key):
+        if self._bucket is None:
+            self._bucket = gcs_storage.Client().bucket(self.bucket_name)
+        for local_file, blob_name in listar_arquivos(local_path, remote_key):
+            with self.abrir(local_file) as f:
+                self._bucket.blob(blob_name).upload_from_file(f, size=os.path.getsize(local_file))
+        return True
+
+
+class FakeCloudBackend(DeliveryBackend):
+    """
+    "Nuvem" em filesystem local para testes: copia os arquivos para root_dir/<chave>.
+    latencia_s simula o tempo de ida e volta de cada arquivo.
+    """
+    nome = "fake"
+
+    def __init__(self, root_dir="../../artifacts/fake_cloud", latencia_s=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.root_dir = root_dir
+        self.latencia_s = latencia_s
+
+    def enviar(self, local_path, remote_key):
+        for local_file, key in listar_arquivos(local_path, remote_key):
+            destino = os.path.join(self.root_dir, *key.split("/"))
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            if self.latencia_s:
+                time.sleep(self.latencia_s)
+            with self.abrir(local_file) as origem, open(destino, 'wb') as saida:
+                shutil.copyfileobj(origem, saida)
+            shutil.copystat(local_file, destino)
+        return os.path.join(self.root_dir, *remote_key.split("/"))
+
+
+class TransferScheduler:
+    """
+    Executa transferências para vários backends em paralelo com asyncio.
+    Cada backend tem seu próprio semáforo (max_concorrencia), retry com backoff
+    exponencial e limite de banda (LimitadorBanda, aplicado aos bytes enviados);
+    o tempo total tende ao do destino mais lento.
+    """
+
+    def __init__(self, backends, backoff_base=0.5, backoff_max=10.0):
+        self.backends = backends
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.tempos = {}
+
+    async def _transferir(self, backend, semaforo, local_path, remote_key):
+        for tentativa in range(1, backend.tentativas + 1):
+            try:
+                # o semáforo só cobre o envio: o backoff abaixo não segura a vaga
+                async with semaforo:
+                    return await asyncio.to_thread(backend.enviar, local_path, remote_key)
+            except Exception as e:
+                if tentativa == backend.tentativas:
+                    print(f"[{backend.nome}] Falha definitiva em {local_path}: {e}")
+                    return False
+                espera = min(self.backoff_max, self.backoff_base * 2 ** (tentativa - 1))
+                espera *= random.uniform(0.5, 1.0)
+                print(f"[{backend.nome}] Tentativa {tentativa}/{backend.tentativas} falhou ({e}); nova tentativa em {espera:.2f}s")
+                await asyncio.sleep(espera)
+
+    async def executar(self, transferencias):
+        """
+        transferencias: lista de (data_type, local_path, remote_key).
+        Retorna {f"{data_type}_{backend.nome}": resultado}.
+        """
+        semaforos = {b.nome: asyncio.Semaphore(b.max_concorrencia) for b in self.backends}
+        inicio = time.perf_counter()
+
+        chaves, tarefas = [], []
+        for backend in self.backends:
+            for data_type, local_path, remote_key in transferencias:
+                chaves.append(f"{data_type}_{backend.nome}")
+                tarefas.append(self._transferir(backend, semaforos[backend.nome], local_path, remote_key))
+
+        resultados = await asyncio.gather(*tarefas)
+        self.tempos["total"] = time.perf_counter() - inicio
+        return dict(zip(chaves, resultados))
+
+    def executar_sync(self, transferencias):
+        return asyncio.run(self.executar(transferencias))
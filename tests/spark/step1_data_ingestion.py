@@ -12,8 +12,14 @@ import json
 import time
 from datetime import datetime
 
+# Diretório dos raw_health_data_* (lido pelo step2 em lote e em streaming). Não é o
+# output/raw do produtor em src/, que grava paciente_*.json com outro formato.
+DIR_RAW = os.path.join("..", "..", "output")
+
 class DataIngestion:
-    def __init__(self):
+    def __init__(self, paciente_id=None):
+        # identifica o paciente simulado nas linhas raw (o step2 particiona por bucket dele)
+        self.paciente_id = paciente_id if paciente_id is not None else int(os.getenv("PACIENTE_ID", "1"))
         self.idade_paciente = 45
         self.peso = 70
         self.condicao_clinica = "normal"
@@ -72,6 +78,7 @@ class DataIngestion:
         
         dados = {
             "timestamp": timestamp,
+            "paciente_id": self.paciente_id,
             #"bpm": bpm_data["bpm"],
             #"spo2": round(spo, 2),
             "glicose": glicose['glucose'],
@@ -90,15 +97,24 @@ class DataIngestion:
         
         return dados
 
-    def salvar_dados_raw(self, dados_batch, output_dir="../../output"):
+    def salvar_dados_raw(self, dados_batch, output_dir=DIR_RAW):
         os.makedirs(output_dir, exist_ok=True)
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"raw_health_data_{timestamp}.json"
+        # JSON Lines: um registro por linha, permite que o Spark divida o arquivo em partições
+        filename = f"raw_health_data_{timestamp}.jsonl"
         filepath = os.path.join(output_dir, filename)
+        # o stream do step2 observa este diretório e lê cada arquivo uma vez só: grava num
+        # nome oculto (fora do glob e ignorado pelo Spark) e publica com os.replace atômico
+        tmp_path = os.path.join(output_dir, f".{filename}.tmp")
         
-        with open(filepath, 'w') as f:
-            json.dump(dados_batch, f, indent=2)
+        with open(tmp_path, 'w') as f:
+            for dados in dados_batch:
+                f.write(json.dumps(dados))
+                f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
         
         print(f"Dados salvos em: {filepath}")
         return filepath
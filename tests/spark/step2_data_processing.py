@@ -1,20 +1,38 @@
 import os
-import json
+import sys
+import time
+from fnmatch import fnmatch
+from functools import reduce
 from datetime import datetime
+from pyspark import StorageLevel
 from pyspark.sql.types import * # type: ignore
-from pyspark.sql.functions import * # type: ignore
+from pyspark.sql import functions as F
 from pyspark.sql import SparkSession
+from utils.output_manifest import descrever_saida, publicar_manifesto
+from utils.py_utils import METRICS, measure_performance
+
+# JSON Lines (atual) e .json legado (array indentado, lido com multiline)
+PADRAO_RAW_JSONL = "raw_health_data_*.jsonl"
+PADRAO_RAW_JSON = "raw_health_data_*.json"
+
+# Largura aproximada de cada tipo numa linha (sem compressão): a estimativa fica por
+# cima do Parquet real, então os arquivos não passam de target_file_mb
+BYTES_POR_TIPO = {"int": 4, "bigint": 8, "float": 4, "double": 8, "boolean": 1,
+                  "date": 4, "timestamp": 8, "string": 16}
 
 class DataProcessing:
-    def __init__(self):
+    def __init__(self, storage_level=None, modo_escrita=None, target_file_mb=128, buckets_paciente=16,
+                 bytes_por_linha=None):
         self.spark = SparkSession.builder \
             .appName("HealthDataProcessing") \
             .config("spark.sql.adaptive.enabled", "true") \
             .config("spark.sql.adaptive.coalescePartitions.enabled", "true") \
+            .config("spark.sql.files.maxPartitionBytes", os.getenv("SPARK_MAX_PARTITION_BYTES", "64m")) \
             .getOrCreate()
         
         self.health_schema = StructType([
             StructField("timestamp", StringType(), True),
+            StructField("paciente_id", IntegerType(), True),
             StructField("bpm", IntegerType(), True),
             StructField("spo2", DoubleType(), True),
             StructField("glicose", DoubleType(), True),
@@ -31,83 +49,177 @@ class DataProcessing:
             StructField("umidade_pele", DoubleType(), True)
         ])
 
+        # Nível de persistência do DataFrame intermediário (compartilhado pelas 3 saídas)
+        self.storage_level = self._resolver_storage_level(storage_level or os.getenv("SPARK_STORAGE_LEVEL", "MEMORY_AND_DISK"))
+        self.tempos_etapas = {}
+
+        # "particionado" grava por data/hora/bucket de paciente; "unico" mantém o coalesce(1) antigo
+        self.modo_escrita = (modo_escrita or os.getenv("SPARK_MODO_ESCRITA", "particionado")).lower()
+        if self.modo_escrita not in ("particionado", "unico"):
+            raise ValueError(f"Modo de escrita inválido: {self.modo_escrita}")
+        self.target_file_bytes = int(target_file_mb * 1024 * 1024)
+        self.buckets_paciente = buckets_paciente
+        # bytes por linha usados para limitar o tamanho dos arquivos; sem valor (parâmetro ou
+        # SPARK_BYTES_POR_LINHA) é estimado pelo schema de cada DataFrame escrito
+        self.bytes_por_linha_estimado = bytes_por_linha or int(os.getenv("SPARK_BYTES_POR_LINHA", "0")) or None
+
+        self.spark.conf.set("spark.sql.parquet.compression.codec", "snappy")
+
+    @staticmethod
+    def _resolver_storage_level(nome):
+        if isinstance(nome, StorageLevel):
+            return nome
+        nivel = getattr(StorageLevel, str(nome).upper(), None)
+        if not isinstance(nivel, StorageLevel):
+            raise ValueError(f"StorageLevel inválido: {nome}")
+        return nivel
+
+    def _registrar_etapa(self, etapa, inicio):
+        duracao = time.perf_counter() - inicio
+        self.tempos_etapas[etapa] = duracao
+        METRICS.histogram("spark_etapa_seconds", etapa=etapa).observe(duracao)
+        print(f"[tempo] {etapa}: {duracao:.3f}s")
+        return duracao
+
     def carregar_dados_raw(self, input_path):
-        if os.path.isfile(input_path):
-            with open(input_path, 'r') as f:
-                data = json.load(f)
-            df = self.spark.createDataFrame(data, self.health_schema)
+        """
+        Lê os dados raw sempre pelo leitor distribuído do Spark com o schema explícito
+        (sem inferência e sem passar os dados pelo driver). Arquivos JSON Lines
+        (.jsonl) são divididos em várias partições; arquivos .json legados (array
+        com indentação) ainda são aceitos com multiline, um arquivo por task.
+        Um diretório é lido com os dois formatos (uma leitura por formato, unidas).
+        """
+        def reader():
+            return self.spark.read.schema(self.health_schema).option("mode", "PERMISSIVE")
+
+        if input_path.endswith(".json"):
+            df = reader().option("multiline", "true").json(input_path)
+        elif os.path.isdir(input_path):
+            nomes = os.listdir(input_path)
+            partes = []
+            if any(fnmatch(n, PADRAO_RAW_JSONL) for n in nomes):
+                partes.append(reader().option("pathGlobFilter", PADRAO_RAW_JSONL).json(input_path))
+            if any(fnmatch(n, PADRAO_RAW_JSON) for n in nomes):
+                partes.append(reader().option("multiline", "true").option("pathGlobFilter", PADRAO_RAW_JSON).json(input_path))
+            df = reduce(lambda a, b: a.unionByName(b), partes) if partes \
+                else self.spark.createDataFrame([], self.health_schema)
         else:
-            df = self.spark.read.option("multiline", "true").json(input_path, schema=self.health_schema)
+            df = reader().json(input_path)
         
-        return df.withColumn("timestamp", to_timestamp(col("timestamp"), "yyyy-MM-dd HH:mm:ss"))
+        return df.withColumn("timestamp", F.to_timestamp(F.col("timestamp"), "yyyy-MM-dd HH:mm:ss"))
 
     def processar_metricas_vitais(self, df):
-        df_processed = df.withColumn("pressao_media", (col("pressao_sistolica") + col("pressao_diastolica")) / 2) \
+        df_processed = df.withColumn("pressao_media", (F.col("pressao_sistolica") + F.col("pressao_diastolica")) / 2) \
                         .withColumn("status_bpm", 
-                                   when(col("bpm") < 60, "baixo")
-                                   .when(col("bpm") > 100, "alto")
+                                   F.when(F.col("bpm") < 60, "baixo")
+                                   .when(F.col("bpm") > 100, "alto")
                                    .otherwise("normal")) \
                         .withColumn("status_spo2",
-                                   when(col("spo2") < 95, "baixo")
-                                   .when(col("spo2") >= 98, "normal")
+                                   F.when(F.col("spo2") < 95, "baixo")
+                                   .when(F.col("spo2") >= 98, "normal")
                                    .otherwise("moderado")) \
                         .withColumn("status_glicose",
-                                   when(col("glicose") < 70, "hipoglicemia")
-                                   .when(col("glicose") > 140, "hiperglicemia")
+                                   F.when(F.col("glicose") < 70, "hipoglicemia")
+                                   .when(F.col("glicose") > 140, "hiperglicemia")
                                    .otherwise("normal")) \
                         .withColumn("status_pressao",
-                                   when(col("pressao_sistolica") < 90, "baixa")
-                                   .when(col("pressao_sistolica") > 140, "alta")
+                                   F.when(F.col("pressao_sistolica") < 90, "baixa")
+                                   .when(F.col("pressao_sistolica") > 140, "alta")
                                    .otherwise("normal"))
         
         return df_processed
 
     def detectar_anomalias_movimento(self, df):
         df_movimento = df.withColumn("atividade_nivel",
-                                   when(col("magnitude_aceleracao") < 0.5, "repouso")
-                                   .when(col("magnitude_aceleracao") < 2.0, "movimento_leve")
-                                   .when(col("magnitude_aceleracao") < 5.0, "movimento_moderado")
+                                   F.when(F.col("magnitude_aceleracao") < 0.5, "repouso")
+                                   .when(F.col("magnitude_aceleracao") < 2.0, "movimento_leve")
+                                   .when(F.col("magnitude_aceleracao") < 5.0, "movimento_moderado")
                                    .otherwise("movimento_intenso"))
         
         return df_movimento
 
-    def calcular_estatisticas_janela(self, df, window_minutes=10):
-        window_spec = window(col("timestamp"), f"{window_minutes} minutes")
+    def calcular_estatisticas_janela(self, df, window_minutes=10, watermark_minutes=None):
+        window_spec = F.window(F.col("timestamp"), f"{window_minutes} minutes")
+
+        # Em streaming a marca d'água limita o estado mantido e permite o modo append
+        if watermark_minutes is not None:
+            df = df.withWatermark("timestamp", f"{watermark_minutes} minutes")
         
         stats_df = df.groupBy(window_spec) \
                     .agg(
-                        avg("bpm").alias("bpm_media"),
-                        stddev("bpm").alias("bpm_desvio"),
-                        min("bpm").alias("bpm_min"),
-                        max("bpm").alias("bpm_max"),
-                        avg("spo2").alias("spo2_media"),
-                        avg("glicose").alias("glicose_media"),
-                        avg("pressao_media").alias("pressao_media_avg"),
-                        avg("temperatura").alias("temperatura_media"),
-                        avg("umidade_pele").alias("umidade_media"),
-                        count("*").alias("total_registros")
+                        F.avg("bpm").alias("bpm_media"),
+                        F.stddev("bpm").alias("bpm_desvio"),
+                        F.min("bpm").alias("bpm_min"),
+                        F.max("bpm").alias("bpm_max"),
+                        F.avg("spo2").alias("spo2_media"),
+                        F.avg("glicose").alias("glicose_media"),
+                        F.avg("pressao_media").alias("pressao_media_avg"),
+                        F.avg("temperatura").alias("temperatura_media"),
+                        F.avg("umidade_pele").alias("umidade_media"),
+                        F.count("*").alias("total_registros")
                     ) \
-                    .withColumn("janela_inicio", col("window.start")) \
-                    .withColumn("janela_fim", col("window.end")) \
+                    .withColumn("janela_inicio", F.col("window.start")) \
+                    .withColumn("janela_fim", F.col("window.end")) \
                     .drop("window")
         
         return stats_df
 
     def gerar_alertas(self, df):
         alertas_df = df.filter(
-            (col("status_bpm") != "normal") |
-            (col("status_spo2") == "baixo") |
-            (col("status_glicose") != "normal") |
-            (col("status_pressao") != "normal")
-        ).withColumn("alerta_timestamp", current_timestamp()) \
+            (F.col("status_bpm") != "normal") |
+            (F.col("status_spo2") == "baixo") |
+            (F.col("status_glicose") != "normal") |
+            (F.col("status_pressao") != "normal")
+        ).withColumn("alerta_timestamp", F.current_timestamp()) \
          .withColumn("severidade",
-                    when((col("spo2") < 90) | (col("glicose") < 50) | (col("bpm") > 120), "critico")
-                    .when((col("spo2") < 95) | (col("glicose") > 200) | (col("bpm") < 50), "alto")
+                    F.when((F.col("spo2") < 90) | (F.col("glicose") < 50) | (F.col("bpm") > 120), "critico")
+                    .when((F.col("spo2") < 95) | (F.col("glicose") > 200) | (F.col("bpm") < 50), "alto")
                     .otherwise("moderado"))
         
         return alertas_df
 
+    def _adicionar_colunas_particao(self, df, coluna_tempo):
+        df = df.withColumn("data", F.date_format(F.col(coluna_tempo), "yyyy-MM-dd")) \
+               .withColumn("hora", F.hour(F.col(coluna_tempo)))
+        colunas = ["data", "hora"]
+
+        if "paciente_id" in df.columns:
+            df = df.withColumn("bucket_paciente", F.pmod(F.hash(F.col("paciente_id")), F.lit(self.buckets_paciente)))
+            colunas.append("bucket_paciente")
+
+        return df, colunas
+
+    def _bytes_por_linha(self, df):
+        if self.bytes_por_linha_estimado:
+            return self.bytes_por_linha_estimado
+        return sum(BYTES_POR_TIPO.get(f.dataType.simpleString(), 16) for f in df.schema.fields) or 1
+
+    def escrever_parquet(self, df, output_path, coluna_tempo="timestamp"):
+        if self.modo_escrita == "unico":
+            df.coalesce(1).write.mode("overwrite").parquet(output_path)
+            return
+
+        # colunas de partição não vão para dentro dos arquivos: estimativa antes delas
+        max_linhas = max(1, self.target_file_bytes // self._bytes_por_linha(df))
+        df, colunas_particao = self._adicionar_colunas_particao(df, coluna_tempo)
+
+        # repartition pelas colunas de partição: cada diretório é escrito por poucas tasks,
+        # evitando milhares de arquivos pequenos; a ordenação por tempo melhora as
+        # estatísticas min/max de cada row group (predicate pushdown).
+        df.repartition(*[F.col(c) for c in colunas_particao]) \
+          .sortWithinPartitions(*colunas_particao, coluna_tempo) \
+          .write.mode("overwrite") \
+          .option("maxRecordsPerFile", max_linhas) \
+          .option("parquet.block.size", self.target_file_bytes) \
+          .option("parquet.enable.statistics", "true") \
+          .partitionBy(*colunas_particao) \
+          .parquet(output_path)
+
+    @measure_performance
     def processar_dados_completo(self, input_path, output_dir="../../output"):
+        self.tempos_etapas = {}
+        inicio_total = time.perf_counter()
+
         print("Carregando dados raw...")
         df_raw = self.carregar_dados_raw(input_path)
         
@@ -116,46 +228,160 @@ class DataProcessing:
         
         print("Detectando anomalias de movimento...")
         df_movimento = self.detectar_anomalias_movimento(df_processed)
-        
-        print("Calculando estatísticas por janela de tempo...")
-        df_stats = self.calcular_estatisticas_janela(df_movimento)
-        
-        print("Gerando alertas...")
-        df_alertas = self.gerar_alertas(df_movimento)
-        
-        os.makedirs(output_dir, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        output_processed = os.path.join(output_dir, f"processed_health_data_{timestamp}")
-        output_stats = os.path.join(output_dir, f"health_statistics_{timestamp}")
-        output_alertas = os.path.join(output_dir, f"health_alerts_{timestamp}")
-        
-        print("Salvando dados processados...")
-        df_movimento.coalesce(1).write.mode("overwrite").parquet(output_processed)
-        df_stats.coalesce(1).write.mode("overwrite").parquet(output_stats)
-        df_alertas.coalesce(1).write.mode("overwrite").parquet(output_alertas)
+
+        # df_movimento é a base das três escritas; sem persist o JSON raw seria
+        # lido e parseado novamente em cada action.
+        print(f"Persistindo dados intermediários ({self.storage_level})...")
+        inicio = time.perf_counter()
+        df_movimento = df_movimento.persist(self.storage_level)
+        total_linhas = df_movimento.count()
+        self._registrar_etapa("carga_e_processamento", inicio)
+        print(f"Registros processados: {total_linhas}")
+
+        try:
+            print("Calculando estatísticas por janela de tempo...")
+            df_stats = self.calcular_estatisticas_janela(df_movimento)
+            
+            print("Gerando alertas...")
+            df_alertas = self.gerar_alertas(df_movimento)
+            
+            os.makedirs(output_dir, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            
+            output_processed = os.path.join(output_dir, f"processed_health_data_{timestamp}")
+            output_stats = os.path.join(output_dir, f"health_statistics_{timestamp}")
+            output_alertas = os.path.join(output_dir, f"health_alerts_{timestamp}")
+            
+            print("Salvando dados processados...")
+            inicio = time.perf_counter()
+            self.escrever_parquet(df_movimento, output_processed)
+            self._registrar_etapa("escrita_processados", inicio)
+
+            inicio = time.perf_counter()
+            self.escrever_parquet(df_stats, output_stats, coluna_tempo="janela_inicio")
+            self._registrar_etapa("escrita_estatisticas", inicio)
+
+            inicio = time.perf_counter()
+            self.escrever_parquet(df_alertas, output_alertas)
+            self._registrar_etapa("escrita_alertas", inicio)
+
+        finally:
+            df_movimento.unpersist()
+
+        resultados = {
+            "processed_data": output_processed,
+            "statistics": output_stats,
+            "alerts": output_alertas
+        }
+
+        # Índice da última execução para o step3 (evita glob + stat no diretório de saída)
+        inicio = time.perf_counter()
+        publicar_manifesto(output_dir, timestamp, {
+            # só processed_data tem contagem já conhecida (count do persist); as outras
+            # saídas ficam sem "rows" para não disparar um job a mais cada
+            data_type: descrever_saida(path, total_linhas if data_type == "processed_data" else None)
+            for data_type, path in resultados.items()
+        })
+        self._registrar_etapa("manifesto", inicio)
+
+        self._registrar_etapa("total", inicio_total)
         
         print(f"Dados processados salvos em: {output_processed}")
         print(f"Estatísticas salvas em: {output_stats}")
         print(f"Alertas salvos em: {output_alertas}")
         
-        return {
-            "processed_data": output_processed,
-            "statistics": output_stats,
-            "alerts": output_alertas
+        return resultados
+
+    def carregar_stream_raw(self, input_dir, max_arquivos_por_trigger=100):
+        # uma fonte por formato (o .json legado precisa de multiline), unidas num só stream
+        def fonte(padrao, multiline):
+            return self.spark.readStream \
+                .schema(self.health_schema) \
+                .option("pathGlobFilter", padrao) \
+                .option("multiLine", multiline) \
+                .option("maxFilesPerTrigger", max_arquivos_por_trigger) \
+                .json(input_dir)
+
+        df = fonte(PADRAO_RAW_JSONL, "false").unionByName(fonte(PADRAO_RAW_JSON, "true"))
+
+        return df.withColumn("timestamp", F.to_timestamp(F.col("timestamp"), "yyyy-MM-dd HH:mm:ss"))
+
+    def _iniciar_sink_stream(self, df, output_path, checkpoint_path, trigger_seconds, nome, coluna_tempo="timestamp"):
+        return df.withColumn("data", F.date_format(F.col(coluna_tempo), "yyyy-MM-dd")) \
+                 .writeStream \
+                 .queryName(nome) \
+                 .format("parquet") \
+                 .outputMode("append") \
+                 .partitionBy("data") \
+                 .option("path", output_path) \
+                 .option("checkpointLocation", checkpoint_path) \
+                 .trigger(processingTime=f"{trigger_seconds} seconds") \
+                 .start()
+
+    def processar_stream(self, input_dir, output_dir="../../output", window_minutes=10,
+                         watermark_minutes=5, trigger_seconds=10, max_arquivos_por_trigger=100):
+        """
+        Variante contínua de processar_dados_completo: trata input_dir (o diretório em que
+        DataIngestion.salvar_dados_raw grava, step1_data_ingestion.DIR_RAW) como fonte de
+        arquivos raw_health_data_*, agrega estatísticas em janelas de tempo de evento com marca d'água
+        e emite alertas a cada trigger. O checkpoint permite retomar sem reprocessar.
+        Retorna as StreamingQuery iniciadas.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        checkpoint_dir = os.path.join(output_dir, "checkpoints")
+
+        print(f"Iniciando streaming sobre {input_dir}...")
+        df_raw = self.carregar_stream_raw(input_dir, max_arquivos_por_trigger)
+        df_movimento = self.detectar_anomalias_movimento(self.processar_metricas_vitais(df_raw))
+
+        df_stats = self.calcular_estatisticas_janela(df_movimento, window_minutes, watermark_minutes)
+        df_alertas = self.gerar_alertas(df_movimento)
+
+        queries = {
+            "statistics": self._iniciar_sink_stream(
+                df_stats, os.path.join(output_dir, "stream_health_statistics"),
+                os.path.join(checkpoint_dir, "statistics"), trigger_seconds,
+                "health_statistics", coluna_tempo="janela_inicio"),
+            "alerts": self._iniciar_sink_stream(
+                df_alertas, os.path.join(output_dir, "stream_health_alerts"),
+                os.path.join(checkpoint_dir, "alerts"), trigger_seconds,
+                "health_alerts"),
         }
 
+        for nome, query in queries.items():
+            print(f"Query '{nome}' iniciada (id={query.id})")
+
+        return queries
+
+    def aguardar_stream(self, queries, timeout=None):
+        try:
+            self.spark.streams.awaitAnyTermination(timeout)
+        finally:
+            for query in queries.values():
+                if query.isActive:
+                    query.stop()
+
     def stop_spark(self):
         self.spark.stop()
 
 if __name__ == "__main__":
+    from step1_data_ingestion import DIR_RAW
+
     processor = DataProcessing()
     
-    input_files = "../../output/raw_health_data_*.json"
+    # o diretório inteiro: raw_health_data_*.jsonl e os .json legados
+    input_files = DIR_RAW
     
     try:
-        results = processor.processar_dados_completo(input_files)
-        print("Processamento concluído com sucesso!")
-        print(f"Resultados: {results}")
+        if "--stream" in sys.argv:
+            # mesmo diretório em que DataIngestion.salvar_dados_raw grava
+            queries = processor.processar_stream(DIR_RAW)
+            processor.aguardar_stream(queries)
+        else:
+            results = processor.processar_dados_completo(input_files)
+            print("Processamento concluído com sucesso!")
+            print(f"Resultados: {results}")
+    except KeyboardInterrupt:
+        print("Processamento interrompido pelo usuário.")
     finally:
         processor.stop_spark()
@@ -1,12 +1,23 @@
 import os
 import json
 import glob
+import time
 import boto3
+import hashlib
 import shutil
 from datetime import datetime
+from botocore.exceptions import ClientError
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.output_manifest import ler_manifesto, ler_entregues, registrar_entregues
+from utils.py_utils import measure_performance
+from services.delivery_backends import (listar_arquivos, TransferScheduler, LocalBackupBackend,
+                                        S3Backend, AzureBlobBackend, GCSBackend, FakeCloudBackend)
+
+MB = 1024 * 1024
 
 class DataDelivery:
-    def __init__(self):
+    def __init__(self, s3_client=None, max_upload_workers=8):
         self.aws_bucket_name = os.getenv('AWS_BUCKET_NAME', 'health-monitor-data')
         self.azure_container_name = os.getenv('AZURE_CONTAINER_NAME', 'health-data')
         self.gcp_bucket_name = os.getenv('GCP_BUCKET_NAME', 'health-monitor-gcp')
@@ -15,79 +26,257 @@ class DataDelivery:
             'local_backup': True,
             'aws_s3': False,
             'azure_blob': False,
-            'gcp_storage': False
+            'gcp_storage': False,
+            'fake_cloud': False
         }
 
+        # Cliente boto3 é thread-safe e reaproveitado entre chamadas e threads de upload
+        self._s3_client = s3_client
+        self.max_upload_workers = max_upload_workers
+        self.transfer_config = TransferConfig(
+            multipart_threshold=int(os.getenv('S3_MULTIPART_THRESHOLD_MB', '16')) * MB,
+            multipart_chunksize=int(os.getenv('S3_MULTIPART_CHUNKSIZE_MB', '16')) * MB,
+            max_concurrency=int(os.getenv('S3_MAX_CONCURRENCY', '4')),
+            use_threads=True
+        )
+
     def setup_aws_client(self):
         if not self.delivery_config['aws_s3']:
             return None
+
+        if self._s3_client is not None:
+            return self._s3_client
         
         try:
-            return boto3.client(
+            self._s3_client = boto3.client(
                 's3',
                 aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
                 aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-                region_name=os.getenv('AWS_REGION', 'us-east-1')
+                region_name=os.getenv('AWS_REGION', 'us-east-1'),
+                endpoint_url=os.getenv('AWS_ENDPOINT_URL') or None
             )
+            return self._s3_client
         except Exception as e:
             print(f"Erro ao configurar AWS S3: {e}")
             return None
 
-    def upload_to_aws_s3(self, local_path, s3_key):
+    def _listar_arquivos_upload(self, local_path, s3_key):
+        return listar_arquivos(local_path, s3_key)
+
+    def _objeto_ja_enviado(self, s3_client, s3_file_key, tamanho, digest):
+        # Retomada: só não reenvia se o objeto remoto tem o mesmo tamanho e o mesmo sha256
+        # gravado nos metadados no upload (o ETag de multipart não é o MD5 do arquivo)
+        try:
+            head = s3_client.head_object(Bucket=self.aws_bucket_name, Key=s3_file_key)
+        except ClientError:
+            return False
+        return head.get('ContentLength') == tamanho and head.get('Metadata', {}).get('sha256') == digest
+
+    def _upload_arquivo(self, s3_client, local_file, s3_file_key, cache, limitador=None):
+        digest, tamanho = self._hash_arquivo(local_file, cache)
+        if self._objeto_ja_enviado(s3_client, s3_file_key, tamanho, digest):
+            return 0, True
+        # o Callback recebe os bytes de cada parte enviada; o limitador bloqueia a thread
+        # de transferência até a taxa voltar ao limite
+        s3_client.upload_file(local_file, self.aws_bucket_name, s3_file_key,
+                              ExtraArgs={'Metadata': {'sha256': digest}}, Config=self.transfer_config,
+                              Callback=limitador.consumir if limitador else None)
+        return tamanho, False
+
+    @measure_performance
+    def upload_to_aws_s3(self, local_path, s3_key, limitador=None):
+        """
+        Envia um arquivo ou diretório para s3://<bucket>/<s3_key>, pulando os objetos que
+        já estão lá com o mesmo conteúdo. `limitador` (LimitadorBanda) limita a soma
+        dos uploads simultâneos.
+
+        Returns:
+            dict: Vazão desta transferência (arquivos, pulados, bytes, segundos,
+                mb_por_segundo), ou False se o cliente não existe ou algum arquivo falhou.
+        """
         s3_client = self.setup_aws_client()
         if not s3_client:
             return False
+
+        arquivos = self._listar_arquivos_upload(local_path, s3_key)
+        cache = {}
+        inicio = time.perf_counter()
+        bytes_enviados = 0
+        pulados = 0
+        erros = []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_upload_workers, len(arquivos)))) as executor:
+            futures = {executor.submit(self._upload_arquivo, s3_client, local_file, s3_file_key, cache, limitador): local_file
+                       for local_file, s3_file_key in arquivos}
+            for future in as_completed(futures):
+                try:
+                    enviados, ja_existia = future.result()
+                    bytes_enviados += enviados
+                    pulados += int(ja_existia)
+                except Exception as e:
+                    erros.append((futures[future], e))
+
+        duracao = time.perf_counter() - inicio
+        vazao_mb_s = (bytes_enviados / MB) / duracao if duracao > 0 else 0.0
+        vazao = {
+            "arquivos": len(arquivos),
+            "pulados": pulados,
+            "bytes": bytes_enviados,
+            "segundos": round(duracao, 3),
+            "mb_por_segundo": round(vazao_mb_s, 2)
+        }
+
+        if erros:
+            for local_file, e in erros:
+                print(f"Erro no upload para S3 ({local_file}): {e}")
+            return False
         
+        print(f"Upload para S3 concluído: s3://{self.aws_bucket_name}/{s3_key} "
+              f"({len(arquivos)} arquivos, {pulados} já enviados, {vazao_mb_s:.2f} MB/s)")
+        return vazao
+
+    def _carregar_json(self, caminho, padrao):
+        if not os.path.isfile(caminho):
+            return padrao
         try:
-            if os.path.isdir(local_path):
-                for root, dirs, files in os.walk(local_path):
-                    for file in files:
-                        local_file = os.path.join(root, file)
-                        relative_path = os.path.relpath(local_file, local_path)
-                        s3_file_key = f"{s3_key}/{relative_path}".replace("\\", "/")
-                        s3_client.upload_file(local_file, self.aws_bucket_name, s3_file_key)
-            else:
-                s3_client.upload_file(local_path, self.aws_bucket_name, s3_key)
-            
-            print(f"Upload para S3 concluído: s3://{self.aws_bucket_name}/{s3_key}")
-            return True
-        except Exception as e:
-            print(f"Erro no upload para S3: {e}")
-            return False
+            with open(caminho, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return padrao
 
+    def _salvar_json_atomico(self, caminho, dados):
+        tmp_path = caminho + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dados, f, indent=2)
+        os.replace(tmp_path, caminho)
+
+    def _hash_arquivo(self, caminho, cache):
+        # Cache por (tamanho, mtime): arquivos inalterados não são relidos
+        st = os.stat(caminho)
+        chave = os.path.abspath(caminho)
+        entrada = cache.get(chave)
+        if entrada and entrada[0] == st.st_size and entrada[1] == st.st_mtime_ns:
+            return entrada[2], st.st_size
+
+        sha = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(MB), b''):
+                sha.update(bloco)
+        digest = sha.hexdigest()
+        cache[chave] = [st.st_size, st.st_mtime_ns, digest]
+        return digest, st.st_size
+
+    def _vincular_objeto(self, origem, destino):
+        # Hardlink quando o filesystem suporta; senão cópia
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        try:
+            os.link(origem, destino)
+        except OSError:
+            shutil.copy2(origem, destino)
+
+    @measure_performance
     def create_local_backup(self, source_path, backup_dir="../../artifacts"):
+        """
+        Backup deduplicado por conteúdo: cada arquivo é armazenado uma única vez em
+        objects/<sha256> e cada backup é um manifesto (manifests/backup_<ts>.json).
+        O diretório backup_<ts> é montado com hardlinks para os objetos, então
+        backups repetidos só ocupam os bytes que mudaram.
+        """
         os.makedirs(backup_dir, exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
+        objects_dir = os.path.join(backup_dir, "objects")
+        manifests_dir = os.path.join(backup_dir, "manifests")
+        os.makedirs(objects_dir, exist_ok=True)
+        os.makedirs(manifests_dir, exist_ok=True)
+
+        cache_path = os.path.join(backup_dir, "hash_cache.json")
+        cache = self._carregar_json(cache_path, {})
+
         if os.path.isdir(source_path):
-            backup_path = os.path.join(backup_dir, f"backup_{timestamp}")
-            shutil.copytree(source_path, backup_path)
+            backup_name = f"backup_{timestamp}_{os.path.basename(os.path.normpath(source_path))}"
+            arquivos = [(local_file, relpath.lstrip("/"))
+                        for local_file, relpath in self._listar_arquivos_upload(source_path, "")]
         else:
             filename = os.path.basename(source_path)
-            backup_path = os.path.join(backup_dir, f"backup_{timestamp}_{filename}")
-            shutil.copy2(source_path, backup_path)
+            backup_name = f"backup_{timestamp}_{filename}"
+            arquivos = [(source_path, filename)]
+
+        backup_path = os.path.join(backup_dir, backup_name)
+        manifesto = {"source": os.path.abspath(source_path), "created_at": timestamp, "files": {}}
+        novos_bytes = 0
+
+        for local_file, relpath in arquivos:
+            digest, tamanho = self._hash_arquivo(local_file, cache)
+            objeto = os.path.join(objects_dir, digest[:2], digest)
+            if not os.path.exists(objeto):
+                os.makedirs(os.path.dirname(objeto), exist_ok=True)
+                shutil.copy2(local_file, objeto + '.tmp')
+                os.replace(objeto + '.tmp', objeto)
+                novos_bytes += tamanho
+            manifesto["files"][relpath] = {"sha256": digest, "size": tamanho}
+
+            destino = os.path.join(backup_path, relpath) if os.path.isdir(source_path) else backup_path
+            self._vincular_objeto(objeto, destino)
+
+        self._salvar_json_atomico(os.path.join(manifests_dir, f"{backup_name}.json"), manifesto)
+        self._salvar_json_atomico(cache_path, cache)
         
-        print(f"Backup local criado: {backup_path}")
+        print(f"Backup local criado: {backup_path} ({len(arquivos)} arquivos, {novos_bytes} bytes novos)")
         return backup_path
 
-    def deliver_processed_data(self, data_paths, delivery_prefix="health_data"):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        delivery_results = {}
-        
+    @staticmethod
+    def _banda_max(nome):
+        # MB/s por backend (DELIVERY_MAX_MB_S_AWS, ..._AZURE, ..._GCP, ..._FAKE) ou para
+        # todos os remotos (DELIVERY_MAX_MB_S); vazio = sem limite
+        valor = os.getenv(f"DELIVERY_MAX_MB_S_{nome.upper()}") or os.getenv("DELIVERY_MAX_MB_S")
+        return float(valor) if valor else None
+
+    def criar_backends(self):
+        # local_backup com concorrência 1: os backups compartilham o cache de hashes
+        fabricas = {
+            'local_backup': lambda: LocalBackupBackend(self, max_concorrencia=1),
+            'aws_s3': lambda: S3Backend(self, max_concorrencia=2, banda_max_mb_s=self._banda_max('aws')),
+            'azure_blob': lambda: AzureBlobBackend(self.azure_container_name, banda_max_mb_s=self._banda_max('azure')),
+            'gcp_storage': lambda: GCSBackend(self.gcp_bucket_name, banda_max_mb_s=self._banda_max('gcp')),
+            'fake_cloud': lambda: FakeCloudBackend(banda_max_mb_s=self._banda_max('fake'))
+        }
+
+        backends = []
+        for flag, fabrica in fabricas.items():
+            if not self.delivery_config.get(flag):
+                continue
+            backend = fabrica()
+            if backend.disponivel():
+                backends.append(backend)
+            else:
+                print(f"Backend '{flag}' habilitado mas indisponível (SDK ou credenciais ausentes)")
+        return backends
+
+    @measure_performance
+    def deliver_processed_data(self, data_paths, delivery_prefix="health_data", backends=None, run_id=None):
+        """
+        Entrega cada saída em <delivery_prefix>/<data_type>/<versão>, onde a versão é o
+        run_id do step2 (do manifesto) ou, sem ele, o nome do diretório de saída (que já
+        leva o timestamp da execução). A mesma saída local cai sempre nas mesmas chaves,
+        então uma entrega interrompida ou repetida é retomada sem duplicar objetos, e
+        execuções diferentes nunca se misturam no mesmo prefixo (os part-* do Spark
+        mudam de nome a cada escrita).
+        """
+
+        transferencias = []
         for data_type, path in data_paths.items():
             if not os.path.exists(path):
                 print(f"Caminho não encontrado: {path}")
                 continue
-            
-            remote_key = f"{delivery_prefix}/{data_type}/{timestamp}"
-            
-            if self.delivery_config['local_backup']:
-                backup_path = self.create_local_backup(path)
-                delivery_results[f"{data_type}_local"] = backup_path
-            
-            if self.delivery_config['aws_s3']:
-                success = self.upload_to_aws_s3(path, remote_key)
-                delivery_results[f"{data_type}_aws"] = success
+            versao = run_id or os.path.basename(os.path.normpath(path))
+            transferencias.append((data_type, path, f"{delivery_prefix}/{data_type}/{versao}"))
+
+        if not transferencias:
+            return {}
+
+        scheduler = TransferScheduler(backends if backends is not None else self.criar_backends())
+        delivery_results = scheduler.executar_sync(transferencias)
+        print(f"Entregas concluídas em {scheduler.tempos['total']:.2f}s")
         
         return delivery_results
 
@@ -116,9 +305,8 @@ class DataDelivery:
         print(f"Relatório de entrega gerado: {report_path}")
         return report_path
 
-    def execute_delivery_pipeline(self, processed_data_dir="../../output"):
-        print("Iniciando pipeline de entrega de dados...")
-        
+    def _localizar_por_glob(self, processed_data_dir):
+        # Fallback para saídas geradas antes do manifesto existir
         latest_files = {}
         patterns = {
             "processed_data": "processed_health_data_*",
@@ -130,16 +318,41 @@ class DataDelivery:
             files = glob.glob(os.path.join(processed_data_dir, pattern))
             if files:
                 latest_files[data_type] = max(files, key=os.path.getctime)
+        return latest_files
+
+    def execute_delivery_pipeline(self, processed_data_dir="../../output", force=False):
+        print("Iniciando pipeline de entrega de dados...")
+
+        manifesto = ler_manifesto(processed_data_dir)
+        entregues = ler_entregues(processed_data_dir)
+
+        if manifesto:
+            print(f"Manifesto encontrado (run_id={manifesto['run_id']})")
+            latest_files = {}
+            for data_type, saida in manifesto["outputs"].items():
+                if not force and entregues.get(data_type) == saida["sha256"]:
+                    print(f"{data_type}: conteúdo idêntico já entregue, pulando")
+                    continue
+                latest_files[data_type] = saida["path"]
+        else:
+            latest_files = self._localizar_por_glob(processed_data_dir)
         
         if not latest_files:
-            print("Nenhum arquivo processado encontrado.")
-            return
+            print("Nenhum arquivo processado novo encontrado.")
+            return {}
         
         print(f"Arquivos encontrados para entrega: {latest_files}")
         
-        delivery_results = self.deliver_processed_data(latest_files)
+        delivery_results = self.deliver_processed_data(latest_files, run_id=manifesto["run_id"] if manifesto else None)
+
+        if manifesto:
+            for data_type in latest_files:
+                resultados = [v for k, v in delivery_results.items() if k.startswith(f"{data_type}_")]
+                if resultados and all(v is True or isinstance(v, str) for v in resultados):
+                    entregues[data_type] = manifesto["outputs"][data_type]["sha256"]
+            registrar_entregues(processed_data_dir, entregues)
         
-        report_path = self.generate_delivery_report(delivery_results)
+        report_path = self.generate_delivery_report(delivery_results, processed_data_dir)
         
         print("Pipeline de entrega concluído!")
         return delivery_results
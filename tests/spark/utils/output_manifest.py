@@ -0,0 +1,105 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+
+MANIFEST_DIR = "_manifest"
+LATEST_FILE = "latest.json"
+DELIVERED_FILE = "delivered.json"
+
+
+def _caminho(output_dir, nome):
+    return os.path.join(output_dir, MANIFEST_DIR, nome)
+
+
+def _ler_json(caminho):
+    if not os.path.isfile(caminho):
+        return None
+    try:
+        with open(caminho, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _salvar_json_atomico(caminho, dados):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    tmp_path = caminho + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(dados, f, indent=2)
+    os.replace(tmp_path, caminho)
+
+
+def descrever_saida(path, linhas=None):
+    """
+    Tamanho total e checksum de conteúdo de um arquivo ou diretório de saída do Spark.
+    Arquivos ocultos (_SUCCESS, .crc) são ignorados.
+
+    O checksum é o sha256 dos pares (diretório relativo, sha256 do arquivo), ordenados.
+    O diretório entra porque, na saída particionada, os valores de partição
+    (data=/hora=/bucket_paciente=) só existem no caminho. O nome do arquivo não entra,
+    porque os part-* do Spark levam um UUID por escrita e dados idênticos de execuções
+    diferentes precisam dar o mesmo checksum.
+    """
+    arquivos = []
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file in sorted(files):
+                if file.startswith(('_', '.')):
+                    continue
+                arquivos.append(os.path.join(root, file))
+    else:
+        arquivos.append(path)
+
+    base = path if os.path.isdir(path) else os.path.dirname(path)
+    digests = []
+    tamanho = 0
+    for arquivo in arquivos:
+        sha_arquivo = hashlib.sha256()
+        with open(arquivo, 'rb') as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b''):
+                sha_arquivo.update(bloco)
+                tamanho += len(bloco)
+        diretorio = os.path.relpath(os.path.dirname(arquivo), base).replace(os.sep, "/")
+        digests.append((diretorio, sha_arquivo.hexdigest()))
+
+    sha = hashlib.sha256()
+    for diretorio, digest in sorted(digests):
+        sha.update(diretorio.encode('utf-8') + b'\0' + digest.encode('ascii') + b'\n')
+
+    return {
+        "path": os.path.abspath(path),
+        "size": tamanho,
+        "files": len(arquivos),
+        "sha256": sha.hexdigest(),
+        "rows": linhas
+    }
+
+
+def publicar_manifesto(output_dir, run_id, saidas):
+    """
+    Publica output_dir/_manifest/latest.json com a última execução do step2.
+
+    Args:
+        saidas (dict): data_type -> descrição gerada por descrever_saida().
+    """
+    manifesto = {
+        "run_id": run_id,
+        "published_at": datetime.now().isoformat(),
+        "outputs": saidas
+    }
+    _salvar_json_atomico(_caminho(output_dir, LATEST_FILE), manifesto)
+    return manifesto
+
+
+def ler_manifesto(output_dir):
+    return _ler_json(_caminho(output_dir, LATEST_FILE))
+
+
+def ler_entregues(output_dir):
+    return _ler_json(_caminho(output_dir, DELIVERED_FILE)) or {}
+
+
+def registrar_entregues(output_dir, entregues):
+    _salvar_json_atomico(_caminho(output_dir, DELIVERED_FILE), entregues)
@@ -1,8 +1,28 @@
 import os
+import sys
 import csv
 import time
 import json
-import tracemalloc
+import functools
+import importlib.util
+
+
+def _load_metrics_module():
+    """
+    Load src/utils/metrics.py by path. Here "utils" is this package (tests/spark/utils),
+    so appending src/ to sys.path and importing utils.metrics would not find it.
+    """
+    name = 'health_monitor_metrics'
+    if name not in sys.modules:
+        path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src', 'utils', 'metrics.py'))
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+METRICS = _load_metrics_module().METRICS
 
 
 def get_configs()-> list:
@@ -15,39 +35,27 @@ def get_configs()-> list:
     return json.load(open(config_file))
 
 
-def measure_performance(func):
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        tracemalloc.start()
-
-        result = func(*args, **kwargs)
-
-        end_time = time.time()
-        current, peak = tracemalloc.get_traced_memory()
-        tracemalloc.stop()
-
-        execution_time = (end_time - start_time) * 1000
-        current_memory = current / 10**3
-        peak_memory = peak / 10**3
-
-        print(f"[?] Função '{func.__name__}' executada em {execution_time:.4f} milissegundos")
-        print(f"[?] Uso atual da memória: {current_memory:.4f} KB; Pico: {peak_memory:.4f} KB")
-
-        csv_file_path = 'reports/performance_data.csv'
-
-        file_exists = os.path.isfile(csv_file_path)
-
-        with open(csv_file_path, mode='a', newline='') as file:
-            writer = csv.writer(file)
-
-            if not file_exists:
-                writer.writerow(['Function', 'Execution Time (ms)', 'Current Memory (KB)', 'Peak Memory (KB)'])
-            
-            writer.writerow([func.__name__, execution_time, current_memory, peak_memory])
-
-        return result
+def measure_performance(func=None, *, trace_memory=False):
+    """
+    Decorator to time a function with the in-memory metrics registry (src/utils/metrics.py).
 
-    return wrapper
+    Timings go to the histogram '<func>_seconds' and are flushed by a background
+    thread to reports/performance_data.jsonl; the thread is started on the first timed
+    call (not at import), so importing a step does not create reports/ or spawn threads.
+    tracemalloc is only enabled (sampled) with trace_memory=True or METRICS_TRACEMALLOC=1.
+    """
+    def decorator(f):
+        timed = METRICS.timed(f'{f.__name__}_seconds', trace_memory=trace_memory or None)(f)
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            METRICS.start_flusher(os.path.join('reports', 'performance_data.jsonl'))
+            return timed(*args, **kwargs)
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
 
 
 def measure_sensor_performance(func):